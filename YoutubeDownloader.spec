@@ -1,16 +1,28 @@
 import os
 
+# 构建配置：onefile 为单个可执行文件（默认）；
+# fast 为启动优化的目录布局，启动时无需把所有文件解包到临时目录
+profile = os.environ.get('BUILD_PROFILE', 'onefile')
+fast = profile == 'fast'
+
 a = Analysis(
     ['downloader.py'],
     pathex=[],
     binaries=[],
     datas=[
     ],
-    hiddenimports=[],
+    # yt-dlp 和 requests 在 downloader.py 中延迟导入，需显式收集；
+    # 提取器通过 lazy_extractors 按需导入
+    hiddenimports=['yt_dlp', 'requests', 'yt_dlp.extractor.lazy_extractors'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # 运行时用不到的标准库和工具包
+    excludes=[
+        'tkinter', '_tkinter', 'turtle', 'turtledemo', 'idlelib', 'curses',
+        'unittest', 'doctest', 'pydoc', 'pydoc_data', 'lib2to3', 'xmlrpc',
+        'pip', 'setuptools', 'pkg_resources', 'distutils',
+    ] if fast else [],
     noarchive=False,
 )
 
@@ -21,14 +33,15 @@ target_arch = os.environ.get('TARGET_ARCH', None)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
+    *([] if fast else [a.binaries, a.datas]),
     [],
+    exclude_binaries=fast,
     name='YoutubeDownloader',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # UPX 压缩的文件每次启动都要解压
+    upx=not fast,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
@@ -38,4 +51,15 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
     icon=None
-)
\ No newline at end of file
+)
+
+if fast:
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='YoutubeDownloader',
+    )
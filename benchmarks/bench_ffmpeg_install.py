@@ -0,0 +1,130 @@
+"""比较 FFmpeg 自动安装时按范围读取压缩包、整包下载和使用缓存的耗时与流量
+
+用法: python benchmarks/bench_ffmpeg_install.py [--filler-mb 80] [--binary-mb 8]
+
+生成一个与 FFmpeg 构建结构相近的压缩包（bin 下的 ffmpeg.exe/ffprobe.exe
+以及大量不需要的文件），用本地 HTTP 服务器提供（可关闭范围请求支持），
+分别测量按范围只解压需要的文件、整包下载后解压、从缓存安装三种情况。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import http.server
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import downloader  # noqa: E402
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+def build_archive(path: Path, binary_mb: int, filler_mb: int) -> dict:
+    """生成合成的 FFmpeg 压缩包，返回需要的文件的 SHA-256"""
+    digests = {}
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for index in range(max(filler_mb // 8, 1)):
+            archive.writestr(f"ffmpeg-x/doc/filler{index}.bin", os.urandom(8 << 20))
+        for name in downloader.FFMPEG_MEMBERS:
+            data = os.urandom(binary_mb << 20)
+            digests[name] = hashlib.sha256(data).hexdigest()
+            archive.writestr(f"ffmpeg-x/bin/{name}", data)
+    return digests
+
+
+def serve(path: Path, ranges: bool):
+    """启动提供压缩包的本地 HTTP 服务器，返回 (服务器, 地址, 已发送字节计数)"""
+    data = path.read_bytes()
+    sent = [0]
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = RANGE_PATTERN.fullmatch(self.headers.get("Range", ""))
+            if ranges and match:
+                start = int(match.group(1))
+                end = int(match.group(2) or len(data) - 1)
+                body = data[start : end + 1]
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range",
+                    f"bytes {start}-{start + len(body) - 1}/{len(data)}",
+                )
+            else:
+                body = data
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            sent[0] += len(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/ffmpeg.zip", sent
+
+
+async def timed_install(url: str, workdir: Path, cache_dir: Path):
+    """安装一次，返回耗时和安装结果的 SHA-256"""
+    dest = Path(tempfile.mkdtemp(dir=workdir))
+    started = time.perf_counter()
+    ok = await downloader.install_ffmpeg(dest, [url], cache_dir)
+    elapsed = time.perf_counter() - started
+    if not ok:
+        raise SystemExit("安装失败")
+    return elapsed, {
+        name: downloader.hash_file(dest / name) for name in downloader.FFMPEG_MEMBERS
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="FFmpeg 自动安装基准测试")
+    parser.add_argument("--filler-mb", type=int, default=80, help="不需要的文件总大小")
+    parser.add_argument("--binary-mb", type=int, default=8, help="每个可执行文件的大小")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        archive = workdir / "ffmpeg.zip"
+        expected = build_archive(archive, args.binary_mb, args.filler_mb)
+        size = archive.stat().st_size
+
+        results = []
+        for label, ranges, cached in (
+            ("范围读取", True, False),
+            ("整包下载", False, False),
+            ("使用缓存", True, True),
+        ):
+            cache_dir = workdir / f"cache_{label}"
+            server, url, sent = serve(archive, ranges)
+            try:
+                if cached:
+                    await timed_install(url, workdir, cache_dir)
+                    sent[0] = 0
+                elapsed, digests = await timed_install(url, workdir, cache_dir)
+            finally:
+                server.shutdown()
+            if digests != expected:
+                raise SystemExit(f"{label}: 安装的文件校验和不一致")
+            results.append((label, elapsed, sent[0]))
+
+    print(f"\n压缩包大小: {size / 1024 / 1024:.1f}MB")
+    print(f"{'方式':<8} {'耗时(秒)':>10} {'下载(MB)':>10} {'占压缩包':>8}")
+    for label, elapsed, fetched in results:
+        print(
+            f"{label:<8} {elapsed:>10.2f} {fetched / 1024 / 1024:>10.1f} "
+            f"{fetched / size:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""测量大型播放列表条目和视频格式信息常驻内存的大小
+
+用法: python benchmarks/bench_memory.py [--sizes 1000 10000 50000] [--limit 600]
+
+用 tracemalloc 分别测量保留完整扁平条目和保留 PlaylistEntry 时每个条目
+占用的内存，以及下载期间保留完整格式列表和只保留选中格式的内存。
+紧凑条目的单条内存超过 --limit 字节或随列表规模增长时以状态码 1 退出。
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import downloader  # noqa: E402
+
+# 单条内存允许随规模增长的比例（容纳列表扩容的余量）
+GROWTH_TOLERANCE = 1.25
+
+
+def flat_entry(index: int):
+    """生成一个与 yt-dlp 频道扁平条目结构相近的条目"""
+    video_id = f"v{index:010d}"
+    return {
+        "_type": "url",
+        "ie_key": "Youtube",
+        "id": video_id,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "title": f"示例视频标题 第 {index} 集 - 一段足够长的标题文字",
+        "description": None,
+        "duration": 600 + index % 3000,
+        "channel_id": "UCxxxxxxxxxxxxxxxxxxxxxx",
+        "channel": "示例频道",
+        "channel_url": "https://www.youtube.com/channel/UCxxxxxxxxxxxxxxxxxxxxxx",
+        "uploader": "示例频道",
+        "uploader_id": "@example",
+        "uploader_url": "https://www.youtube.com/@example",
+        "thumbnails": [
+            {
+                "url": f"https://i.ytimg.com/vi/{video_id}/hq{size}.jpg",
+                "height": size,
+                "width": size * 16 // 9,
+            }
+            for size in (94, 110, 138, 188)
+        ],
+        "timestamp": 1700000000 + index,
+        "view_count": index * 37,
+        "live_status": None,
+        "availability": None,
+    }
+
+
+def video_info(formats: int = 60, fragments: int = 300):
+    """生成一个与 yt-dlp 视频信息结构相近的 info_dict（DASH 格式带片段列表）"""
+    return {
+        "id": "v0000000000",
+        "title": "示例视频",
+        "duration": 3600,
+        "formats": [
+            {
+                "format_id": str(100 + index),
+                "ext": "mp4" if index % 2 else "webm",
+                "vcodec": "avc1.640028" if index % 3 else "none",
+                "acodec": "none" if index % 3 else "opus",
+                "width": 1920,
+                "height": 1080,
+                "tbr": 2500.0 + index,
+                "url": f"https://rr1---sn.googlevideo.com/videoplayback?itag={index}"
+                + "&x" * 200,
+                "http_headers": {"User-Agent": "Mozilla/5.0", "Accept": "*/*"},
+                "fragments": [
+                    {"url": f"sq/{n}", "duration": 5.0} for n in range(fragments)
+                ],
+            }
+            for index in range(formats)
+        ],
+    }
+
+
+def retained(build) -> int:
+    """构建对象并返回其常驻的内存字节数"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="播放列表内存占用基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument(
+        "--limit", type=int, default=600, help="紧凑条目的单条上限(字节)"
+    )
+    args = parser.parse_args()
+
+    print(f"{'条目数':>8} {'完整条目(B/条)':>14} {'紧凑条目(B/条)':>14} {'比例':>7}")
+    per_entry = []
+    for size in args.sizes:
+        full = retained(lambda: [flat_entry(i) for i in range(size)])
+        compact = retained(
+            lambda: [
+                downloader.PlaylistEntry.from_info(flat_entry(i), i + 1)
+                for i in range(size)
+            ]
+        )
+        per_entry.append(compact / size)
+        print(
+            f"{size:>8} {full / size:>14.0f} {compact / size:>14.0f} "
+            f"{full / compact:>7.1f}"
+        )
+
+    def selected_formats():
+        info_dict = video_info()
+        return tuple(
+            map(
+                downloader.prune_format,
+                downloader.select_best_formats(info_dict["formats"]),
+            )
+        )
+
+    info_size = retained(video_info)
+    pruned_size = retained(selected_formats)
+    print(
+        f"\n单个视频下载期间保留的格式信息: {info_size / 1024:.0f}KB -> "
+        f"{pruned_size / 1024:.1f}KB"
+    )
+
+    failures = []
+    if max(per_entry) > args.limit:
+        failures.append(f"紧凑条目单条 {max(per_entry):.0f}B 超过上限 {args.limit}B")
+    if per_entry[-1] > per_entry[0] * GROWTH_TOLERANCE:
+        failures.append(
+            f"紧凑条目单条内存随规模增长: {per_entry[0]:.0f}B -> {per_entry[-1]:.0f}B"
+        )
+    for message in failures:
+        print(f"失败: {message}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
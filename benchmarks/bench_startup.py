@@ -0,0 +1,113 @@
+"""测量下载器（源码或构建产物）的冷启动和热启动耗时
+
+用法: python benchmarks/bench_startup.py [--target dist/windows/YoutubeDownloader/YoutubeDownloader.exe]
+                                        [--runs 10] [--max-warm 1.5]
+
+分别以 --help 和一个只读取本地元数据的任务（对一个带完整性清单的目录运行
+--verify）启动目标，第一次启动记为冷启动，之后多次启动的中位数记为热启动。
+未指定 --target 时启动源码 downloader.py，冷启动使用空的字节码缓存目录。
+以 root 运行且指定 --drop-caches 时，冷启动前清空系统的文件缓存（仅 Linux）。
+热启动中位数超过 --max-warm 秒时以状态码 1 退出，用于发现启动时间的退化。
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import downloader  # noqa: E402
+
+# 元数据任务中的文件数和每个文件的大小
+VERIFY_FILES = 20
+VERIFY_FILE_SIZE = 64 * 1024
+
+
+def prepare_verify_dir(root: Path) -> None:
+    """生成带完整性清单的输出目录，供 --verify 任务读取"""
+    for index in range(VERIFY_FILES):
+        path = root / f"{index:02d}-示例视频.mp4"
+        path.write_bytes(os.urandom(VERIFY_FILE_SIZE))
+        downloader.MANIFEST.record(
+            path, downloader.hash_file(path), video_id=f"video{index:06d}"
+        )
+
+
+def drop_caches() -> bool:
+    """清空系统文件缓存，没有权限时返回 False"""
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def launch(command, env) -> float:
+    """启动一次并等待退出，返回耗时"""
+    started = time.perf_counter()
+    subprocess.run(
+        command,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动时间基准测试")
+    parser.add_argument("--target", help="构建产物的路径，默认启动源码")
+    parser.add_argument("--runs", type=int, default=10, help="热启动次数")
+    parser.add_argument("--max-warm", type=float, help="热启动中位数上限(秒)")
+    parser.add_argument(
+        "--drop-caches", action="store_true", help="冷启动前清空系统文件缓存"
+    )
+    args = parser.parse_args()
+
+    base = (
+        [args.target] if args.target else [sys.executable, str(ROOT / "downloader.py")]
+    )
+    failures = []
+    with tempfile.TemporaryDirectory() as workdir:
+        verify_dir = Path(workdir) / "output"
+        verify_dir.mkdir()
+        prepare_verify_dir(verify_dir)
+
+        print(f"目标: {' '.join(base)}")
+        print(f"{'任务':<10} {'冷启动(秒)':>10} {'热启动(秒)':>10} {'最快(秒)':>10}")
+        for label, extra in (
+            ("--help", ["--help"]),
+            ("--verify", ["--verify", str(verify_dir)]),
+        ):
+            env = dict(os.environ)
+            if not args.target:
+                # 空的字节码缓存目录：冷启动需要重新编译
+                env["PYTHONPYCACHEPREFIX"] = tempfile.mkdtemp(dir=workdir)
+            if args.drop_caches and not drop_caches():
+                print("警告：没有权限清空系统文件缓存", file=sys.stderr)
+            cold = launch(base + extra, env)
+            warm = [launch(base + extra, env) for _ in range(max(args.runs, 1))]
+            median = statistics.median(warm)
+            print(f"{label:<10} {cold:>10.3f} {median:>10.3f} {min(warm):>10.3f}")
+            if args.max_warm is not None and median > args.max_warm:
+                failures.append(
+                    f"{label} 热启动 {median:.3f} 秒超过上限 {args.max_warm} 秒"
+                )
+
+    for message in failures:
+        print(f"失败: {message}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
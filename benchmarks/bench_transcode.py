@@ -0,0 +1,79 @@
+"""比较整段转码和分段并行转码 MP3 的耗时
+
+用法: python benchmarks/bench_transcode.py [--hours 2] [--segments 0]
+
+用 ffmpeg 在临时目录生成一段合成音频，分别以 1 段和指定段数调用
+convert_to_mp3，并输出耗时和文件大小。需要 PATH 中有 ffmpeg。
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import downloader  # noqa: E402
+
+SAMPLE_RATE = 48000
+
+
+def generate_audio(path: Path, duration: float) -> None:
+    """生成一段带扫频和噪声的合成音频（AAC/M4A）"""
+    source = (
+        f"aevalsrc=0.4*sin(2*PI*(220+40*sin(0.05*t))*t)+0.05*random(0)"
+        f":s={SAMPLE_RATE}:d={duration}"
+    )
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-y", "-f", "lavfi", "-i", source]
+        + ["-c:a", "aac", "-b:a", "160k", str(path)],
+        check=True,
+    )
+
+
+async def time_convert(source: Path, output: Path, duration: float, segments: int):
+    """以指定段数转码一次，返回耗时"""
+    downloader.configure_transcode_segments(segments)
+    started = time.perf_counter()
+    await downloader.convert_to_mp3(source, output, duration, SAMPLE_RATE)
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="MP3 分段转码基准测试")
+    parser.add_argument("--hours", type=float, default=2.0, help="合成音频时长(小时)")
+    parser.add_argument(
+        "--segments", type=int, default=0, help="分段数，0 表示 CPU 核心数"
+    )
+    args = parser.parse_args()
+
+    duration = args.hours * 3600
+    segments = args.segments or (downloader.os.cpu_count() or 1)
+    downloader.configure_concurrency(1)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = Path(workdir) / "source.m4a"
+        print(f"生成 {args.hours} 小时的合成音频...", file=sys.stderr)
+        generate_audio(source, duration)
+
+        results = []
+        for count in (1, segments):
+            output = Path(workdir) / f"output_{count}.mp3"
+            elapsed = await time_convert(source, output, duration, count)
+            results.append((count, elapsed, output.stat().st_size))
+
+    baseline = results[0][1]
+    print()
+    print(f"{'段数':>6} {'耗时(秒)':>10} {'加速比':>8} {'大小(MB)':>10}")
+    for count, elapsed, size in results:
+        print(
+            f"{count:>6} {elapsed:>10.1f} {baseline / elapsed:>8.2f} "
+            f"{size / 1024 / 1024:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
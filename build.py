@@ -1,11 +1,12 @@
 import warnings
+import argparse
+import importlib.util
 import os
 import platform
 import subprocess
 import time
 import threading
 
-
 YOUTUBE_DOWNLOADER_LOGO = """
 __     __  _____   _    _  _______  _    _  ____   ______            
  \ \   / / |_   _| | |  | ||__   __|| |  | ||  _ \ |  ____|     
@@ -84,7 +85,15 @@ def filter_output(output):
     return "\n".join(important_lines)
 
 
-def build():
+def has_lazy_extractors():
+    """Whether yt-dlp ships lazy_extractors, which keeps extractors out of startup"""
+    try:
+        return importlib.util.find_spec("yt_dlp.extractor.lazy_extractors") is not None
+    except ImportError:
+        return False
+
+
+def build(profile="onefile"):
     # Clear screen
     os.system("cls" if platform.system().lower() == "windows" else "clear")
 
@@ -92,13 +101,21 @@ def build():
     print_logo()
 
     system = platform.system().lower()
-    spec_file = os.path.join("YouTubeDownloader.spec")
+    spec_file = os.path.join("YoutubeDownloader.spec")
 
     # if system not in ["darwin", "windows"]:
     #     print(f"\033[91mUnsupported operating system: {system}\033[0m")
     #     return
 
     output_dir = f"dist/{system if system != 'darwin' else 'mac'}"
+    # The fast profile is a onedir layout: the executable sits in its own folder
+    app_dir = output_dir if profile == "onefile" else f"{output_dir}/YoutubeDownloader"
+
+    if not has_lazy_extractors():
+        print(
+            "\033[93mWarning: yt-dlp lazy extractors not found, "
+            "every extractor will be imported at startup\033[0m"
+        )
 
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
@@ -111,16 +128,22 @@ def build():
         "--distpath",
         output_dir,
         "--workpath",
-        f"build/{system}",
+        f"build/{system}-{profile}",
         "--noconfirm",
     ]
+    # The spec file reads the profile from the environment
+    build_env = dict(os.environ, BUILD_PROFILE=profile)
 
     loading = LoadingAnimation()
     try:
         simulate_progress("Running PyInstaller...", 2.0)
         loading.start("Building in progress")
         result = subprocess.run(
-            pyinstaller_command, check=True, capture_output=True, text=True
+            pyinstaller_command,
+            check=True,
+            capture_output=True,
+            text=True,
+            env=build_env,
         )
         loading.stop()
 
@@ -162,23 +185,28 @@ def build():
         simulate_progress("Copying configuration file...", 0.5)
         if system == "windows":
             subprocess.run(
-                ["copy", "config.ini.example", f"{output_dir}\\config.ini"], shell=True
+                ["copy", "config.ini.example", f"{app_dir}\\config.ini"], shell=True
             )
         else:
-            subprocess.run(["cp", "config.ini.example", f"{output_dir}/config.ini"])
+            subprocess.run(["cp", "config.ini.example", f"{app_dir}/config.ini"])
 
     # Copy .env.example file
     if os.path.exists(".env.example"):
         simulate_progress("Copying environment file...", 0.5)
         if system == "windows":
-            subprocess.run(["copy", ".env.example", f"{output_dir}\\.env"], shell=True)
+            subprocess.run(["copy", ".env.example", f"{app_dir}\\.env"], shell=True)
         else:
-            subprocess.run(["cp", ".env.example", f"{output_dir}/.env"])
+            subprocess.run(["cp", ".env.example", f"{app_dir}/.env"])
 
-    print(
-        f"\n\033[92mBuild completed successfully! Output directory: {output_dir}\033[0m"
-    )
+    print(f"\n\033[92mBuild completed successfully! Output directory: {app_dir}\033[0m")
 
 
 if __name__ == "__main__":
-    build()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build YouTube Downloader")
+    parser.add_argument(
+        "--profile",
+        choices=["onefile", "fast"],
+        default="onefile",
+        help="onefile: single executable; fast: startup-optimized onedir layout",
+    )
+    build(parser.parse_args().profile)
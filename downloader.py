@@ -1,35 +1,304 @@
-import yt_dlp
 import subprocess
 import re
 import os
 import platform
-import winreg
 import zipfile
 import shutil
 import time
-import requests
+import abc
 import argparse
+import contextlib
+import contextvars
+import datetime
+import functools
+import hashlib
+import heapq
+import importlib.util
+import json
+import mmap
+import sys
+import errno
+import email.utils
+import atexit
+import multiprocessing
+import multiprocessing.managers
+import queue
+import signal
+import socket
+import sqlite3
 from pathlib import Path
 import asyncio
 import concurrent.futures
-from typing import Dict, List, Tuple, Optional, Any, Union
+import threading
+from collections import deque
+from collections.abc import Mapping
+from typing import Dict, List, Tuple, Optional, Any, Union, Callable, Awaitable
+
+
+class LazyModule:
+    """延迟导入的模块代理：首次访问属性时才真正执行导入
+
+    多个线程同时首次访问时由导入锁保证只导入一次，其他线程等待导入完成，
+    不会读到尚未初始化完成的模块。
+    """
+
+    def __init__(self, name: str) -> None:
+        if importlib.util.find_spec(name) is None:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        self._lazy_name = name
+        self._lazy_module: Any = None
+        self._lazy_lock = threading.Lock()
+
+    def __getattr__(self, attr: str) -> Any:
+        module = self._lazy_module
+        if module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self._lazy_name)
+                module = self._lazy_module
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> Any:
+    """延迟导入模块：已导入时直接返回模块，否则返回首次访问属性时才导入的代理"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+# yt-dlp 和 requests 的导入占启动时间的大部分，--help、--verify 等命令用不到它们
+yt_dlp = lazy_import("yt_dlp")
+requests = lazy_import("requests")
+
+
+class YoutubeDLPool:
+    """按线程复用的 YoutubeDL 实例池
+
+    实例按代理和基础选项区分，保留提取器初始化结果、Cookie 和 HTTP 连接；
+    每次调用的选项（格式、输出文件、进度回调等）只在调用期间生效。
+    YoutubeDL 实例不是线程安全的，因此每个线程持有自己的实例。
+    """
+
+    _MISSING = object()
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @staticmethod
+    def base_options() -> Dict[str, Any]:
+        """创建实例时使用的基础选项"""
+        options = {
+            # 连接保持但完全没有数据时，由套接字超时打断读取
+            "socket_timeout": STALL_WATCHDOG.stall_timeout,
+        }
+        if "ffmpeg" in TOOLCHAIN.paths:
+            # yt-dlp 的修复处理使用同一个 ffmpeg
+            options["ffmpeg_location"] = TOOLCHAIN.paths["ffmpeg"]
+        return options
+
+    def _get_instance(
+        self, proxy: Optional[str]
+    ) -> Tuple["yt_dlp.YoutubeDL", Dict[str, Any]]:
+        """获取当前线程中对应代理和基础选项的实例及其调用状态"""
+        instances = getattr(self._local, "instances", None)
+        if instances is None:
+            instances = self._local.instances = {}
+
+        base_opts = self.base_options()
+        key = (proxy, tuple(sorted(base_opts.items())))
+        instance = instances.get(key)
+        if instance is None:
+            # 调用状态绑定在实例上而不是线程上：并行片段下载会在
+            # yt-dlp 自己的线程中调用进度回调
+            state: Dict[str, Any] = {"progress_hooks": [], "cancel_event": None}
+            ydl = yt_dlp.YoutubeDL(
+                {
+                    **base_opts,
+                    "proxy": proxy,  # 设置代理
+                    "progress_hooks": [
+                        functools.partial(self._dispatch_progress, state)
+                    ],
+                }
+            )
+            instance = instances[key] = (ydl, state)
+        return instance
+
+    @staticmethod
+    def _dispatch_progress(state: Dict[str, Any], d: Dict[str, Any]) -> None:
+        """将进度转发给当前调用的回调函数，调用被取消时中止下载"""
+        cancel_event = state["cancel_event"]
+        if cancel_event is not None and cancel_event.is_set():
+            # yt-dlp 约定的取消方式，已下载的部分保留在 .part 文件中
+            raise yt_dlp.utils.DownloadCancelled("下载已取消")
+        for hook in state["progress_hooks"]:
+            hook(d)
+
+    @contextlib.contextmanager
+    def session(
+        self,
+        proxy: Optional[str] = None,
+        cancel_event: Optional[threading.Event] = None,
+        **call_opts: Any,
+    ):
+        """获取实例并临时应用本次调用的选项，退出时恢复"""
+        ydl, state = self._get_instance(proxy)
+        state["progress_hooks"] = call_opts.pop("progress_hooks", [])
+        state["cancel_event"] = cancel_event
+        outtmpl = call_opts.pop("outtmpl", None)
+
+        saved = {key: ydl.params.get(key, self._MISSING) for key in call_opts}
+        saved_outtmpl = ydl.params["outtmpl"]["default"]
+        saved_selector = ydl.format_selector
+        try:
+            ydl.params.update(call_opts)
+            if outtmpl is not None:
+                ydl.params["outtmpl"]["default"] = outtmpl
+            if "format" in call_opts:
+                # 格式选择器在创建实例时构建，修改格式时需要重新构建
+                ydl.format_selector = ydl.build_format_selector(call_opts["format"])
+            yield ydl
+        finally:
+            for key, value in saved.items():
+                if value is self._MISSING:
+                    ydl.params.pop(key, None)
+                else:
+                    ydl.params[key] = value
+            ydl.params["outtmpl"]["default"] = saved_outtmpl
+            ydl.format_selector = saved_selector
+            state["progress_hooks"] = []
+            state["cancel_event"] = None
+
+    def extract_info(
+        self, url: str, proxy: Optional[str] = None, **call_opts: Any
+    ) -> Dict[str, Any]:
+        """提取信息但不下载"""
+        with self.session(proxy, **call_opts) as ydl:
+            return ydl.extract_info(url, download=False)
+
+
+# 全局 YoutubeDL 实例池
+YDL_POOL = YoutubeDLPool()
+
+
+class ResourceLimiter:
+    """按资源类型限制并发：extraction(信息提取)、transfer(传输)、ffmpeg"""
+
+    def __init__(self, **limits: int) -> None:
+        self.limits = dict(limits)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def configure(self, **limits: int) -> None:
+        """设置各资源的并发上限，需在创建信号量之前调用"""
+        self.limits.update({name: max(limit, 1) for name, limit in limits.items()})
+        self._semaphores.clear()
+
+    def slot(self, name: str) -> asyncio.Semaphore:
+        """获取资源对应的信号量"""
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = self._semaphores[name] = asyncio.Semaphore(
+                self.limits.get(name, 1)
+            )
+        return semaphore
+
+    def thread_budget(self) -> int:
+        """线程池大小：提取和传输的阻塞调用同时运行，另外留出少量余量
+
+        ffmpeg 通过 asyncio 子进程运行，不占用线程。
+        """
+        return self.limits.get("extraction", 1) + self.limits.get("transfer", 1) + 4
+
+
+# 全局资源并发限制，由命令行参数配置
+RESOURCES = ResourceLimiter(
+    extraction=1, transfer=1, ffmpeg=1, transcode=os.cpu_count() or 1
+)
+
+# 协作式取消后等待阻塞调用退出的最长时间（秒），以便保存可续传的部分文件
+CANCEL_GRACE_PERIOD = 5.0
+
+
+async def run_cancellable(func: Callable[[threading.Event], Any]) -> Any:
+    """在线程池中运行阻塞调用，调用被取消时通过事件通知其协作退出"""
+    cancel_event = threading.Event()
+    loop = asyncio.get_running_loop()
+    # 在线程中沿用调用方的上下文变量（如下载任务所在的优先级通道）
+    future = loop.run_in_executor(
+        None, contextvars.copy_context().run, func, cancel_event
+    )
+    # 取消后线程中的调用仍可能以异常结束，读取异常避免未处理异常的警告
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        # 等待线程在下一个数据块/片段处退出，保证部分文件完整可续传
+        await asyncio.wait([future], timeout=CANCEL_GRACE_PERIOD)
+        raise
+
+
+class SingleFlight:
+    """进程内的请求合并：相同键的并发调用只执行一次，共享同一结果"""
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Any, asyncio.Future] = {}
+
+    def is_running(self, key: Any) -> bool:
+        """是否有相同键的调用正在执行"""
+        return key in self._inflight
+
+    async def run(self, key: Any, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 func，相同键正在执行时等待并返回其结果"""
+        while key in self._inflight:
+            future = self._inflight[key]
+            # 等待方被取消时 wait 抛出 CancelledError，不会影响正在执行的调用
+            await asyncio.wait({future})
+            if not future.cancelled():
+                return future.result()
+            # 执行方被取消：等待方重试，由第一个重试的调用方重新执行
+
+        future = asyncio.get_running_loop().create_future()
+        # 没有等待方时也要读取异常，避免未处理异常的警告
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+
+
+# 全局请求合并，提取和下载共用（键的第一项区分用途）
+SINGLE_FLIGHT = SingleFlight()
 
 
 async def get_available_formats(
     url: str, proxy: Optional[str] = None
 ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """获取所有可用格式"""
-    ydl_opts = {
-        "listformats": True,  # 列出所有可用格式
-        "proxy": proxy,  # 设置代理
-    }
 
-    loop = asyncio.get_event_loop()
-    async with asyncio.Lock():
-        info_dict = await loop.run_in_executor(
-            None, lambda: yt_dlp.YoutubeDL(ydl_opts).extract_info(url, download=False)
-        )
-        formats = info_dict.get("formats", [])
+    async def extract() -> Dict[str, Any]:
+        async with RESOURCES.slot("extraction"), REQUEST_PACER.request("extraction"):
+            return await run_cancellable(
+                lambda cancel_event: YDL_POOL.extract_info(
+                    url, proxy, listformats=True  # 列出所有可用格式
+                )
+            )
+
+    # 相同视频的并发提取共享同一次结果（媒体地址与出口IP绑定，因此区分代理）
+    info_dict = await SINGLE_FLIGHT.run(
+        ("extract", extract_video_id(url) or url, proxy), extract
+    )
+    formats = info_dict.get("formats", [])
 
     return formats, info_dict
 
@@ -72,6 +341,342 @@ def select_best_formats(
     return best_video, best_audio
 
 
+# 下载、空间估算和格式校验用到的格式字段
+FORMAT_KEEP_KEYS = (
+    "format_id",
+    "ext",
+    "vcodec",
+    "acodec",
+    "width",
+    "height",
+    "asr",
+    "audio_channels",
+    "tbr",
+    "filesize",
+    "filesize_approx",
+    "protocol",
+)
+
+
+def prune_format(
+    fmt: Optional[Dict[str, Any]], keys: Tuple[str, ...] = FORMAT_KEEP_KEYS
+) -> Optional[Dict[str, Any]]:
+    """只保留格式中需要的字段，丢弃片段列表、请求头等大对象"""
+    if fmt is None:
+        return None
+    return {key: fmt[key] for key in keys if fmt.get(key) is not None}
+
+
+# 格式没有大小信息时使用的估算码率（字节/秒），约为 1080p 视频加音频
+ASSUMED_BYTES_PER_SECOND = 600 * 1024
+# 没有格式信息时假定的音频格式（总码率 kbps）
+ASSUMED_AUDIO_FORMAT = {"tbr": 160}
+# 转换后 MP3 的估算码率（-q:a 2 约为 190kbps）
+MP3_BYTES_PER_SECOND = 190 * 1000 // 8
+# 播放列表条目没有时长信息时使用的估算时长（秒）
+ASSUMED_DURATION = 600
+# 估算误差的预留比例
+DISK_SPACE_MARGIN = 1.05
+
+
+def estimate_format_size(
+    fmt: Optional[Dict[str, Any]], duration: Optional[float] = None
+) -> Optional[int]:
+    """根据格式元数据估算文件大小"""
+    if not fmt:
+        return None
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    # 用总码率(kbps)和时长估算
+    if fmt.get("tbr") and duration:
+        return int(fmt["tbr"] * 1000 / 8 * duration)
+    return None
+
+
+def estimate_disk_usage(
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Optional[Dict[str, Any]],
+    only_audio: bool = False,
+    duration: Optional[float] = None,
+) -> Tuple[int, int]:
+    """估算下载所需空间，返回 (临时目录所需字节数, 输出目录所需字节数)
+
+    临时目录所需空间包括临时流文件和写入中的 .part 输出。
+    """
+    audio_size = estimate_format_size(best_audio, duration) or 0
+    if only_audio:
+        output_size = int(MP3_BYTES_PER_SECOND * duration) if duration else audio_size
+    else:
+        video_size = estimate_format_size(best_video, duration) or 0
+        if not video_size and duration:
+            video_size = int(ASSUMED_BYTES_PER_SECOND * duration)
+        audio_size += video_size
+        output_size = audio_size  # 合并只复制视频流，输出大小约等于两个流之和
+
+    # 合并/转换时临时流文件和 .part 输出同时存在于临时目录
+    scratch_size = int((audio_size + output_size) * DISK_SPACE_MARGIN)
+    return scratch_size, int(output_size * DISK_SPACE_MARGIN)
+
+
+def _existing_parent(path: Path) -> Path:
+    """返回路径本身或最近的已存在的上级目录"""
+    path = Path(path).resolve()
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def device_of(path: Path) -> int:
+    """路径（不存在时为最近的上级目录）所在的设备号"""
+    return _existing_parent(path).stat().st_dev
+
+
+def disk_space_needs(
+    scratch_dir: Path, output_dir: Path, scratch_size: int, output_size: int
+) -> List[Tuple[Path, int]]:
+    """下载需要预留的空间
+
+    .part 输出写在临时目录中，完成后移动到输出目录：两个目录在同一设备上时
+    只是重命名，输出只计一次；不在同一设备上时复制期间两份同时存在。
+    """
+    if device_of(scratch_dir) == device_of(output_dir):
+        return [(scratch_dir, scratch_size)]
+    return [(scratch_dir, scratch_size), (output_dir, output_size)]
+
+
+def _push_largest(heap: List[int], size: int, limit: int) -> int:
+    """把 size 加入保留最大 limit 个值的最小堆，返回堆中各值之和的变化"""
+    if len(heap) < limit:
+        heapq.heappush(heap, size)
+        return size
+    smallest = heapq.heappushpop(heap, size)
+    return size - smallest
+
+
+class DiskSpaceLedger:
+    """磁盘空间预留记录，并行下载之间共享，避免重复计算剩余空间"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._reserved: Dict[int, int] = {}  # 设备号 -> 已预留字节数
+
+    def _group_by_device(
+        self, needs: List[Tuple[Path, int]]
+    ) -> Dict[int, Tuple[Path, int]]:
+        """将各路径所需空间按所在设备合并"""
+        grouped: Dict[int, Tuple[Path, int]] = {}
+        for path, size in needs:
+            existing = _existing_parent(path)
+            device = device_of(existing)
+            _, total = grouped.get(device, (existing, 0))
+            grouped[device] = (existing, total + size)
+        return grouped
+
+    def reserve(self, needs: List[Tuple[Path, int]]) -> Optional[str]:
+        """预留空间，空间不足时返回错误描述，成功时返回 None"""
+        with self._lock:
+            grouped = self._group_by_device(needs)
+            for device, (path, size) in grouped.items():
+                free = shutil.disk_usage(path).free - self._reserved.get(device, 0)
+                if size > free:
+                    return (
+                        f"磁盘空间不足({path}): 需要 {size / 1024 ** 3:.2f}GB，"
+                        f"可用 {max(free, 0) / 1024 ** 3:.2f}GB"
+                    )
+            for device, (_, size) in grouped.items():
+                self._reserved[device] = self._reserved.get(device, 0) + size
+            return None
+
+    def share(self, lock: Any, reserved: Any) -> None:
+        """改用跨进程共享的锁和预留记录，多进程下载时各进程共同计算剩余空间"""
+        self._lock = lock
+        self._reserved = reserved
+
+    def release(self, needs: List[Tuple[Path, int]]) -> None:
+        """释放预留的空间"""
+        with self._lock:
+            for device, (_, size) in self._group_by_device(needs).items():
+                self._reserved[device] = max(self._reserved.get(device, 0) - size, 0)
+
+    def fit_entries(
+        self,
+        entries: List[Dict[str, Any]],
+        playlist_dir: str,
+        only_audio: bool = False,
+        concurrent_downloads: int = 1,
+    ) -> int:
+        """按播放列表顺序计算磁盘空间能容纳的条目数
+
+        输出文件全部保留；临时文件只有并行下载中的条目同时存在。
+        """
+        durations = [e.get("duration") for e in entries if e.get("duration")]
+        default_duration = (
+            sum(durations) / len(durations) if durations else ASSUMED_DURATION
+        )
+
+        output_path = get_output_dir(playlist_dir)
+        scratch_path = get_scratch_dir(playlist_dir)
+        same_device = device_of(output_path) == device_of(scratch_path)
+        output_free = shutil.disk_usage(_existing_parent(output_path)).free
+        scratch_free = shutil.disk_usage(_existing_parent(scratch_path)).free
+
+        output_total = 0
+        # 最大的 concurrent_downloads 个临时文件大小（最小堆）及其和
+        scratch_largest: List[int] = []
+        stream_largest: List[int] = []
+        scratch_peak = stream_peak = 0
+        for count, entry in enumerate(entries):
+            # 扁平条目没有格式信息，按估算码率计算
+            scratch_size, output_size = estimate_disk_usage(
+                None,
+                ASSUMED_AUDIO_FORMAT,
+                only_audio,
+                entry.get("duration") or default_duration,
+            )
+            output_total += output_size
+            if same_device:
+                # 输出由 .part 原地重命名而来，下载中的条目只需另算临时流文件
+                stream_peak += _push_largest(
+                    stream_largest, scratch_size - output_size, concurrent_downloads
+                )
+                fits = output_total + stream_peak <= output_free
+            else:
+                scratch_peak += _push_largest(
+                    scratch_largest, scratch_size, concurrent_downloads
+                )
+                fits = output_total <= output_free and scratch_peak <= scratch_free
+            if not fits:
+                return count
+        return len(entries)
+
+
+# 全局磁盘空间预留记录
+DISK_SPACE = DiskSpaceLedger()
+
+# 设置了内存预算时每个传输和每个并行片段的读取缓冲区大小（字节），固定大小以便按预算计算内存
+MEMORY_BUFFER_SIZE = 1024 * 1024
+# yt-dlp 随速度调整的读取缓冲区的上限，未设置预算时按此统计用量
+YTDL_MAX_BUFFER_SIZE = 4 * 1024 * 1024
+# 内存预算不足时重新检查的间隔（秒）
+MEMORY_WAIT_INTERVAL = 0.5
+
+
+def parse_memory_budget(value: str) -> int:
+    """解析内存预算，如 256M、1G（字节）"""
+    budget = yt_dlp.utils.parse_bytes(value)
+    if not budget:
+        raise argparse.ArgumentTypeError(f"无效的内存预算: {value}（如 256M、1G）")
+    return int(budget)
+
+
+class MemoryBudget:
+    """进行中传输的缓冲区内存预算，所有下载共享
+
+    每个传输开始前按并行片段数预留缓冲区：预算不足时减少该传输的并行片段数，
+    一个缓冲区也放不下时等待其他传输释放，而不是无限制地缓冲。
+    未设置预算时只统计用量。
+    """
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        self.limit = limit
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._peak = 0
+
+    def configure(self, limit: Optional[int]) -> None:
+        """设置预算（字节），None 表示不限"""
+        with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def acquire(
+        self,
+        buffers: int,
+        buffer_size: int = MEMORY_BUFFER_SIZE,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> int:
+        """预留最多 buffers 个缓冲区，返回实际得到的数量（至少 1 个）"""
+        buffers = max(buffers, 1)
+        started = None
+        with self._condition:
+            while True:
+                if self.limit is None:
+                    granted = buffers
+                else:
+                    granted = min(buffers, (self.limit - self._in_use) // buffer_size)
+                    if self._in_use == 0:
+                        granted = max(granted, 1)  # 单个缓冲区超出预算时仍允许下载
+                if granted >= 1:
+                    break
+                if cancel_event is not None and cancel_event.is_set():
+                    raise yt_dlp.utils.DownloadCancelled("下载已取消")
+                if started is None:
+                    started = time.monotonic()
+                    print("\n内存预算已用完，等待其他传输释放缓冲区...")
+                self._condition.wait(MEMORY_WAIT_INTERVAL)
+            self._in_use += granted * buffer_size
+            self._peak = max(self._peak, self._in_use)
+            in_use, peak = self._in_use, self._peak
+
+        METRICS.set_gauge("memory.in_use", in_use)
+        METRICS.set_gauge("memory.peak", peak)
+        if started is not None:
+            METRICS.increment("memory.waited", time.monotonic() - started)
+        if granted < buffers:
+            METRICS.increment("memory.reduced")
+        return granted
+
+    def release(self, buffers: int, buffer_size: int = MEMORY_BUFFER_SIZE) -> None:
+        """释放预留的缓冲区"""
+        with self._condition:
+            self._in_use = max(self._in_use - buffers * buffer_size, 0)
+            in_use = self._in_use
+            self._condition.notify_all()
+        METRICS.set_gauge("memory.in_use", in_use)
+
+    @contextlib.contextmanager
+    def reserve(
+        self,
+        buffers: int,
+        buffer_size: int = MEMORY_BUFFER_SIZE,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        """在传输期间预留缓冲区，返回得到的缓冲区数"""
+        granted = self.acquire(buffers, buffer_size, cancel_event)
+        try:
+            yield granted
+        finally:
+            self.release(granted, buffer_size)
+
+    def describe(self) -> str:
+        """当前用量，如 12.0/64.0MB"""
+        limit = f"{self.limit / 1024 / 1024:.1f}MB" if self.limit else "不限"
+        return f"{self._in_use / 1024 / 1024:.1f}MB/{limit}"
+
+
+# 全局缓冲区内存预算，由命令行参数配置
+MEMORY_BUDGET = MemoryBudget()
+
+
+def report_memory_stats() -> None:
+    """设置了内存预算时输出缓冲区用量峰值和等待时间"""
+    if MEMORY_BUDGET.limit is None:
+        return
+    snapshot = METRICS.snapshot()
+    peak = snapshot["gauges"].get("memory.peak", 0)
+    waited = snapshot["counters"].get("memory.waited", 0)
+    reduced = snapshot["counters"].get("memory.reduced", 0)
+    print(
+        f"内存预算: 缓冲区峰值 {peak / 1024 / 1024:.1f}MB，"
+        f"等待释放 {waited:.0f} 秒，减少并行片段 {reduced:.0f} 次"
+    )
+
+
 def sanitize_filename(filename: str) -> str:
     """清理文件名，移除非法字符"""
     path = Path(filename)
@@ -119,14 +724,197 @@ def download_progress_hook(d: Dict[str, Any]) -> None:
             downloaded_mb = downloaded / 1024 / 1024
             total_mb = total / 1024 / 1024
             speed_kb = speed / 1024 if speed else 0
+            memory = (
+                f" | 缓冲: {MEMORY_BUDGET.describe()}" if MEMORY_BUDGET.limit else ""
+            )
             print(
                 f"\r下载进度: {percentage:.1f}% | "
                 f"已下载: {downloaded_mb:.2f}MB / {total_mb:.2f}MB | "
-                f"速度: {speed_kb:.2f}KB/s",
+                f"速度: {speed_kb:.2f}KB/s{memory}",
                 end="",
             )
 
 
+class TransferStalledError(Exception):
+    """传输停滞异常，吞吐量持续低于阈值时抛出"""
+
+
+class StallWatchdog:
+    """传输停滞监控器，按传输跟踪滚动吞吐量窗口"""
+
+    def __init__(
+        self,
+        stall_timeout: float = 30.0,
+        min_speed: float = 10 * 1024,
+        window: float = 10.0,
+        max_restarts: int = 3,
+    ) -> None:
+        self.stall_timeout = stall_timeout  # 低速持续多少秒判定为停滞
+        self.min_speed = min_speed  # 吞吐量阈值（字节/秒）
+        self.window = window  # 滚动窗口长度（秒）
+        self.max_restarts = max_restarts  # 停滞后最多重启次数
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._slow_since: Dict[str, float] = {}
+        self._stalled: set = set()
+
+    def configure(
+        self,
+        stall_timeout: Optional[float] = None,
+        min_speed: Optional[float] = None,
+        max_restarts: Optional[int] = None,
+    ) -> None:
+        """更新监控参数"""
+        if stall_timeout is not None:
+            self.stall_timeout = stall_timeout
+            # 窗口不超过停滞判定时间，避免短时间内无法判定
+            self.window = min(self.window, stall_timeout)
+        if min_speed is not None:
+            self.min_speed = min_speed
+        if max_restarts is not None:
+            self.max_restarts = max_restarts
+
+    def start(self, key: str) -> None:
+        """开始监控一个传输（重启时会清空之前的采样）"""
+        with self._lock:
+            self._samples[key] = deque()
+            self._slow_since.pop(key, None)
+            self._stalled.discard(key)
+
+    def stop(self, key: str) -> None:
+        """停止监控一个传输"""
+        with self._lock:
+            self._samples.pop(key, None)
+            self._slow_since.pop(key, None)
+            self._stalled.discard(key)
+
+    def is_stalled(self, key: str) -> bool:
+        """传输是否已被判定为停滞"""
+        with self._lock:
+            return key in self._stalled
+
+    def record(
+        self, key: str, downloaded_bytes: int, now: Optional[float] = None
+    ) -> None:
+        """记录传输进度，吞吐量持续低于阈值时抛出 TransferStalledError"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            samples = self._samples.setdefault(key, deque())
+            samples.append((now, downloaded_bytes))
+
+            # 只保留窗口内的采样，外加一个窗口边界之前的采样用于计算
+            while len(samples) > 2 and now - samples[1][0] >= self.window:
+                samples.popleft()
+
+            first_time, first_bytes = samples[0]
+            elapsed = now - first_time
+            if elapsed < self.window:
+                return  # 采样尚未覆盖一个完整窗口
+
+            throughput = (downloaded_bytes - first_bytes) / elapsed
+            if throughput >= self.min_speed:
+                self._slow_since.pop(key, None)
+                return
+
+            slow_since = self._slow_since.setdefault(key, first_time)
+            if now - slow_since >= self.stall_timeout:
+                self._stalled.add(key)
+                raise TransferStalledError(
+                    f"传输停滞: {throughput / 1024:.2f}KB/s 已持续 "
+                    f"{now - slow_since:.0f} 秒"
+                )
+
+    def hook(self, d: Dict[str, Any]) -> None:
+        """yt-dlp 进度回调，将进度送入监控器"""
+        if d["status"] == "downloading" and d.get("filename"):
+            self.record(d["filename"], d.get("downloaded_bytes") or 0)
+
+
+# 全局停滞监控器，参数由命令行配置
+STALL_WATCHDOG = StallWatchdog()
+
+
+def run_ytdl_download(
+    url: str,
+    ydl_opts: Dict[str, Any],
+    filename: Union[str, Path],
+    cancel_event: Optional[threading.Event] = None,
+) -> None:
+    """运行 yt-dlp 下载，传输停滞时从部分文件重新开始"""
+    key = str(filename)
+    proxy = ydl_opts.get("proxy")
+    call_opts = {k: v for k, v in ydl_opts.items() if k != "proxy"}
+    # 每个并行片段一个读取缓冲区：设置了内存预算时固定大小，
+    # 否则保留 yt-dlp 随速度增大的缓冲区，按其上限统计用量
+    fragments = call_opts.get("concurrent_fragment_downloads") or 1
+    buffer_size = YTDL_MAX_BUFFER_SIZE
+    if MEMORY_BUDGET.limit is not None:
+        buffer_size = MEMORY_BUFFER_SIZE
+        call_opts["buffersize"] = MEMORY_BUFFER_SIZE
+        call_opts["noresizebuffer"] = True
+    # 时间窗口和优先级通道的暂停在停滞监控之前，暂停结束后监控重新开始；
+    # 每次开始传输时为 .part 文件预留空间（yt-dlp 以 wb 打开新文件时会截断）
+    reserved: set = set()
+    call_opts["progress_hooks"] = [
+        functools.partial(preallocate_hook, reserved),
+        *ydl_opts.get("progress_hooks", []),
+        functools.partial(TIME_WINDOWS.hook, key, cancel_event),
+        STALL_WATCHDOG.hook,
+    ]
+    lane = CURRENT_LANE.get()
+    if lane is not None:
+        # 队列中的任务：有更高优先级通道的任务时在此暂停
+        call_opts["progress_hooks"].insert(
+            -1, functools.partial(PRIORITY_LANES.hook, key, lane, cancel_event)
+        )
+    # 片段和 HTTP 重试按限速器退避，避免被限流时连续重试
+    call_opts["retry_sleep_functions"] = {
+        "http": REQUEST_PACER.retry_sleep,
+        "fragment": REQUEST_PACER.retry_sleep,
+    }
+    if PROXY_POOL.enabled:
+        # 统计各代理的吞吐量
+        call_opts["progress_hooks"].append(
+            functools.partial(PROXY_POOL.record_progress, proxy)
+        )
+
+    for attempt in range(STALL_WATCHDOG.max_restarts + 1):
+        reserved.clear()
+        STALL_WATCHDOG.start(key)
+        TIME_WINDOWS.start(key)
+        PRIORITY_LANES.start(key)
+        try:
+            # 按内存预算减少并行片段数，预算用完时等待
+            with MEMORY_BUDGET.reserve(fragments, buffer_size, cancel_event) as granted:
+                call_opts["concurrent_fragment_downloads"] = granted
+                with YDL_POOL.session(proxy, cancel_event, **call_opts) as ydl:
+                    ydl.download([url])
+            return
+        except Exception:
+            if (
+                not STALL_WATCHDOG.is_stalled(key)
+                or attempt >= STALL_WATCHDOG.max_restarts
+                or (cancel_event is not None and cancel_event.is_set())
+            ):
+                raise
+            # yt-dlp 默认从 .part 文件续传
+            print(
+                f"\n传输停滞，正在从部分文件重新开始"
+                f"({attempt + 1}/{STALL_WATCHDOG.max_restarts})..."
+            )
+        finally:
+            STALL_WATCHDOG.stop(key)
+            TIME_WINDOWS.stop(key)
+            PRIORITY_LANES.stop(key)
+
+
+def fragment_concurrency(fmt: Dict[str, Any], concurrent_fragments: int) -> int:
+    """格式实际使用的并行片段数：非分片的 HTTP 格式只有一个传输"""
+    if fmt.get("protocol") in ("http", "https"):
+        return 1
+    return concurrent_fragments
+
+
 async def download_audio(
     url: str,
     audio_format: Dict[str, Any],
@@ -140,19 +928,24 @@ async def download_audio(
             "format": audio_format["format_id"],
             "outtmpl": str(filename),
             "proxy": proxy,
-            "concurrent_fragment_downloads": concurrent_fragments,  # 并行下载片段
+            # 并行下载片段
+            "concurrent_fragment_downloads": fragment_concurrency(
+                audio_format, concurrent_fragments
+            ),
             "progress_hooks": [download_progress_hook],
         }
         print("\n正在下载音频流...")
 
-        loop = asyncio.get_event_loop()
-        async with asyncio.Lock():
-            await loop.run_in_executor(
-                None, lambda: yt_dlp.YoutubeDL(audio_opts).download([url])
+        async with RESOURCES.slot("transfer"), REQUEST_PACER.request("transfer"):
+            await run_cancellable(
+                lambda cancel_event: run_ytdl_download(
+                    url, audio_opts, filename, cancel_event
+                )
             )
         return True, filename
     except Exception as e:
         print(f"\n下载音频出错: {str(e)}")
+        PROXY_POOL.report_error(proxy, e)
         return False, None
 
 
@@ -169,184 +962,1987 @@ async def download_video(
             "format": video_format["format_id"],
             "outtmpl": str(filename),
             "proxy": proxy,
-            "concurrent_fragment_downloads": concurrent_fragments,  # 并行下载片段
+            # 并行下载片段
+            "concurrent_fragment_downloads": fragment_concurrency(
+                video_format, concurrent_fragments
+            ),
             "progress_hooks": [download_progress_hook],
         }
         print("\n正在下载视频流...")
 
-        loop = asyncio.get_event_loop()
-        async with asyncio.Lock():
-            await loop.run_in_executor(
-                None, lambda: yt_dlp.YoutubeDL(video_opts).download([url])
+        async with RESOURCES.slot("transfer"), REQUEST_PACER.request("transfer"):
+            await run_cancellable(
+                lambda cancel_event: run_ytdl_download(
+                    url, video_opts, filename, cancel_event
+                )
             )
         return True, filename
     except Exception as e:
         print(f"\n下载视频出错: {str(e)}")
+        PROXY_POOL.report_error(proxy, e)
         return False, None
 
 
+class Metrics:
+    """线程安全的运行指标：累计计数和最近一次的数值"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """累加计数"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """记录最近一次的数值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """获取当前所有指标的副本"""
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+    def merge(self, snapshot: Dict[str, Dict[str, float]]) -> None:
+        """合并其他进程的指标快照：计数累加，数值取最新"""
+        with self._lock:
+            for name, value in snapshot.get("counters", {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            self._gauges.update(snapshot.get("gauges", {}))
+
+
+# 全局运行指标
+METRICS = Metrics()
+
+
+# 令牌桶容量：允许多少秒的请求量突发
+PACER_BURST_SECONDS = 5.0
+# 检测到限流后各类请求速率降为原来的比例
+PACER_BACKOFF_FACTOR = 0.5
+# 速率最低降到上限的比例
+PACER_MIN_FRACTION = 0.05
+# 每次成功请求后速率恢复上限的比例
+PACER_RECOVERY_STEP = 0.05
+# 没有 Retry-After 时的全局暂停时长（秒），连续限流时加倍
+PACER_DEFAULT_PAUSE = 30.0
+PACER_MAX_PAUSE = 900.0
+# 信息提取耗时超过基线的倍数时视为服务器在放慢响应
+PACER_SLOW_FACTOR = 3.0
+# yt-dlp 内部重试传输时的退避上限（秒）
+PACER_RETRY_MAX = 60.0
+THROTTLE_ERROR_PATTERN = re.compile(r"HTTP Error 429|Too Many Requests", re.IGNORECASE)
+
+
+def _error_chain(error: BaseException) -> List[BaseException]:
+    """展开异常链：yt-dlp 把原始 HTTP 错误包在 cause 或 exc_info 中"""
+    chain: List[BaseException] = []
+    pending: List[Any] = [error]
+    while pending:
+        current = pending.pop()
+        if not isinstance(current, BaseException) or any(
+            current is seen for seen in chain
+        ):
+            continue
+        chain.append(current)
+        exc_info = getattr(current, "exc_info", None)
+        pending.extend(
+            [
+                getattr(current, "cause", None),
+                current.__cause__,
+                current.__context__,
+                exc_info[1] if exc_info else None,
+            ]
+        )
+    return chain
+
+
+def is_throttle_error(error: BaseException) -> bool:
+    """错误是否表示请求过于频繁（HTTP 429）"""
+    return any(
+        getattr(e, "status", None) == 429 or THROTTLE_ERROR_PATTERN.search(str(e))
+        for e in _error_chain(error)
+    )
+
+
+def retry_after_seconds(
+    error: BaseException, now: Optional[float] = None
+) -> Optional[float]:
+    """从错误的 HTTP 响应中读取 Retry-After（秒数或日期），没有时返回 None"""
+    for e in _error_chain(error):
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        value = headers.get("Retry-After") if headers is not None else None
+        if not value:
+            continue
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp()
+            except (TypeError, ValueError):
+                continue
+            seconds -= time.time() if now is None else now
+        return min(max(seconds, 0.0), PACER_MAX_PAUSE)
+    return None
+
+
+class TokenBucket:
+    """令牌桶：按速率补充令牌，令牌可以预支，预支的请求按顺序排到之后的时刻"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst_seconds: float = PACER_BURST_SECONDS,
+        now: Optional[float] = None,
+    ) -> None:
+        self.max_rate = rate  # 配置的速率上限（请求/秒或字节/秒）
+        self.rate = rate  # 当前速率，限流时降低
+        self.burst = max(rate * burst_seconds, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic() if now is None else now
+
+    def reserve(self, at: float, amount: float = 1.0) -> float:
+        """预留令牌，返回可以发出请求的时刻（不早于 at）"""
+        if at > self.updated:
+            self.tokens = min(self.tokens + (at - self.updated) * self.rate, self.burst)
+            self.updated = at
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return self.updated
+        return self.updated + -self.tokens / self.rate
+
+    def drain(self, until: float) -> None:
+        """清空积攒的令牌，until 之前不再补充，避免暂停结束后集中发出请求"""
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, until)
+
+
+class RequestPacer:
+    """按请求类型分别限速，检测到限流时全局退避并逐步恢复
+
+    extraction(信息提取) 和 transfer(媒体传输) 使用各自的令牌桶。收到 429 时
+    遵守 Retry-After 暂停所有新请求，各类请求速率减半；之后每次成功的请求
+    线性恢复速率。暂停只推迟新请求，正在进行的传输不受影响。
+    单调时钟和墙上时钟可以替换，以便用模拟时间测试。
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], float] = time.monotonic,
+        wall_clock: Callable[[], float] = time.time,
+        **rates: float,
+    ) -> None:
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._paused_until = 0.0  # 墙上时间，可在进程间共享
+        self._last_throttle = 0.0  # 最近一次限流的时刻（单调时间）
+        self._strikes = 0  # 连续限流次数
+        self._baseline: Optional[float] = None  # 信息提取耗时的滑动平均
+        self._shared: Optional[Any] = None
+        self.configure(**rates)
+
+    def configure(self, **rates: float) -> None:
+        """设置各类请求的速率上限（请求/秒）"""
+        with self._lock:
+            for name, rate in rates.items():
+                self._buckets[name] = TokenBucket(max(rate, 0.01), now=self.clock())
+
+    def rates(self) -> Dict[str, float]:
+        """各类请求的速率上限"""
+        with self._lock:
+            return {name: bucket.max_rate for name, bucket in self._buckets.items()}
+
+    def share(self, state: Optional[Any]) -> None:
+        """使用跨进程共享的暂停状态（管理进程中的字典），None 表示只在本进程内退避"""
+        self._shared = state
+
+    def pause_remaining(self) -> float:
+        """全局暂停还剩多少秒"""
+        paused_until = self._paused_until
+        if self._shared is not None:
+            paused_until = max(paused_until, self._shared.get("paused_until", 0.0))
+        return max(paused_until - self.wall_clock(), 0.0)
+
+    def _reserve(self, kind: str) -> float:
+        """预留一次请求，返回需要等待的秒数"""
+        pause = self.pause_remaining()
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(kind)
+            if bucket is None:
+                return pause
+            if pause > 0:
+                bucket.drain(now + pause)
+            return max(bucket.reserve(now + pause) - now, 0.0)
+
+    def throttled(
+        self, kind: str, retry_after: Optional[float], started: float
+    ) -> None:
+        """记录一次限流：暂停所有新请求，降低各类请求的速率"""
+        with self._lock:
+            now = self.clock()
+            # 同一次限流期间发出的其他请求也会失败，只计一次
+            repeated = started < self._last_throttle
+            if not repeated:
+                self._strikes += 1
+                self._last_throttle = now
+                for bucket in self._buckets.values():
+                    bucket.rate = max(
+                        bucket.rate * PACER_BACKOFF_FACTOR,
+                        bucket.max_rate * PACER_MIN_FRACTION,
+                    )
+            if retry_after is None:
+                retry_after = min(
+                    PACER_DEFAULT_PAUSE * 2 ** (self._strikes - 1), PACER_MAX_PAUSE
+                )
+            paused_until = max(self._paused_until, self.wall_clock() + retry_after)
+            self._paused_until = paused_until
+            for bucket in self._buckets.values():
+                bucket.drain(now + retry_after)
+        if self._shared is not None:
+            self._shared["paused_until"] = max(
+                self._shared.get("paused_until", 0.0), paused_until
+            )
+        METRICS.increment(f"pacer.{kind}.throttled")
+        if not repeated:
+            print(f"\n请求过于频繁，暂停 {retry_after:.0f} 秒后降低请求速率继续...")
+
+    def succeeded(self, kind: str, started: float) -> None:
+        """记录一次成功的请求：逐步恢复速率，信息提取明显变慢时主动降速"""
+        now = self.clock()
+        elapsed = now - started
+        with self._lock:
+            bucket = self._buckets.get(kind)
+            if bucket is None or started <= self._last_throttle:
+                return  # 限流之前发出的请求不代表限流已经解除
+            self._strikes = 0
+            if kind == "extraction":
+                baseline = self._baseline
+                self._baseline = (
+                    elapsed if baseline is None else 0.9 * baseline + 0.1 * elapsed
+                )
+                if baseline is not None and elapsed > baseline * PACER_SLOW_FACTOR:
+                    # 服务器放慢响应往往是限流的前兆
+                    bucket.rate = max(
+                        bucket.rate * PACER_BACKOFF_FACTOR,
+                        bucket.max_rate * PACER_MIN_FRACTION,
+                    )
+                    METRICS.increment("pacer.extraction.slow")
+                    return
+            bucket.rate = min(
+                bucket.rate + bucket.max_rate * PACER_RECOVERY_STEP, bucket.max_rate
+            )
+
+    @contextlib.asynccontextmanager
+    async def request(self, kind: str):
+        """按速率等待后发出一次请求，请求因限流失败时触发退避"""
+        while True:
+            reserved = self.clock()
+            delay = self._reserve(kind)
+            if delay <= 0:
+                break
+            METRICS.increment(f"pacer.{kind}.wait", delay)
+            await asyncio.sleep(delay)
+            if self._last_throttle <= reserved:
+                break
+            # 等待期间发生了限流，按新的暂停时间和速率重新排队
+        started = self.clock()
+        try:
+            yield
+        except Exception as e:
+            if is_throttle_error(e):
+                self.throttled(kind, retry_after_seconds(e, self.wall_clock()), started)
+            raise
+        else:
+            self.succeeded(kind, started)
+
+    def retry_sleep(self, n: int) -> float:
+        """yt-dlp 内部重试前的等待时间：指数退避，全局暂停期间等到暂停结束"""
+        return max(self.pause_remaining(), min(2.0**n, PACER_RETRY_MAX))
+
+
+# 全局请求限速，由命令行参数配置
+REQUEST_PACER = RequestPacer(extraction=0.5, transfer=2.0)
+
+
+def report_pacer_stats() -> None:
+    """有限流或限速等待时输出统计"""
+    counters = METRICS.snapshot()["counters"]
+    throttled = sum(
+        counters.get(f"pacer.{k}.throttled", 0) for k in REQUEST_PACER.rates()
+    )
+    waited = sum(counters.get(f"pacer.{k}.wait", 0) for k in REQUEST_PACER.rates())
+    if throttled or waited >= 1:
+        print(f"请求限速: 检测到限流 {int(throttled)} 次，累计等待 {waited:.0f} 秒")
+
+
+# 时间窗口暂停或限速时重新检查的间隔（秒）
+WINDOW_POLL_INTERVAL = 1.0
+# 窗口带宽允许的突发量（秒）
+WINDOW_BURST_SECONDS = 1.0
+TIME_WINDOW_PATTERN = re.compile(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})")
+
+
+def parse_time_window(value: str) -> Dict[str, Any]:
+    """解析 HH:MM-HH:MM,并行数[,带宽] 格式的时间窗口，带宽如 5M、500K（字节/秒）"""
+    parts = [part.strip() for part in value.split(",")]
+    match = TIME_WINDOW_PATTERN.fullmatch(parts[0])
+    try:
+        if not match or len(parts) not in (2, 3):
+            raise ValueError
+        start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+        start = start_hour * 60 + start_minute
+        end = end_hour * 60 + end_minute
+        workers = int(parts[1])
+        rate = yt_dlp.utils.parse_bytes(parts[2]) if len(parts) == 3 else None
+        if (
+            max(start_minute, end_minute) >= 60
+            or max(start, end) > 24 * 60
+            or start == end
+            or not 0 <= workers <= 10
+            or (len(parts) == 3 and not rate)
+        ):
+            raise ValueError
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"无效的时间窗口: {value}（格式为 HH:MM-HH:MM,并行数[,带宽]，"
+            "并行数为 0-10，如 09:00-18:00,2,5M）"
+        )
+    return {
+        "label": parts[0],
+        "start": start,
+        "end": end,
+        "workers": workers,
+        "rate": float(rate) if rate else None,
+    }
+
+
+class TimeWindowScheduler:
+    """按一天中的时间窗口调整并行下载数和总带宽
+
+    不在任何窗口中时使用命令行设置的并行数且不限速。并行数降低时最早开始的
+    传输继续，其余传输在进度回调中暂停，窗口允许时从原位置继续。
+    时钟和等待函数可以替换，以便用模拟时间测试。
+    """
+
+    def __init__(
+        self,
+        clock: Callable[[], datetime.datetime] = datetime.datetime.now,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.clock = clock
+        self.sleep = sleep
+        self.windows: List[Dict[str, Any]] = []
+        self.default_workers: Optional[int] = None  # 窗口外的并行数，None 表示不限
+        self._lock = threading.Lock()
+        # 进行中的传输（按开始顺序）及上次报告的已下载字节数
+        self._transfers: Dict[str, Optional[int]] = {}
+        self._running = 0  # 进行中的下载任务数
+        self._bucket: Optional[TokenBucket] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.windows)
+
+    def configure(
+        self,
+        windows: Optional[List[Dict[str, Any]]] = None,
+        default_workers: Optional[int] = None,
+    ) -> None:
+        """更新时间窗口和窗口外的并行数"""
+        with self._lock:
+            if windows is not None:
+                self.windows = list(windows)
+            if default_workers is not None:
+                self.default_workers = default_workers
+            self._bucket = None
+
+    def share(self, parts: int, index: int) -> Tuple[List[Dict[str, Any]], int]:
+        """多进程下载时第 index 个进程分到的时间窗口和窗口外并行数"""
+
+        def part(workers: int) -> int:
+            return workers // parts + (1 if index < workers % parts else 0)
+
+        windows = [
+            dict(
+                window,
+                workers=part(window["workers"]),
+                rate=window["rate"] / parts if window["rate"] else None,
+            )
+            for window in self.windows
+        ]
+        return windows, max(part(self.default_workers or parts), 1)
+
+    def current(
+        self, now: Optional[datetime.datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+        """当前所在的时间窗口，先指定的窗口优先，不在任何窗口中时返回 None"""
+        now = now or self.clock()
+        minute = now.hour * 60 + now.minute + now.second / 60
+        for window in self.windows:
+            start, end = window["start"], window["end"]
+            if start < end:
+                if start <= minute < end:
+                    return window
+            elif minute >= start or minute < end:  # 跨过午夜的窗口
+                return window
+        return None
+
+    def limits(
+        self, now: Optional[datetime.datetime] = None
+    ) -> Tuple[Optional[int], Optional[float]]:
+        """当前的 (并行数, 带宽)，None 表示不限"""
+        window = self.current(now)
+        if window is None:
+            return self.default_workers, None
+        return window["workers"], window["rate"]
+
+    def max_workers(self) -> int:
+        """各窗口及窗口外并行数中的最大值，按此创建工作线程"""
+        return max(
+            [window["workers"] for window in self.windows] + [self.default_workers or 1]
+        )
+
+    async def wait_for_slot(self) -> None:
+        """等待当前窗口的并行数有空闲，不占用"""
+        while self.windows:
+            workers, _ = self.limits()
+            if workers is None or self._running < workers:
+                return
+            await asyncio.sleep(WINDOW_POLL_INTERVAL)
+
+    @contextlib.asynccontextmanager
+    async def job(self):
+        """工作线程开始下载一个条目前等待，直到当前窗口的并行数允许"""
+        await self.wait_for_slot()
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+
+    def start(self, key: str) -> None:
+        """开始跟踪一个传输"""
+        with self._lock:
+            self._transfers[key] = None
+
+    def stop(self, key: str) -> None:
+        """停止跟踪一个传输"""
+        with self._lock:
+            self._transfers.pop(key, None)
+
+    def _wait(self, seconds: float, cancel_event: Optional[threading.Event]) -> None:
+        """分段等待，期间检查取消事件"""
+        while seconds > 0:
+            if cancel_event is not None and cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("下载已取消")
+            step = min(seconds, WINDOW_POLL_INTERVAL)
+            self.sleep(step)
+            seconds -= step
+
+    def throttle(
+        self,
+        key: str,
+        downloaded_bytes: int,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> None:
+        """在进度回调中调用：超出窗口并行数的传输在此暂停，超出窗口带宽时等待"""
+        paused = False
+        while True:
+            now = self.clock()
+            workers, rate = self.limits(now)
+            with self._lock:
+                keys = list(self._transfers)
+                rank = keys.index(key) if key in self._transfers else 0
+                if workers is None or rank < workers:
+                    previous = self._transfers.get(key)
+                    self._transfers[key] = downloaded_bytes
+                    delay = 0.0
+                    if rate and previous is not None:
+                        if self._bucket is None or self._bucket.max_rate != rate:
+                            self._bucket = TokenBucket(
+                                rate, WINDOW_BURST_SECONDS, now.timestamp()
+                            )
+                        at = now.timestamp()
+                        amount = max(downloaded_bytes - previous, 0)
+                        delay = self._bucket.reserve(at, amount) - at
+                    break
+            if not paused:
+                paused = True
+                print(f"\n当前时间窗口只允许 {workers} 个并行传输，暂停传输...")
+            self._wait(WINDOW_POLL_INTERVAL, cancel_event)
+            METRICS.increment("window.paused", WINDOW_POLL_INTERVAL)
+
+        if paused:
+            print("\n时间窗口允许传输，继续下载")
+            # 暂停期间没有进度，重新开始停滞监控
+            STALL_WATCHDOG.start(key)
+        if delay > 0:
+            METRICS.increment("window.throttled", delay)
+            self._wait(delay, cancel_event)
+
+    def hook(
+        self, key: str, cancel_event: Optional[threading.Event], d: Dict[str, Any]
+    ) -> None:
+        """yt-dlp 进度回调，按时间窗口暂停或限速"""
+        if d["status"] == "downloading":
+            self.throttle(key, d.get("downloaded_bytes") or 0, cancel_event)
+
+
+# 全局时间窗口调度，由命令行参数配置
+TIME_WINDOWS = TimeWindowScheduler()
+
+
+def report_window_stats() -> None:
+    """时间窗口有暂停或限速等待时输出统计"""
+    counters = METRICS.snapshot()["counters"]
+    paused = counters.get("window.paused", 0)
+    throttled = counters.get("window.throttled", 0)
+    if paused >= 1 or throttled >= 1:
+        print(f"时间窗口: 累计暂停 {paused:.0f} 秒，带宽限制等待 {throttled:.0f} 秒")
+
+
+class FFmpegError(Exception):
+    """ffmpeg 执行失败"""
+
+
+# 工具链探测结果的缓存文件名和格式版本
+TOOLCHAIN_CACHE_NAME = "toolchain.json"
+TOOLCHAIN_CACHE_VERSION = 1
+# 探测命令的超时（秒）
+TOOLCHAIN_PROBE_TIMEOUT = 30.0
+# 各用途的编码器按速度和质量的优先顺序，都不可用时使用最后一个
+AAC_ENCODERS = ("aac_at", "libfdk_aac", "aac")
+H264_ENCODERS = ("libx264", "libopenh264", "h264_mf")
+MP3_ENCODERS = ("libmp3lame", "libshine", "mp3_mf")
+
+
+def parse_ffmpeg_listing(output: str) -> List[str]:
+    """解析 ffmpeg -encoders/-muxers 的输出，返回名称列表"""
+    names: List[str] = []
+    started = False
+    for line in output.splitlines():
+        if not started:
+            # 说明部分以 ------ 或 --- 结束
+            started = line.strip().startswith("--")
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            names.extend(parts[1].split(","))
+    return names
+
+
+class Toolchain:
+    """ffmpeg/ffprobe 工具链：查找可执行文件，探测版本和可用的编码器、封装格式
+
+    探测结果缓存在磁盘上，以可执行文件的路径、修改时间和大小为键，
+    更换或升级 ffmpeg 后自动重新探测；没有变化时启动不再运行 ffmpeg。
+    """
+
+    def __init__(self, cache_path: Optional[Union[str, Path]] = None) -> None:
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.paths: Dict[str, str] = {}
+        self.version: Optional[str] = None
+        self.encoders: frozenset = frozenset()
+        self.muxers: frozenset = frozenset()
+
+    @property
+    def ffmpeg(self) -> str:
+        return self.paths.get("ffmpeg", "ffmpeg")
+
+    @property
+    def ffprobe(self) -> str:
+        return self.paths.get("ffprobe", "ffprobe")
+
+    @staticmethod
+    def find(name: str) -> Optional[str]:
+        """查找可执行文件：当前目录、程序所在目录（打包后）、PATH"""
+        filename = name + ".exe" if platform.system() == "Windows" else name
+        directories = [Path.cwd()]
+        if getattr(sys, "frozen", False):
+            directories.append(Path(sys.executable).parent)
+        for directory in directories:
+            path = directory / filename
+            if path.is_file() and os.access(path, os.X_OK):
+                return str(path.resolve())
+        return shutil.which(name)
+
+    def resolve(self) -> bool:
+        """查找 ffmpeg 和 ffprobe 并读取或探测能力，找不到 ffmpeg 时返回 False"""
+        self.paths = {}
+        for name in ("ffmpeg", "ffprobe"):
+            path = self.find(name)
+            if path:
+                self.paths[name] = path
+        if "ffmpeg" not in self.paths:
+            return False
+        self.load_capabilities()
+        return True
+
+    def _binary_key(self) -> Dict[str, Any]:
+        stat = os.stat(self.paths["ffmpeg"])
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def _read_cache(self) -> Dict[str, Any]:
+        if self.cache_path is None:
+            return {}
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("version") != TOOLCHAIN_CACHE_VERSION:
+            return {}
+        return cache.get("tools", {})
+
+    def load_capabilities(self) -> None:
+        """读取缓存的探测结果，缓存缺失或可执行文件有变化时重新探测并写入缓存"""
+        ffmpeg = self.paths["ffmpeg"]
+        key = self._binary_key()
+        tools = self._read_cache()
+        entry = tools.get(ffmpeg)
+        if not entry or any(entry.get(k) != v for k, v in key.items()):
+            entry = {**key, **self.probe(ffmpeg)}
+            tools[ffmpeg] = entry
+            self._write_cache(tools)
+        self.version = entry.get("version")
+        self.encoders = frozenset(entry.get("encoders", ()))
+        self.muxers = frozenset(entry.get("muxers", ()))
+
+    @staticmethod
+    def probe(ffmpeg: str) -> Dict[str, Any]:
+        """运行 ffmpeg 获取版本、编码器和封装格式列表"""
+
+        def run(*args: str) -> str:
+            return subprocess.run(
+                [ffmpeg, "-hide_banner", *args],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=TOOLCHAIN_PROBE_TIMEOUT,
+            ).stdout.decode("utf-8", "replace")
+
+        first_line = run("-version").partition("\n")[0]
+        match = re.match(r"\S+ version (\S+)", first_line)
+        return {
+            "version": match.group(1) if match else None,
+            "encoders": parse_ffmpeg_listing(run("-encoders")),
+            "muxers": parse_ffmpeg_listing(run("-muxers")),
+        }
+
+    def _write_cache(self, tools: Dict[str, Any]) -> None:
+        """原子化写入缓存，写入失败时只是下次重新探测"""
+        if self.cache_path is None:
+            return
+        part_path = TempFileManager.part_path(self.cache_path)
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(part_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": TOOLCHAIN_CACHE_VERSION, "tools": tools},
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            os.replace(part_path, self.cache_path)
+        except OSError as e:
+            print(f"警告：无法写入工具链缓存: {str(e)}")
+
+    def select_encoder(self, candidates: Tuple[str, ...]) -> str:
+        """按优先顺序选择可用的编码器，未探测或都不可用时使用最后一个"""
+        for name in candidates:
+            if name in self.encoders:
+                return name
+        return candidates[-1]
+
+    def missing_capabilities(self) -> List[str]:
+        """下载器需要但当前 ffmpeg 不支持的编码器和封装格式（未探测时为空）"""
+        missing = []
+        if self.encoders:
+            for label, candidates in (
+                ("AAC 编码器", AAC_ENCODERS),
+                ("MP3 编码器", MP3_ENCODERS),
+                ("H.264 编码器", H264_ENCODERS),
+            ):
+                if not self.encoders.intersection(candidates):
+                    missing.append(label)
+        if self.muxers:
+            missing += [
+                f"{name} 封装格式" for name in ("mp4", "mp3") if name not in self.muxers
+            ]
+        return missing
+
+    def snapshot(self) -> Dict[str, Any]:
+        """工作进程直接沿用的查找和探测结果"""
+        return {
+            "paths": self.paths,
+            "version": self.version,
+            "encoders": sorted(self.encoders),
+            "muxers": sorted(self.muxers),
+        }
+
+    def restore(self, snapshot: Dict[str, Any]) -> None:
+        """应用父进程的查找和探测结果"""
+        self.paths = dict(snapshot["paths"])
+        self.version = snapshot["version"]
+        self.encoders = frozenset(snapshot["encoders"])
+        self.muxers = frozenset(snapshot["muxers"])
+
+
+def default_cache_root() -> Path:
+    """用户缓存目录"""
+    base = os.environ.get("LOCALAPPDATA")
+    root = Path(base) if base else Path.home() / ".cache"
+    return root / "YoutubeDownloader"
+
+
+# 全局工具链，由 check_ffmpeg 查找
+TOOLCHAIN = Toolchain(default_cache_root() / TOOLCHAIN_CACHE_NAME)
+
+
+def mp3_encoder_args() -> List[str]:
+    """MP3 编码参数：libmp3lame 使用 VBR 质量 2，其他编码器使用相近的固定码率"""
+    encoder = TOOLCHAIN.select_encoder(MP3_ENCODERS)
+    quality = ["-q:a", "2"] if encoder == "libmp3lame" else ["-b:a", "192k"]
+    return ["-c:a", encoder, *quality]
+
+
+def aac_encoder_args(source_codec: Optional[str] = None) -> List[str]:
+    """MP4 中的音频参数：源音频已是 AAC 时直接复制，否则用最快的可用 AAC 编码器"""
+    if source_codec and source_codec.startswith("mp4a"):
+        return ["-c:a", "copy"]
+    return ["-c:a", TOOLCHAIN.select_encoder(AAC_ENCODERS), "-b:a", "192k"]
+
+
+# ffmpeg 超过该时间（秒）没有输出任何进度时视为卡死
+FFMPEG_IDLE_TIMEOUT = 300.0
+
+
+async def run_ffmpeg(
+    args: List[str],
+    label: str = "处理",
+    duration: Optional[float] = None,
+    timeout: Optional[float] = None,
+    show_progress: bool = True,
+) -> None:
+    """运行 ffmpeg 并解析 -progress 输出显示进度
+
+    返回码非 0、超时或卡死时抛出 FFmpegError；调用被取消时终止 ffmpeg。
+    """
+    command = [
+        TOOLCHAIN.ffmpeg,
+        "-hide_banner",
+        "-nostdin",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-progress",
+        "pipe:1",  # 机器可读的进度输出到标准输出
+        *args,
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    stderr_task = asyncio.ensure_future(process.stderr.read())
+    start_time = time.monotonic()
+    progress: Dict[str, str] = {}
+
+    async def read_progress() -> None:
+        while True:
+            line = await asyncio.wait_for(
+                process.stdout.readline(), FFMPEG_IDLE_TIMEOUT
+            )
+            if not line:
+                return
+            key, _, value = line.decode("utf-8", "replace").strip().partition("=")
+            progress[key] = value
+            if key == "progress" and show_progress:
+                report_ffmpeg_progress(label, progress, duration, start_time)
+
+    try:
+        await asyncio.wait_for(read_progress(), timeout)
+        returncode = await process.wait()
+    except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), CANCEL_GRACE_PERIOD)
+            except asyncio.TimeoutError:
+                process.kill()
+        stderr_task.cancel()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        METRICS.increment("ffmpeg_failures")
+        raise FFmpegError(f"ffmpeg {label}超时") from None
+
+    stderr = (await stderr_task).decode("utf-8", "replace").strip()
+    elapsed = time.monotonic() - start_time
+    METRICS.increment("ffmpeg_runs")
+    METRICS.increment("ffmpeg_seconds", elapsed)
+    if returncode != 0:
+        METRICS.increment("ffmpeg_failures")
+        detail = stderr.splitlines()[-1] if stderr else ""
+        raise FFmpegError(f"ffmpeg 返回码 {returncode}: {detail}")
+
+    output_bytes = int(progress.get("total_size") or 0)
+    METRICS.increment("ffmpeg_output_bytes", output_bytes)
+    if elapsed > 0:
+        METRICS.set_gauge("ffmpeg_bytes_per_second", output_bytes / elapsed)
+    if not show_progress:
+        return
+    print(
+        f"\r{label}完成: {output_bytes / 1024 / 1024:.2f}MB | "
+        f"耗时: {elapsed:.1f}秒 | "
+        f"吞吐量: {output_bytes / 1024 / 1024 / max(elapsed, 1e-6):.2f}MB/s"
+    )
+
+
+def report_ffmpeg_progress(
+    label: str,
+    progress: Dict[str, str],
+    duration: Optional[float],
+    start_time: float,
+) -> None:
+    """显示 ffmpeg 进度并记录吞吐量指标"""
+    try:
+        out_seconds = int(progress.get("out_time_us") or 0) / 1_000_000
+    except ValueError:
+        out_seconds = 0.0  # 开始阶段可能输出 N/A
+    output_bytes = int(progress.get("total_size") or 0)
+    elapsed = time.monotonic() - start_time
+    throughput = output_bytes / elapsed if elapsed > 0 else 0
+    METRICS.set_gauge("ffmpeg_bytes_per_second", throughput)
+
+    speed = progress.get("speed", "N/A").strip()
+    if duration:
+        percentage = min(out_seconds / duration * 100, 100.0)
+        position = f"{percentage:.1f}%"
+    else:
+        position = f"{out_seconds:.0f}秒"
+    print(
+        f"\r{label}进度: {position} | "
+        f"已输出: {output_bytes / 1024 / 1024:.2f}MB | "
+        f"速度: {speed} | 吞吐量: {throughput / 1024 / 1024:.2f}MB/s",
+        end="",
+    )
+
+
 async def merge_audio_video(
     video_file: Union[str, Path],
     audio_file: Union[str, Path],
     output_file: Union[str, Path],
+    duration: Optional[float] = None,
+    manifest_info: Optional[Dict[str, Any]] = None,
+    audio_codec: Optional[str] = None,
 ) -> bool:
-    """合并音频和视频"""
+    """合并音频和视频，音频已是 AAC 时直接复制"""
+    # 在临时流所在的目录中合并，完成后再移动到输出目录
+    part_file = TEMP_FILES.part_path(output_file, Path(video_file).parent)
     try:
         print("\n正在合并视频和音频...")
         print(f"输出文件: {output_file}")
 
-        loop = asyncio.get_event_loop()
-        ffmpeg_process = await loop.run_in_executor(
-            None,
-            lambda: subprocess.Popen(
+        async with RESOURCES.slot("ffmpeg"):
+            await run_ffmpeg(
                 [
-                    "ffmpeg",
+                    "-y",  # 覆盖上次中断遗留的 .part 文件
                     "-i",
                     str(video_file),
                     "-i",
                     str(audio_file),
                     "-c:v",
                     "copy",  # 复制视频流，不重新编码
-                    "-c:a",
-                    "aac",  # 将音频转换为AAC编码（MP4容器兼容）
-                    "-b:a",
-                    "192k",  # 设置音频比特率
+                    # 音频需为AAC编码（MP4容器兼容）
+                    *aac_encoder_args(audio_codec),
                     "-map",
                     "0:v:0",  # 选择第一个文件的视频流
                     "-map",
                     "1:a:0",  # 选择第二个文件的音频流
                     "-movflags",
                     "+faststart",  # 优化MP4文件结构
-                    str(output_file),
-                ]
-            ),
+                    "-f",
+                    "mp4",  # .part 后缀无法推断格式
+                    str(part_file),
+                ],
+                "合并",
+                duration,
+            )
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, TEMP_FILES.finalize, part_file, output_file, manifest_info
         )
-        await loop.run_in_executor(None, ffmpeg_process.wait)  # 等待进程完成
         return True
     except Exception as e:
         print(f"\n合并出错: {str(e)}")
+        TEMP_FILES.discard([part_file])
         return False
 
 
-async def clean_temp_files(file_list: List[Union[str, Path]]) -> None:
-    """清理临时文件"""
-    # 在删除文件前先等待一小段时间
-    await asyncio.sleep(1)  # 给系统一些时间完全释放文件句柄
-
-    for temp_file in file_list:
-        path_file = Path(temp_file)
-        if path_file.exists():
-            max_retries = 5  # 增加重试次数
-            retry_delay = 1  # 减少每次重试的等待时间
-            for attempt in range(max_retries):
-                try:
-                    # 使用pathlib的unlink方法删除文件
-                    path_file.unlink()
-                    break
-                except OSError as e:
-                    if attempt == max_retries - 1:  # 最后一次尝试
-                        print(f"警告：无法删除临时文件 {temp_file}: {e}")
-                    else:
-                        await asyncio.sleep(retry_delay)
-                        continue
+# 分段转码的段数，1 表示不分段，0 表示按CPU核心数，由命令行参数设置
+TRANSCODE_SEGMENTS = 1
+# 分段转码时每段的最短时长（秒），较短的音频分段收益不大
+MIN_TRANSCODE_SEGMENT = 60
+# MPEG-1 Layer III 每帧的采样数
+MP3_FRAME_SAMPLES = 1152
+# libmp3lame 的编码延迟（采样数）：编码器延迟 576 + 解码器延迟 529
+MP3_ENCODER_DELAY = 1105
+# 后续分段在边界前多编码并丢弃的帧数，让滤波器组和 MDCT 重叠看到真实的前序采样
+MP3_SEGMENT_PREROLL = 2
+# MPEG-1 Layer III 的码率表(kbps)和采样率表
+MP3_BITRATES = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+def configure_transcode_segments(segments: int) -> None:
+    """设置分段转码的段数"""
+    global TRANSCODE_SEGMENTS
+    TRANSCODE_SEGMENTS = max(segments, 0)
+
+
+def mp3_frame_offsets(data: bytes) -> List[Tuple[int, int]]:
+    """解析 MPEG-1 Layer III 数据中各帧的 (偏移, 长度)"""
+    frames = []
+    offset = 0
+    while offset + 4 <= len(data):
+        header = int.from_bytes(data[offset : offset + 4], "big")
+        # 同步字、MPEG-1、Layer III
+        if header >> 21 != 0x7FF or (header >> 19) & 3 != 3 or (header >> 17) & 3 != 1:
+            raise ValueError(f"无效的MP3帧头(偏移 {offset})")
+        bitrate = MP3_BITRATES[(header >> 12) & 0xF]
+        sample_rate = MP3_SAMPLE_RATES[(header >> 10) & 3]
+        padding = (header >> 9) & 1
+        length = 144000 * bitrate // sample_rate + padding
+        frames.append((offset, length))
+        offset += length
+    return frames
+
+
+def plan_transcode_segments(
+    duration: float, sample_rate: int, segments: int
+) -> List[Tuple[int, int, int, Optional[int]]]:
+    """规划分段转码，返回每段的 (起始采样, 编码采样数, 保留的首帧, 保留帧数)
+
+    分段边界 t 满足 t + 编码延迟 为帧长的整数倍，后续各段从 t 之前几帧开始编码
+    并丢弃这些预编码的帧，使保留的帧恰好从 t 开始，拼接后无缝衔接。每段多编码
+    两帧，让末尾的帧在编码时看到真实的后续采样。
+    """
+    total_frames = int(duration * sample_rate) // MP3_FRAME_SAMPLES
+    boundaries = [0]
+    for index in range(1, segments):
+        frame_index = total_frames * index // segments
+        boundaries.append(frame_index * MP3_FRAME_SAMPLES - MP3_ENCODER_DELAY)
+
+    plan = []
+    for index, boundary in enumerate(boundaries):
+        is_last = index == len(boundaries) - 1
+        first_frame = 0 if index == 0 else MP3_SEGMENT_PREROLL
+        start = 0
+        if index > 0:
+            start = boundary + MP3_ENCODER_DELAY - first_frame * MP3_FRAME_SAMPLES
+        if is_last:
+            plan.append((start, 0, first_frame, None))  # 编码到结尾，保留全部帧
+            continue
+        end = boundaries[index + 1]
+        frame_count = (end + MP3_ENCODER_DELAY - start) // MP3_FRAME_SAMPLES
+        frame_count -= first_frame
+        encode_samples = end - start + 2 * MP3_FRAME_SAMPLES
+        plan.append((start, encode_samples, first_frame, frame_count))
+    return plan
+
+
+def concat_mp3_segments(
+    segment_files: List[Path],
+    plan: List[Tuple[int, int, int, Optional[int]]],
+    output_file: Path,
+) -> None:
+    """按规划保留各段的帧并拼接为一个MP3数据流"""
+    with open(output_file, "wb") as output:
+        for segment_file, (_, _, first_frame, frame_count) in zip(segment_files, plan):
+            data = segment_file.read_bytes()
+            frames = mp3_frame_offsets(data)
+            if frame_count is None:
+                frame_count = len(frames) - first_frame
+            if first_frame + frame_count > len(frames):
+                raise ValueError(f"分段帧数不足: {segment_file}")
+            begin = frames[first_frame][0]
+            last_offset, last_length = frames[first_frame + frame_count - 1]
+            output.write(data[begin : last_offset + last_length])
+
+
+def transcode_segment_count(
+    duration: Optional[float], sample_rate: Optional[int]
+) -> int:
+    """根据设置和音频时长计算分段数，不适合分段时返回 1"""
+    segments = TRANSCODE_SEGMENTS or (os.cpu_count() or 1)
+    if segments <= 1 or not duration or sample_rate not in MP3_SAMPLE_RATES:
+        return 1
+    # 分段拼接依赖 libmp3lame 的编码延迟和选项
+    if TOOLCHAIN.select_encoder(MP3_ENCODERS) != "libmp3lame":
+        return 1
+    return max(min(segments, int(duration // MIN_TRANSCODE_SEGMENT)), 1)
 
 
-async def download_with_progress(
-    url: str,
-    best_video: Optional[Dict[str, Any]],
-    best_audio: Dict[str, Any],
-    video_title: Optional[str] = None,
-    proxy: Optional[str] = None,
-    only_audio: bool = False,
-    playlist_dir: Optional[str] = None,
-    concurrent_fragments: int = 3,
-) -> Tuple[bool, Optional[str]]:
-    """下载视频并显示进度"""
-    # 创建下载目录
-    download_dir = Path.cwd() / "downloads"
-    if playlist_dir:
-        download_dir = download_dir / playlist_dir
-    download_dir.mkdir(exist_ok=True, parents=True)
+async def transcode_mp3_segmented(
+    audio_file: Union[str, Path],
+    part_file: Path,
+    duration: float,
+    sample_rate: int,
+    segments: int,
+) -> None:
+    """按时间分段并行转码为MP3，再无缝拼接"""
+    plan = plan_transcode_segments(duration, sample_rate, segments)
+    segment_files = [
+        part_file.with_name(f"{part_file.name}.{index}.seg.part")
+        for index in range(len(plan))
+    ]
+    concat_file = part_file.with_name(f"{part_file.name}.concat.part")
+    print(f"\n分 {len(plan)} 段并行转码...")
+
+    async def encode(segment_file: Path, start: int, encode_samples: int) -> None:
+        args = ["-y", "-ss", f"{start / sample_rate:.6f}", "-i", str(audio_file)]
+        if encode_samples:
+            args += ["-t", f"{encode_samples / sample_rate:.6f}"]
+        args += [
+            "-vn",
+            "-map_metadata",
+            "-1",
+            "-c:a",
+            "libmp3lame",
+            "-q:a",
+            "2",
+            "-ar",
+            str(sample_rate),
+            # 关闭比特池，丢弃首帧后其余帧不依赖被丢弃的数据
+            "-reservoir",
+            "0",
+            # 不写入 Xing 帧和 ID3 标签，文件中只有音频帧
+            "-write_xing",
+            "0",
+            "-id3v2_version",
+            "0",
+            "-f",
+            "mp3",
+            str(segment_file),
+        ]
+        async with RESOURCES.slot("transcode"):
+            await run_ffmpeg(args, "分段转换", show_progress=False)
 
-    # 从URL提取视频ID，用于临时文件命名
-    video_id = extract_video_id(url) or "unknown"
+    try:
+        start_time = time.monotonic()
+        await asyncio.gather(
+            *(
+                encode(segment_file, start, encode_samples)
+                for segment_file, (start, encode_samples, _, _) in zip(
+                    segment_files, plan
+                )
+            )
+        )
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, concat_mp3_segments, segment_files, plan, concat_file
+        )
+        print(f"分段转码耗时: {time.monotonic() - start_time:.1f}秒")
 
-    # 处理文件名
-    if video_title:
-        # 清理文件名中的非法字符
-        safe_title = sanitize_filename(video_title)
-    else:
-        safe_title = "downloaded_video"
+        # 重新封装一次，写入整个文件的 Xing 帧以便播放器定位
+        await run_ffmpeg(
+            ["-y", "-i", str(concat_file), "-c", "copy", "-f", "mp3", str(part_file)],
+            "封装",
+            duration,
+        )
+    finally:
+        TEMP_FILES.discard([*segment_files, concat_file])
 
-    # 使用视频ID命名临时文件
-    # 根据实际格式设置正确的扩展名
-    audio_ext = best_audio.get("ext", "webm")
-    audio_filename = download_dir / f"{video_id}_{best_audio['format_id']}.{audio_ext}"
 
-    # 如果只下载音频
-    if only_audio:
-        success, audio_file = await download_audio(
-            url, best_audio, audio_filename, proxy, concurrent_fragments
-        )
-        if success:
-            # 设置输出文件名（最终文件仍使用标题，包括前缀）
-            output_filename = download_dir / f"{safe_title}.mp3"
-
-            # 转换为MP3格式
-            print("\n正在转换为MP3格式...")
-            loop = asyncio.get_event_loop()
-            ffmpeg_process = await loop.run_in_executor(
-                None,
-                lambda: subprocess.Popen(
+async def convert_to_mp3(
+    audio_file: Union[str, Path],
+    output_file: Union[str, Path],
+    duration: Optional[float] = None,
+    sample_rate: Optional[int] = None,
+    manifest_info: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """将音频流转换为MP3格式，长音频可分段并行转码"""
+    # 在临时流所在的目录中转换，完成后再移动到输出目录
+    part_file = TEMP_FILES.part_path(output_file, Path(audio_file).parent)
+    try:
+        print("\n正在转换为MP3格式...")
+        segments = transcode_segment_count(duration, sample_rate)
+        async with RESOURCES.slot("ffmpeg"):
+            if segments > 1:
+                await transcode_mp3_segmented(
+                    audio_file, part_file, duration, sample_rate, segments
+                )
+            else:
+                await run_ffmpeg(
                     [
-                        "ffmpeg",
+                        "-y",  # 覆盖上次中断遗留的 .part 文件
                         "-i",
                         str(audio_file),
                         "-vn",  # 移除视频流
-                        "-c:a",
-                        "libmp3lame",  # MP3编码器
-                        "-q:a",
-                        "2",  # 音频质量设置 (0-9, 0是最高质量)
-                        str(output_filename),
-                    ]
-                ),
-            )
-            await loop.run_in_executor(None, ffmpeg_process.wait)
+                        *mp3_encoder_args(),  # 可用的最佳MP3编码器
+                        "-f",
+                        "mp3",  # .part 后缀无法推断格式
+                        str(part_file),
+                    ],
+                    "转换",
+                    duration,
+                )
 
-            # 清理临时文件
-            await clean_temp_files([audio_file])
-            return True, str(output_filename)
-        return False, None
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None, TEMP_FILES.finalize, part_file, output_file, manifest_info
+        )
+        return True
+    except Exception as e:
+        print(f"\n转换出错: {str(e)}")
+        TEMP_FILES.discard([part_file])
+        return False
 
-    # 下载视频和音频
-    video_ext = best_video.get("ext", "mp4")
-    video_filename = download_dir / f"{video_id}_{best_video['format_id']}.{video_ext}"
-    # 保留前缀的输出文件名
-    output_filename = download_dir / f"{safe_title}.mp4"
 
-    # 下载视频
-    video_success, video_file = await download_video(
-        url, best_video, video_filename, proxy, concurrent_fragments
+# 临时流文件命名: {video_id}_{format_id}.{ext}，下载中的文件带 .part/.ytdl 后缀
+TEMP_STREAM_PATTERN = re.compile(
+    r"^(?P<video_id>[\w-]{11})_(?P<format_id>\d+)\.(?P<ext>\w+)"
+    r"(?P<suffix>\.part(?:-Frag\d+)?|\.ytdl)?$"
+)
+
+
+# 遗留文件在最近多少秒内修改过时视为仍在写入，不做处理
+ORPHAN_MIN_IDLE = 60.0
+# 运行中的实例在下载目录中创建的锁文件
+INSTANCE_LOCK_PATTERN = ".instance-*.lock"
+
+
+def try_lock_file(lock_file: Any) -> bool:
+    """以非阻塞方式锁定已打开的文件，已被其他进程锁定时返回 False"""
+    try:
+        if platform.system() == "Windows":
+            import msvcrt
+
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class TempFileManager:
+    """临时文件生命周期管理：原子化输出、退出时清理和遗留文件恢复"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: set = set()  # 删除失败、等待进程退出时再清理的文件
+        # 本实例在各下载目录中持有的锁文件
+        self._claims: Dict[Path, Any] = {}
+        atexit.register(self.cleanup_at_exit)
+
+    def claim(self, directory: Union[str, Path]) -> None:
+        """在目录中创建并锁定本实例的锁文件，进程退出（包括崩溃）后锁自动释放"""
+        directory = Path(directory).resolve()
+        if directory in self._claims:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f".instance-{socket.gethostname()}-{os.getpid()}.lock"
+        lock_file = open(path, "a+b")
+        if try_lock_file(lock_file):
+            self._claims[directory] = lock_file
+        else:
+            lock_file.close()
+
+    def other_instances(self, directory: Union[str, Path]) -> bool:
+        """目录是否正被其他运行中的实例使用，顺带删除已退出实例遗留的锁文件"""
+        directory = Path(directory).resolve()
+        own = self._claims.get(directory)
+        active = False
+        for path in directory.glob(INSTANCE_LOCK_PATTERN):
+            if own is not None and Path(own.name) == path:
+                continue
+            try:
+                with open(path, "a+b") as lock_file:
+                    if not try_lock_file(lock_file):
+                        active = True
+                        continue
+                path.unlink()
+            except OSError:
+                active = True  # 无法打开或删除时按仍在使用处理
+        return active
+
+    @staticmethod
+    def part_path(
+        final_path: Union[str, Path], directory: Optional[Union[str, Path]] = None
+    ) -> Path:
+        """输出文件在写入过程中使用的 .part 路径，可指定写入目录"""
+        final_path = Path(final_path)
+        directory = Path(directory) if directory is not None else final_path.parent
+        return directory / (final_path.name + ".part")
+
+    def finalize(
+        self,
+        part_path: Union[str, Path],
+        final_path: Union[str, Path],
+        info: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """写入成功后将 .part 文件原子化移动为最终文件，并记录到完整性清单"""
+        # 同一设备上 move_file 在重命名后重新读取整个输出计算校验和
+        digest = move_file(part_path, final_path)
+        MANIFEST.record(final_path, digest, **(info or {}))
+
+    def discard(self, file_list: List[Union[str, Path]]) -> None:
+        """删除临时文件，被占用而无法删除的文件在进程退出时再清理"""
+        for temp_file in file_list:
+            path_file = Path(temp_file)
+            try:
+                path_file.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError:
+                # Windows 下文件句柄可能尚未释放
+                with self._lock:
+                    self._pending.add(path_file)
+
+    def cleanup_at_exit(self) -> None:
+        """进程退出时清理剩余的临时文件，并删除本实例的锁文件"""
+        for lock_file in self._claims.values():
+            lock_file.close()
+            with contextlib.suppress(OSError):
+                os.unlink(lock_file.name)
+        self._claims.clear()
+        with self._lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        for path_file in pending:
+            try:
+                path_file.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                print(f"警告：无法删除临时文件 {path_file}: {e}")
+
+    def recover_orphans(
+        self,
+        root: Union[str, Path],
+        max_age: float = 7 * 24 * 3600,
+        min_idle: float = ORPHAN_MIN_IDLE,
+    ) -> List[Tuple[Path, str]]:
+        """扫描下载目录中遗留的临时文件
+
+        未合并的输出 .part 文件直接删除；过期的临时流文件删除；
+        其余临时流文件按视频返回 (所在目录, 视频ID)，供续传使用。
+        最近 min_idle 秒内修改过的文件可能正被其他实例或主机写入，不做处理；
+        目录正被本机其他运行中的实例使用时（可能处于暂停中）全部跳过。
+        """
+        root = Path(root)
+        if not root.is_dir():
+            return []
+        if self.other_instances(root):
+            print(f"其他下载实例正在使用 {root}，跳过遗留临时文件的处理")
+            return []
+
+        now = time.time()
+        resumable: Dict[Tuple[Path, str], bool] = {}
+        for path_file in root.rglob("*"):
+            if not path_file.is_file():
+                continue
+            idle = now - path_file.stat().st_mtime
+            if idle < min_idle:
+                continue
+            match = TEMP_STREAM_PATTERN.match(path_file.name)
+            if match is None:
+                if path_file.suffix == ".part":
+                    # 中断的合并/转换输出，无法续写
+                    self.discard([path_file])
+                continue
+            if idle > max_age:
+                self.discard([path_file])
+                continue
+            resumable[(path_file.parent, match.group("video_id"))] = True
+
+        return sorted(resumable)
+
+
+# 全局临时文件管理器
+TEMP_FILES = TempFileManager()
+
+
+# 下载目录配置，由命令行参数设置，未设置时使用当前目录下的 downloads
+OUTPUT_ROOT: Optional[Path] = None
+SCRATCH_ROOT: Optional[Path] = None  # 未设置时与输出目录相同
+
+
+def configure_directories(
+    output_dir: Optional[str] = None, scratch_dir: Optional[str] = None
+) -> None:
+    """设置输出目录和临时目录"""
+    global OUTPUT_ROOT, SCRATCH_ROOT
+    OUTPUT_ROOT = Path(output_dir).expanduser().resolve() if output_dir else None
+    SCRATCH_ROOT = Path(scratch_dir).expanduser().resolve() if scratch_dir else None
+
+
+def get_output_dir(playlist_dir: Optional[str] = None) -> Path:
+    """获取最终文件的保存目录"""
+    root = OUTPUT_ROOT or Path.cwd() / "downloads"
+    return root / playlist_dir if playlist_dir else root
+
+
+def get_scratch_dir(playlist_dir: Optional[str] = None) -> Path:
+    """获取临时流文件的保存目录"""
+    root = SCRATCH_ROOT or OUTPUT_ROOT or Path.cwd() / "downloads"
+    return root / playlist_dir if playlist_dir else root
+
+
+def move_file(src: Union[str, Path], dst: Union[str, Path]) -> str:
+    """移动文件：同一文件系统内直接重命名，跨设备时复制后再原子化重命名
+
+    返回文件的 SHA-256：重命名后计算（刚写入的文件仍在页缓存中），
+    跨设备时在复制过程中计算。
+    """
+    try:
+        os.replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    else:
+        # 同一设备上输出由 ffmpeg 等外部程序写入，无法在写入时计算；
+        # 这里在重命名后把整个文件再读一遍（通常命中页缓存），不是单次读写
+        return hash_file(dst)
+
+    # 先复制到目标文件系统上的 .part 文件，确保最终文件名只指向完整文件
+    part_dst = TempFileManager.part_path(dst)
+    try:
+        digest = copy_with_hash(src, part_dst)
+        os.replace(part_dst, dst)
+    except BaseException:
+        TEMP_FILES.discard([part_dst])
+        raise
+    TEMP_FILES.discard([src])
+    return digest
+
+
+async def clean_temp_files(file_list: List[Union[str, Path]]) -> None:
+    """清理临时文件"""
+    TEMP_FILES.discard(file_list)
+
+
+def remove_temp_streams(directory: Union[str, Path], video_id: str) -> None:
+    """删除某个视频遗留的全部临时流文件"""
+    for path_file in Path(directory).iterdir():
+        match = TEMP_STREAM_PATTERN.match(path_file.name)
+        if match and match.group("video_id") == video_id:
+            TEMP_FILES.discard([path_file])
+
+
+def build_output_filename(
+    video_title: Optional[str],
+    playlist_dir: Optional[str] = None,
+    only_audio: bool = False,
+) -> Path:
+    """根据视频标题生成最终输出文件路径"""
+    if video_title:
+        # 清理文件名中的非法字符
+        safe_title = sanitize_filename(video_title)
+    else:
+        safe_title = "downloaded_video"
+    extension = "mp3" if only_audio else "mp4"
+    return get_output_dir(playlist_dir) / f"{safe_title}.{extension}"
+
+
+def link_or_copy(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """将已完成的文件复制到另一个输出路径，同一文件系统内使用硬链接
+
+    目标文件沿用源文件在完整性清单中的记录。
+    """
+    src, dst = Path(src), Path(dst)
+    part_dst = TempFileManager.part_path(dst)
+    try:
+        try:
+            os.link(src, part_dst)
+            digest = None
+        except OSError:
+            digest = copy_with_hash(src, part_dst)
+        os.replace(part_dst, dst)
+    except BaseException:
+        TEMP_FILES.discard([part_dst])
+        raise
+    record = Manifest.load(src.parent).get(src.name, {})
+    info = {k: v for k, v in record.items() if k in ("id", "formats")}
+    MANIFEST.record(dst, digest or record.get("sha256") or hash_file(dst), **info)
+
+
+# 计算文件哈希时每次送入的数据量
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+# 每个输出目录中的完整性清单文件（每行一条 JSON 记录，后写的记录优先）
+MANIFEST_NAME = ".manifest.jsonl"
+# 校验时不在清单中也不报告的文件
+MANIFEST_IGNORED_SUFFIXES = (".part", ".ytdl", ".jsonl", ".json")
+
+
+def hash_file(path: Union[str, Path]) -> str:
+    """用 mmap 计算文件的 SHA-256
+
+    hashlib 处理大块数据时释放 GIL，多个线程可以并行计算不同的文件。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return digest.hexdigest()  # 空文件无法映射
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                for offset in range(0, size, HASH_CHUNK_SIZE):
+                    digest.update(view[offset : offset + HASH_CHUNK_SIZE])
+    return digest.hexdigest()
+
+
+def copy_with_hash(src: Union[str, Path], dst: Union[str, Path]) -> str:
+    """复制文件，同时计算写入内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        while True:
+            chunk = fsrc.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fdst.write(chunk)
+    shutil.copystat(src, dst)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """完整性清单：记录每个最终文件的大小、SHA-256 和下载使用的格式
+
+    清单只追加写入，多个工作进程或主机写入同一目录时不需要读改写；
+    同一文件的多条记录以最后一条为准。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def record(self, path: Union[str, Path], digest: str, **info: Any) -> None:
+        """追加一个文件的记录"""
+        path = Path(path)
+        line = json.dumps(
+            {
+                "file": path.name,
+                "size": path.stat().st_size,
+                "sha256": digest,
+                **info,
+                "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            },
+            ensure_ascii=False,
+        )
+        with self._lock:
+            with open(path.parent / MANIFEST_NAME, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    @staticmethod
+    def load(directory: Union[str, Path]) -> Dict[str, Dict[str, Any]]:
+        """读取目录的清单，返回 文件名 -> 最新记录"""
+        records: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(Path(directory) / MANIFEST_NAME, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 写入中断留下的不完整行
+                    records[record["file"]] = record
+        except FileNotFoundError:
+            pass
+        return records
+
+    @staticmethod
+    def verify_file(path: Path, record: Dict[str, Any]) -> Optional[str]:
+        """校验单个文件，返回问题描述，一致时返回 None"""
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return "缺失"
+        if size != record.get("size"):
+            # 大小不同时不必计算哈希
+            return f"大小不符(清单 {record.get('size')} 字节，实际 {size} 字节)"
+        if hash_file(path) != record.get("sha256"):
+            return "内容已损坏(SHA-256 不符)"
+        return None
+
+    def verify(
+        self, root: Union[str, Path], workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """并行校验 root 下所有清单中的文件，返回统计结果"""
+        root = Path(root)
+        checks: List[Tuple[Path, Dict[str, Any]]] = []
+        unrecorded = 0
+        for manifest_path in sorted(root.rglob(MANIFEST_NAME)):
+            directory = manifest_path.parent
+            records = self.load(directory)
+            checks.extend(
+                (directory / name, record) for name, record in records.items()
+            )
+            unrecorded += sum(
+                1
+                for path in directory.iterdir()
+                if path.is_file()
+                and path.name not in records
+                and not path.name.startswith(".")
+                and not path.name.endswith(MANIFEST_IGNORED_SUFFIXES)
+            )
+
+        problems: List[Tuple[Path, str]] = []
+        checked_bytes = 0
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1
+        ) as executor:
+            futures = {
+                executor.submit(self.verify_file, path, record): (path, record)
+                for path, record in checks
+            }
+            for future in concurrent.futures.as_completed(futures):
+                path, record = futures[future]
+                try:
+                    problem = future.result()
+                except OSError as e:
+                    problem = f"无法读取: {e}"
+                if problem:
+                    problems.append((path, problem))
+                else:
+                    checked_bytes += record.get("size") or 0
+        return {
+            "files": len(checks),
+            "problems": sorted(problems),
+            "unrecorded": unrecorded,
+            "bytes": checked_bytes,
+        }
+
+
+# 全局完整性清单
+MANIFEST = Manifest()
+
+
+def build_manifest_info(
+    video_id: str,
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Dict[str, Any],
+    only_audio: bool = False,
+) -> Dict[str, Any]:
+    """写入完整性清单的视频ID和所选格式"""
+    return {
+        "id": video_id,
+        "formats": [
+            prune_format(fmt)
+            for fmt in (None if only_audio else best_video, best_audio)
+            if fmt is not None
+        ],
+    }
+
+
+def run_verify(root: Union[str, Path]) -> bool:
+    """--verify 模式：按完整性清单校验已下载的文件，全部一致时返回 True"""
+    root = Path(root)
+    if not root.is_dir():
+        print(f"目录不存在: {root}")
+        return False
+    print(f"正在校验: {root}")
+    started = time.monotonic()
+    result = MANIFEST.verify(root)
+    elapsed = time.monotonic() - started
+
+    for path, problem in result["problems"]:
+        print(f"- {path.relative_to(root)}: {problem}")
+    print(
+        f"\n校验完成: {result['files']} 个文件，"
+        f"{len(result['problems'])} 个有问题，耗时 {elapsed:.1f} 秒"
+        f"({result['bytes'] / 1024 / 1024 / max(elapsed, 1e-6):.0f}MB/s)"
+    )
+    if result["unrecorded"]:
+        print(f"另有 {result['unrecorded']} 个文件不在清单中，未校验")
+    return not result["problems"]
+
+
+# 按时间段下载的时间段 [(开始秒, 结束秒)]，为空时下载完整视频，由命令行参数设置
+SECTIONS: List[Tuple[float, float]] = []
+# 按时间段下载时还需保留的格式字段（直接从媒体地址截取）
+FORMAT_STREAM_KEYS = ("url", "protocol", "http_headers")
+
+
+def parse_section(value: str) -> Tuple[float, float]:
+    """解析 START-END 格式的时间段，时间为秒数或 [HH:]MM:SS"""
+    start_text, separator, end_text = value.partition("-")
+    start = yt_dlp.utils.parse_duration(start_text.strip())
+    end = yt_dlp.utils.parse_duration(end_text.strip())
+    if not separator or start is None or end is None or end <= start:
+        raise argparse.ArgumentTypeError(
+            f"无效的时间段: {value}（格式为 START-END，如 1:00:00-1:05:30）"
+        )
+    return float(start), float(end)
+
+
+def configure_sections(sections: Optional[List[Tuple[float, float]]]) -> None:
+    """设置按时间段下载的时间段，重叠的时间段合并为一个"""
+    global SECTIONS
+    merged: List[Tuple[float, float]] = []
+    for start, end in sorted(sections or []):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    SECTIONS = merged
+
+
+def section_label(start: float, end: float) -> str:
+    """时间段在文件名中的标记，如 01.02.03-01.05.30"""
+
+    def timestamp(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}.{minutes:02d}.{seconds:02d}"
+
+    return f"{timestamp(start)}-{timestamp(end)}"
+
+
+def section_input_args(
+    fmt: Dict[str, Any], start: float, end: float, proxy: Optional[str]
+) -> List[str]:
+    """ffmpeg 读取媒体地址中一个时间段的输入参数
+
+    输入端定位时 ffmpeg 通过 HTTP 范围请求只读取时间段附近的数据，
+    从前一个关键帧解码后丢弃开始时间之前的帧，因此裁剪是精确的。
+    """
+    args: List[str] = []
+    headers = fmt.get("http_headers")
+    if headers:
+        args += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())]
+    if proxy:
+        args += ["-http_proxy", proxy]
+    return args + ["-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", fmt["url"]]
+
+
+async def download_section(
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Dict[str, Any],
+    output_file: Path,
+    start: float,
+    end: float,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    scratch_dir: Optional[Path] = None,
+    manifest_info: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """下载并精确截取一个时间段：视频重新编码为 H.264，仅音频时编码为 MP3"""
+    part_file = TEMP_FILES.part_path(output_file, scratch_dir)
+    args = ["-y"]
+    if only_audio:
+        args += section_input_args(best_audio, start, end, proxy)
+        args += ["-vn", *mp3_encoder_args(), "-f", "mp3"]
+    else:
+        args += section_input_args(best_video, start, end, proxy)
+        args += section_input_args(best_audio, start, end, proxy)
+        args += ["-map", "0:v:0", "-map", "1:a:0"]
+        video_encoder = TOOLCHAIN.select_encoder(H264_ENCODERS)
+        args += ["-c:v", video_encoder]
+        if video_encoder == "libx264":
+            args += ["-preset", "veryfast", "-crf", "18"]
+        # 截取时音频也从头解码，需要重新编码
+        args += ["-c:a", TOOLCHAIN.select_encoder(AAC_ENCODERS), "-b:a", "192k"]
+        args += ["-movflags", "+faststart", "-f", "mp4"]
+    args.append(str(part_file))
+
+    try:
+        # 同时占用传输和 ffmpeg 资源：ffmpeg 一边下载一边编码
+        async with RESOURCES.slot("transfer"), REQUEST_PACER.request("transfer"):
+            async with RESOURCES.slot("ffmpeg"):
+                await run_ffmpeg(args, "截取", end - start)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(
+            None,
+            TEMP_FILES.finalize,
+            part_file,
+            output_file,
+            {**(manifest_info or {}), "section": [start, end]},
+        )
+        return True
+    except Exception as e:
+        print(f"\n截取时间段 {section_label(start, end)} 出错: {str(e)}")
+        PROXY_POOL.report_error(proxy, e)
+        TEMP_FILES.discard([part_file])
+        return False
+
+
+def estimate_section_size(
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Optional[Dict[str, Any]],
+    only_audio: bool,
+    start: float,
+    end: float,
+    duration: Optional[float] = None,
+) -> int:
+    """估算时间段输出文件的大小
+
+    格式元数据中的文件大小是整个视频的：时长已知时按时间段所占的比例缩放，
+    未知时忽略文件大小，只按码率估算。
+    """
+    if duration:
+        _, output_size = estimate_disk_usage(
+            best_video, best_audio, only_audio, duration
+        )
+        return int(output_size * min((end - start) / duration, 1.0))
+    video, audio = (
+        (
+            {k: v for k, v in fmt.items() if k not in ("filesize", "filesize_approx")}
+            if fmt
+            else fmt
+        )
+        for fmt in (best_video, best_audio)
+    )
+    _, output_size = estimate_disk_usage(video, audio, only_audio, end - start)
+    return output_size
+
+
+async def download_sections(
+    url: str,
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Dict[str, Any],
+    video_title: Optional[str] = None,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    playlist_dir: Optional[str] = None,
+    duration: Optional[float] = None,
+) -> Tuple[bool, Optional[str]]:
+    """只下载 SECTIONS 中的时间段，每个时间段保存为一个文件，返回第一个文件"""
+    streams = [best_audio] if only_audio else [best_video, best_audio]
+    if not all(fmt.get("url") for fmt in streams):
+        print("\n所选格式没有可直接读取的媒体地址，无法按时间段下载")
+        return False, None
+    if proxy and not proxy.startswith("http"):
+        print("\n警告: ffmpeg 只支持 HTTP 代理，按时间段下载可能失败")
+
+    download_dir = get_output_dir(playlist_dir)
+    download_dir.mkdir(exist_ok=True, parents=True)
+    scratch_dir = get_scratch_dir(playlist_dir)
+    scratch_dir.mkdir(exist_ok=True, parents=True)
+    video_id = extract_video_id(url) or "unknown"
+    manifest_info = build_manifest_info(video_id, best_video, best_audio, only_audio)
+    base_file = build_output_filename(video_title, playlist_dir, only_audio)
+
+    output_files = []
+    for start, end in SECTIONS:
+        if duration and start >= duration:
+            print(f"\n时间段 {section_label(start, end)} 超出视频时长，跳过")
+            continue
+        end = min(end, duration) if duration else end
+        output_file = base_file.with_name(
+            f"{base_file.stem} [{section_label(start, end)}]{base_file.suffix}"
+        )
+        output_size = estimate_section_size(
+            best_video, best_audio, only_audio, start, end, duration
+        )
+        space_needs = disk_space_needs(
+            scratch_dir, download_dir, output_size, output_size
+        )
+        space_error = DISK_SPACE.reserve(space_needs)
+        if space_error:
+            print(f"\n{space_error}")
+            return False, None
+        try:
+            print(f"\n正在下载时间段: {section_label(start, end)}")
+            if not await download_section(
+                best_video,
+                best_audio,
+                output_file,
+                start,
+                end,
+                proxy,
+                only_audio,
+                scratch_dir,
+                manifest_info,
+            ):
+                return False, None
+        finally:
+            DISK_SPACE.release(space_needs)
+        output_files.append(str(output_file))
+
+    if not output_files:
+        return False, None
+    return True, output_files[0]
+
+
+async def download_with_progress(
+    url: str,
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Dict[str, Any],
+    video_title: Optional[str] = None,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    playlist_dir: Optional[str] = None,
+    concurrent_fragments: int = 3,
+    duration: Optional[float] = None,
+) -> Tuple[bool, Optional[str]]:
+    """下载视频并显示进度
+
+    相同视频和格式的并发下载只传输一次（否则会写入同一个临时文件），
+    结果再分发到各自的输出路径。设置了时间段时只下载这些时间段。
+    """
+    if SECTIONS:
+        return await download_sections(
+            url,
+            best_video,
+            best_audio,
+            video_title,
+            proxy,
+            only_audio,
+            playlist_dir,
+            duration,
+        )
+
+    video_id = extract_video_id(url) or url
+    flight_key = (
+        "download",
+        video_id,
+        None if only_audio else best_video["format_id"],
+        best_audio["format_id"],
+        only_audio,
+    )
+    if SINGLE_FLIGHT.is_running(flight_key):
+        print(f"\n相同视频正在下载中，等待其完成: {video_title or video_id}")
+
+    success, output_file = await SINGLE_FLIGHT.run(
+        flight_key,
+        lambda: _download_with_progress(
+            url,
+            best_video,
+            best_audio,
+            video_title,
+            proxy,
+            only_audio,
+            playlist_dir,
+            concurrent_fragments,
+            duration,
+        ),
     )
-    if not video_success:
+    if not success:
         return False, None
 
-    # 下载音频
-    audio_success, audio_file = await download_audio(
-        url, best_audio, audio_filename, proxy, concurrent_fragments
+    expected_file = build_output_filename(video_title, playlist_dir, only_audio)
+    if Path(output_file) != expected_file:
+        # 本次调用共享了其他请求的下载结果
+        expected_file.parent.mkdir(exist_ok=True, parents=True)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, link_or_copy, output_file, expected_file)
+    return True, str(expected_file)
+
+
+async def _download_with_progress(
+    url: str,
+    best_video: Optional[Dict[str, Any]],
+    best_audio: Dict[str, Any],
+    video_title: Optional[str] = None,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    playlist_dir: Optional[str] = None,
+    concurrent_fragments: int = 3,
+    duration: Optional[float] = None,
+) -> Tuple[bool, Optional[str]]:
+    """下载视频并显示进度（实际执行下载）"""
+    # 创建下载目录（最终文件）和临时目录（临时流文件）
+    download_dir = get_output_dir(playlist_dir)
+    download_dir.mkdir(exist_ok=True, parents=True)
+    scratch_dir = get_scratch_dir(playlist_dir)
+    scratch_dir.mkdir(exist_ok=True, parents=True)
+
+    # 从URL提取视频ID，用于临时文件命名
+    video_id = extract_video_id(url) or "unknown"
+
+    # 预检磁盘空间，并为本次下载预留
+    scratch_size, output_size = estimate_disk_usage(
+        best_video, best_audio, only_audio, duration
     )
-    if not audio_success:
-        # 清理已下载的视频文件
-        await clean_temp_files([video_file])
+    space_needs = disk_space_needs(scratch_dir, download_dir, scratch_size, output_size)
+    space_error = DISK_SPACE.reserve(space_needs)
+    if space_error:
+        print(f"\n{space_error}")
         return False, None
 
-    # 合并视频和音频
-    if await merge_audio_video(video_file, audio_file, output_filename):
-        # 清理临时文件
-        await clean_temp_files([video_file, audio_file])
-        return True, str(output_filename)
+    manifest_info = build_manifest_info(video_id, best_video, best_audio, only_audio)
+
+    try:
+        # 使用视频ID命名临时文件
+        # 根据实际格式设置正确的扩展名
+        audio_ext = best_audio.get("ext", "webm")
+        audio_filename = (
+            scratch_dir / f"{video_id}_{best_audio['format_id']}.{audio_ext}"
+        )
+
+        # 如果只下载音频
+        if only_audio:
+            success, audio_file = await download_audio(
+                url, best_audio, audio_filename, proxy, concurrent_fragments
+            )
+            if success:
+                # 设置输出文件名（最终文件仍使用标题，包括前缀）
+                output_filename = build_output_filename(
+                    video_title, playlist_dir, only_audio
+                )
+
+                # 转换为MP3格式
+                if not await convert_to_mp3(
+                    audio_file,
+                    output_filename,
+                    duration,
+                    best_audio.get("asr"),
+                    manifest_info,
+                ):
+                    return False, None
+
+                # 清理临时文件
+                await clean_temp_files([audio_file])
+                return True, str(output_filename)
+            return False, None
+
+        # 下载视频和音频
+        video_ext = best_video.get("ext", "mp4")
+        video_filename = (
+            scratch_dir / f"{video_id}_{best_video['format_id']}.{video_ext}"
+        )
+        # 保留前缀的输出文件名
+        output_filename = build_output_filename(video_title, playlist_dir, only_audio)
+
+        # 下载视频
+        video_success, video_file = await download_video(
+            url, best_video, video_filename, proxy, concurrent_fragments
+        )
+        if not video_success:
+            return False, None
+
+        # 下载音频
+        audio_success, audio_file = await download_audio(
+            url, best_audio, audio_filename, proxy, concurrent_fragments
+        )
+        if not audio_success:
+            # 清理已下载的视频文件
+            await clean_temp_files([video_file])
+            return False, None
+
+        # 合并视频和音频
+        if await merge_audio_video(
+            video_file,
+            audio_file,
+            output_filename,
+            duration,
+            manifest_info,
+            best_audio.get("acodec"),
+        ):
+            # 清理临时文件
+            await clean_temp_files([video_file, audio_file])
+            return True, str(output_filename)
 
-    return False, None
+        return False, None
+    finally:
+        DISK_SPACE.release(space_needs)
 
 
 async def get_video_properties(file_path: str) -> Tuple[Optional[str], Optional[str]]:
@@ -358,7 +2954,7 @@ async def get_video_properties(file_path: str) -> Tuple[Optional[str], Optional[
             None,
             lambda: subprocess.check_output(
                 [
-                    "ffprobe",
+                    TOOLCHAIN.ffprobe,
                     "-v",
                     "error",
                     "-select_streams",
@@ -378,7 +2974,7 @@ async def get_video_properties(file_path: str) -> Tuple[Optional[str], Optional[
             None,
             lambda: subprocess.check_output(
                 [
-                    "ffprobe",
+                    TOOLCHAIN.ffprobe,
                     "-v",
                     "error",
                     "-select_streams",
@@ -478,13 +3074,56 @@ def extract_playlist_id(url):
     return match.group(1) if match else None
 
 
+# 频道URL: /@handle、/channel/UC...、/c/name、/user/name，可带视频类标签页
+CHANNEL_URL_PATTERN = re.compile(
+    r"^(?:https?:\/\/)?(?:www\.|m\.)?youtube\.com\/"
+    r"(?P<channel>@[\w.-]+|channel\/UC[\w-]{22}|c\/[\w.-]+|user\/[\w.-]+)"
+    r"(?:\/(?P<tab>videos|shorts|streams|featured))?\/?(?:[?#].*)?$"
+)
+
+
+def extract_channel_path(url: str) -> Optional[str]:
+    """从频道URL中提取频道路径（如 @handle/videos），不是频道URL时返回 None"""
+    match = CHANNEL_URL_PATTERN.match(url.strip())
+    if not match:
+        return None
+    # 频道首页包含多个标签页，默认只处理视频标签页
+    tab = match.group("tab")
+    if tab in (None, "featured"):
+        tab = "videos"
+    return f"{match.group('channel')}/{tab}"
+
+
+def normalize_youtube_url(url: str) -> Optional[Tuple[str, bool]]:
+    """标准化YouTube URL，返回 (URL, 是否为播放列表)，无效时返回 None
+
+    频道按播放列表处理。
+    """
+    channel_path = extract_channel_path(url) if url else None
+    if channel_path:
+        return f"https://www.youtube.com/{channel_path}", True
+    if not url or not is_youtube_url(url):
+        return None
+    if is_playlist(url):
+        playlist_id = extract_playlist_id(url)
+        return f"https://www.youtube.com/playlist?list={playlist_id}", True
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}", False
+    return None
+
+
 def get_youtube_url():
     """获取YouTube视频URL"""
     while True:
-        url = input("请输入YouTube视频或播放列表URL(输入q退出): ").strip()
+        url = input("请输入YouTube视频、播放列表或频道URL(输入q退出): ").strip()
         if url.lower() == "q":
             print("程序退出...")
             exit(0)
+        channel_path = extract_channel_path(url)
+        if channel_path:
+            print(f"\n检测到YouTube频道: {channel_path}")
+            return f"https://www.youtube.com/{channel_path}", True
         if url and is_youtube_url(url):
             if is_playlist(url):
                 playlist_id = extract_playlist_id(url)
@@ -507,12 +3146,14 @@ def get_youtube_url():
                 else:
                     print("无法从URL中提取视频ID。")
                     continue
-        print("请输入一个有效的YouTube视频或播放列表URL。")
+        print("请输入一个有效的YouTube视频、播放列表或频道URL。")
 
 
 def get_windows_proxy():
     """获取Windows系统代理设置"""
     try:
+        import winreg  # 仅 Windows 提供
+
         with winreg.OpenKey(
             winreg.HKEY_CURRENT_USER,
             r"Software\Microsoft\Windows\CurrentVersion\Internet Settings",
@@ -569,44 +3210,445 @@ def get_proxy_config():
     return None
 
 
-async def download_with_resume(
-    url: str, file_path: str, proxy: Optional[str] = None
-) -> bool:
-    """支持断点续传的下载函数"""
-    try:
-        # 设置请求头和代理
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
+# 代理健康检查使用的地址（返回 204，没有内容）
+PROXY_PROBE_URL = "https://www.youtube.com/generate_204"
+# 后台健康检查的间隔（秒）
+PROXY_CHECK_INTERVAL = 300.0
+# 代理出错后暂停分配的时间（秒）
+PROXY_FAILURE_COOLDOWN = 120.0
+# 选择代理时比较传输这么多字节的预计耗时
+PROXY_SCORE_BYTES = 10 * 1024 * 1024
+# 属于代理问题的错误：连接失败，或出口IP被限制访问(403/429)
+PROXY_ERROR_PATTERN = re.compile(
+    r"HTTP Error (?:403|429)|ProxyError|Unable to connect to proxy"
+    r"|Tunnel connection failed|Connection (?:refused|reset|aborted)"
+    r"|timed out|Failed to resolve|Name or service not known",
+    re.IGNORECASE,
+)
+
+
+class ProxyAttempt:
+    """使用某个代理的一次下载尝试，记录其间遇到的代理问题
+
+    按尝试记录而不是比较代理的累计出错次数，其他视频同时报告的错误不会被误认为本次的。
+    """
+
+    def __init__(self, proxy: Optional[str]) -> None:
+        self.proxy = proxy
+        self.error: Optional[BaseException] = None  # 第一个属于代理问题的错误
+
+    @property
+    def proxy_failed(self) -> bool:
+        """本次尝试是否因代理问题失败"""
+        return self.error is not None
+
+
+# 当前任务所在的代理尝试，由 run_with_proxy 设置，随上下文传给子任务
+CURRENT_PROXY_ATTEMPT: contextvars.ContextVar[Optional[ProxyAttempt]] = (
+    contextvars.ContextVar("CURRENT_PROXY_ATTEMPT", default=None)
+)
+
+
+def describe_proxy(proxy: Optional[str]) -> str:
+    """用于显示的代理名称，隐藏认证信息"""
+    if not proxy:
+        return "直连"
+    return re.sub(r"//[^/@]*@", "//", proxy)
+
+
+class ProxyPool:
+    """代理池：定期探测各代理的可用性和延迟，为每个视频固定一个代理，出错时切换
+
+    同一视频的信息提取和音视频流下载使用同一个代理（媒体地址与出口IP绑定）。
+    选择代理时综合延迟、实测吞吐量和正在使用该代理的视频数。
+    """
+
+    def __init__(self, probe_url: str = PROXY_PROBE_URL) -> None:
+        self.probe_url = probe_url
+        self.proxies: List[Optional[str]] = []
+        self._lock = threading.Lock()
+        self._latency: Dict[Optional[str], Optional[float]] = {}  # None 表示探测失败
+        self._throughput: Dict[Optional[str], float] = {}  # 字节/秒，滑动平均
+        self._cooldown_until: Dict[Optional[str], float] = {}
+        self._failures: Dict[Optional[str], int] = {}
+        self._active: Dict[Optional[str], int] = {}
+        self._pinned: Dict[str, Optional[str]] = {}  # 视频 -> 固定的代理
+
+    @property
+    def enabled(self) -> bool:
+        """是否配置了代理池"""
+        return bool(self.proxies)
+
+    @property
+    def max_attempts(self) -> int:
+        """单个视频最多尝试的代理数"""
+        return min(len(self.proxies), 3)
+
+    @staticmethod
+    def read_file(path: Union[str, Path]) -> List[Optional[str]]:
+        """读取代理列表文件：每行一个代理，# 开头为注释，direct 表示直连"""
+        proxies: List[Optional[str]] = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                proxy = None if line.lower() == "direct" else line
+                if proxy not in proxies:
+                    proxies.append(proxy)
+        return proxies
+
+    def set_proxies(
+        self,
+        proxies: List[Optional[str]],
+        latency: Optional[Dict[Optional[str], Optional[float]]] = None,
+    ) -> None:
+        """设置代理列表，可带上已探测的延迟（未提供时视为可用）"""
+        with self._lock:
+            self.proxies = list(proxies)
+            self._latency = {p: (latency or {}).get(p, 0.0) for p in self.proxies}
+
+    def latency_snapshot(self) -> Dict[Optional[str], Optional[float]]:
+        """各代理最近一次探测的延迟"""
+        with self._lock:
+            return dict(self._latency)
+
+    def probe(self, proxy: Optional[str]) -> Optional[float]:
+        """通过代理请求探测地址，返回延迟（秒），不可用时返回 None"""
+        session = requests.Session()
+        session.trust_env = False  # 直连时不使用环境变量中的代理
         proxies = {"http": proxy, "https": proxy} if proxy else None
+        start = time.monotonic()
+        try:
+            with session.get(
+                self.probe_url, proxies=proxies, timeout=10, stream=True
+            ) as response:
+                if response.status_code >= 400:
+                    return None
+                return time.monotonic() - start
+        except requests.exceptions.RequestException:
+            return None
+        finally:
+            session.close()
+
+    def check_all(self) -> None:
+        """并行探测所有代理"""
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(self.proxies), 8) or 1
+        ) as executor:
+            results = list(executor.map(self.probe, self.proxies))
+        with self._lock:
+            for proxy, latency in zip(self.proxies, results):
+                self._latency[proxy] = latency
+                METRICS.set_gauge(
+                    f"proxy.{describe_proxy(proxy)}.latency",
+                    latency if latency is not None else -1,
+                )
 
-        # 获取已下载文件的大小
-        file_size = 0
-        if os.path.exists(file_path):
-            file_size = os.path.getsize(file_path)
-            headers["Range"] = f"bytes={file_size}-"
+    async def monitor(self, interval: float = PROXY_CHECK_INTERVAL) -> None:
+        """后台定期探测，直到任务被取消"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            await loop.run_in_executor(None, self.check_all)
+
+    def _score(self, proxy: Optional[str]) -> float:
+        """预计耗时：延迟加上与其他视频分享带宽时传输参考字节数的时间"""
+        throughput = self._throughput.get(proxy) or ASSUMED_TRANSFER_SPEED
+        sharing = self._active.get(proxy, 0) + 1
+        return (
+            self._latency.get(proxy) or 0.0
+        ) + PROXY_SCORE_BYTES * sharing / throughput
+
+    def acquire(self, key: str) -> Optional[str]:
+        """为视频分配代理，同一视频在释放前始终使用同一个代理"""
+        with self._lock:
+            if key in self._pinned:
+                return self._pinned[key]
+            now = time.monotonic()
+            candidates = [
+                p
+                for p in self.proxies
+                if self._latency.get(p) is not None
+                and self._cooldown_until.get(p, 0) <= now
+            ]
+            if not candidates:
+                # 全部不可用时选择最早结束冷却的代理
+                candidates = [
+                    min(self.proxies, key=lambda p: self._cooldown_until.get(p, 0))
+                ]
+            proxy = min(candidates, key=self._score)
+            self._pinned[key] = proxy
+            self._active[proxy] = self._active.get(proxy, 0) + 1
+            return proxy
 
-        # 发送请求
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: requests.get(url, headers=headers, proxies=proxies, stream=True),
-        )
-        total_size = int(response.headers.get("content-length", 0)) + file_size
+    def release(self, key: str) -> None:
+        """视频下载结束，释放固定的代理"""
+        with self._lock:
+            if key not in self._pinned:
+                return
+            proxy = self._pinned.pop(key)
+            self._active[proxy] = max(self._active.get(proxy, 0) - 1, 0)
 
-        mode = "ab" if file_size > 0 else "wb"
-        (
-            print(f"\n继续从 {file_size/(1024*1024):.1f}MB 处开始下载...")
-            if file_size > 0
-            else print("\n开始下载...")
-        )
+    def report_error(self, proxy: Optional[str], error: BaseException) -> bool:
+        """记录请求错误，属于代理问题时让该代理冷却并记入当前尝试，返回是否为代理问题"""
+        if not self.enabled or not PROXY_ERROR_PATTERN.search(str(error)):
+            return False
+        with self._lock:
+            self._failures[proxy] = self._failures.get(proxy, 0) + 1
+            self._cooldown_until[proxy] = time.monotonic() + PROXY_FAILURE_COOLDOWN
+        METRICS.increment(f"proxy.{describe_proxy(proxy)}.failures")
+        attempt = CURRENT_PROXY_ATTEMPT.get()
+        if attempt is not None and attempt.proxy == proxy and attempt.error is None:
+            attempt.error = error
+        return True
+
+    def failure_count(self, proxy: Optional[str]) -> int:
+        """代理累计出错的次数"""
+        with self._lock:
+            return self._failures.get(proxy, 0)
+
+    def record_progress(self, proxy: Optional[str], d: Dict[str, Any]) -> None:
+        """yt-dlp 进度回调：传输完成时记录代理的吞吐量"""
+        if d.get("status") != "finished":
+            return
+        downloaded = d.get("downloaded_bytes") or d.get("total_bytes")
+        elapsed = d.get("elapsed")
+        if not downloaded or not elapsed:
+            return
+        speed = downloaded / elapsed
+        with self._lock:
+            previous = self._throughput.get(proxy)
+            self._throughput[proxy] = (
+                speed if previous is None else 0.7 * previous + 0.3 * speed
+            )
+        name = describe_proxy(proxy)
+        METRICS.increment(f"proxy.{name}.bytes", downloaded)
+        METRICS.increment(f"proxy.{name}.seconds", elapsed)
+
+
+# 全局代理池，通过 --proxy-file 配置
+PROXY_POOL = ProxyPool()
+
+
+async def load_proxy_pool(path: str) -> bool:
+    """读取代理列表并进行首次健康检查"""
+    try:
+        proxies = ProxyPool.read_file(path)
+    except OSError as e:
+        print(f"无法读取代理列表文件: {str(e)}")
+        return False
+    if not proxies:
+        print("代理列表文件中没有代理")
+        return False
+
+    PROXY_POOL.set_proxies(proxies)
+    print(f"正在检查 {len(proxies)} 个代理...")
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, PROXY_POOL.check_all)
+    for proxy, latency in PROXY_POOL.latency_snapshot().items():
+        status = f"{latency * 1000:.0f}ms" if latency is not None else "不可用"
+        print(f"- {describe_proxy(proxy)}: {status}")
+    return True
+
+
+def report_proxy_stats() -> None:
+    """输出各代理的吞吐量和出错次数（多进程时包含各工作进程的统计）"""
+    counters = METRICS.snapshot()["counters"]
+    print("\n代理统计:")
+    for proxy in PROXY_POOL.proxies:
+        name = describe_proxy(proxy)
+        transferred = counters.get(f"proxy.{name}.bytes", 0)
+        seconds = counters.get(f"proxy.{name}.seconds", 0)
+        speed = transferred / seconds / 1024 / 1024 if seconds else 0
+        print(
+            f"- {name}: 传输 {transferred / 1024 / 1024:.1f}MB，"
+            f"平均 {speed:.2f}MB/s，出错 {int(counters.get(f'proxy.{name}.failures', 0))} 次"
+        )
+
+
+async def run_with_proxy(
+    key: str,
+    proxy: Optional[str],
+    attempt: Callable[[Optional[str]], Awaitable[bool]],
+) -> bool:
+    """运行一次下载；使用代理池时为 key 固定一个代理，代理出错时换一个代理重试"""
+    if not PROXY_POOL.enabled:
+        return await attempt(proxy)
+
+    for tries in range(PROXY_POOL.max_attempts):
+        pinned = PROXY_POOL.acquire(key)
+        current = ProxyAttempt(pinned)
+        token = CURRENT_PROXY_ATTEMPT.set(current)
+        try:
+            if await attempt(pinned):
+                return True
+        finally:
+            CURRENT_PROXY_ATTEMPT.reset(token)
+            PROXY_POOL.release(key)
+        if not current.proxy_failed:
+            return False  # 与代理无关的失败，换代理也无济于事
+        if tries + 1 < PROXY_POOL.max_attempts:
+            print(f"\n代理 {describe_proxy(pinned)} 出错，切换代理重试...")
+    return False
+
+
+# fallocate(2) 只分配空间、不改变文件长度的标志
+FALLOC_FL_KEEP_SIZE = 1
+# SetFileInformationByHandle 的 FileAllocationInfo
+FILE_ALLOCATION_INFO_CLASS = 5
+
+
+def preallocate_file(f: Any, size: int) -> bool:
+    """为文件预分配空间，减少长时间下载产生的碎片"""
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            # Windows(NTFS) 上设置文件长度会直接分配磁盘空间
+            f.truncate(size)
+        return True
+    except OSError:
+        return False
+
+
+def reserve_file_space(path: Union[str, Path], size: int) -> bool:
+    """为写入中的文件预留磁盘空间，不改变文件长度
+
+    yt-dlp 按 .part 文件的长度续传，因此不能像 preallocate_file 那样扩展文件。
+    Linux 使用 fallocate(FALLOC_FL_KEEP_SIZE)，完成后由 release_file_space
+    释放多预留的部分；Windows 设置分配大小，最后一个句柄关闭时 NTFS 自动释放。
+    """
+    import ctypes
+
+    try:
+        with open(path, "r+b") as f:
+            if platform.system() == "Windows":
+                import msvcrt
+                from ctypes import wintypes
+
+                set_info = ctypes.windll.kernel32.SetFileInformationByHandle
+                set_info.argtypes = (
+                    wintypes.HANDLE,
+                    ctypes.c_int,
+                    ctypes.c_void_p,
+                    wintypes.DWORD,
+                )
+                allocation = ctypes.c_int64(size)  # FILE_ALLOCATION_INFO
+                return bool(
+                    set_info(
+                        msvcrt.get_osfhandle(f.fileno()),
+                        FILE_ALLOCATION_INFO_CLASS,
+                        ctypes.byref(allocation),
+                        ctypes.sizeof(allocation),
+                    )
+                )
+            if platform.system() == "Linux":
+                libc = ctypes.CDLL(None, use_errno=True)
+                libc.fallocate.argtypes = (
+                    ctypes.c_int,
+                    ctypes.c_int,
+                    ctypes.c_int64,
+                    ctypes.c_int64,
+                )
+                return libc.fallocate(f.fileno(), FALLOC_FL_KEEP_SIZE, 0, size) == 0
+    except (OSError, AttributeError):
+        pass
+    return False
+
+
+def release_file_space(path: Union[str, Path]) -> None:
+    """释放文件末尾之后预留但未使用的空间（截断到当前长度）"""
+    if platform.system() != "Linux":
+        return
+    try:
+        os.truncate(path, os.path.getsize(path))
+    except OSError:
+        pass
+
+
+def preallocate_hook(reserved: set, d: Dict[str, Any]) -> None:
+    """yt-dlp 进度回调：首次报告进度时按预计大小为 .part 文件预留空间"""
+    if d["status"] == "downloading":
+        path = d.get("tmpfilename")
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if path and total and path not in reserved:
+            reserved.add(path)
+            reserve_file_space(path, int(total))
+    elif d["status"] == "finished" and d.get("filename"):
+        release_file_space(d["filename"])
+
+
+def write_download_progress(progress_path: str, downloaded: int) -> None:
+    """记录预分配文件中实际已写入的字节数"""
+    with open(progress_path, "w") as progress_file:
+        progress_file.write(str(downloaded))
+
+
+async def download_with_resume(
+    url: str, file_path: str, proxy: Optional[str] = None
+) -> bool:
+    """支持断点续传的下载函数"""
+    progress_path = file_path + ".progress"
+    downloaded = None
+    chunk_size = 8192
+    buffers = 0
+    try:
+        # 与其他传输共享内存预算，预算用完时等待
+        loop = asyncio.get_event_loop()
+        buffers = await loop.run_in_executor(None, MEMORY_BUDGET.acquire, 1, chunk_size)
+
+        # 设置请求头和代理
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+        }
+        proxies = {"http": proxy, "https": proxy} if proxy else None
+
+        # 获取已下载文件的大小（预分配的文件以进度记录为准）
+        file_size = 0
+        if os.path.exists(file_path):
+            file_size = os.path.getsize(file_path)
+            if os.path.exists(progress_path):
+                with open(progress_path) as progress_file:
+                    file_size = min(int(progress_file.read() or 0), file_size)
+            headers["Range"] = f"bytes={file_size}-"
 
+        # 发送请求
+        response = await loop.run_in_executor(
+            None,
+            lambda: requests.get(
+                url,
+                headers=headers,
+                proxies=proxies,
+                stream=True,
+                # 读取超时用于打断连接保持但没有数据的传输
+                timeout=(10, STALL_WATCHDOG.stall_timeout),
+            ),
+        )
+        if file_size > 0 and response.status_code != 206:
+            file_size = 0  # 服务器不支持断点续传，从头开始
+        content_length = int(response.headers.get("content-length", 0))
+        total_size = content_length + file_size
+
+        mode = "r+b" if os.path.exists(file_path) else "wb"
+        (
+            print(f"\n继续从 {file_size/(1024*1024):.1f}MB 处开始下载...")
+            if file_size > 0
+            else print("\n开始下载...")
+        )
+
+        STALL_WATCHDOG.start(file_path)
         with open(file_path, mode) as f:
+            f.seek(file_size)
             downloaded = file_size
-            chunk_size = 8192
             last_print_time = time.time()
             last_downloaded = downloaded
 
+            # 大小已知时预分配空间，实际写入进度另行记录以便续传
+            if file_size == 0 and content_length > 0:
+                if preallocate_file(f, content_length):
+                    write_download_progress(progress_path, 0)
+
             # 创建迭代器
             chunks_iterator = response.iter_content(chunk_size=chunk_size)
 
@@ -624,6 +3666,7 @@ async def download_with_resume(
 
                 f.write(chunk)
                 downloaded += len(chunk)
+                STALL_WATCHDOG.record(file_path, downloaded)
 
                 # 每秒更新一次下载进度
                 current_time = time.time()
@@ -632,6 +3675,8 @@ async def download_with_resume(
                         current_time - last_print_time
                     )
                     speed_text = f"{speed/1024/1024:.2f}MB/s"
+                    if MEMORY_BUDGET.limit:
+                        speed_text += f" | 缓冲: {MEMORY_BUDGET.describe()}"
 
                     if total_size > 0:
                         percent = downloaded * 100 / total_size
@@ -651,145 +3696,439 @@ async def download_with_resume(
 
                     last_print_time = current_time
                     last_downloaded = downloaded
+                    if os.path.exists(progress_path):
+                        write_download_progress(progress_path, downloaded)
+
+            # 去掉预分配但未写入的部分
+            f.truncate(downloaded)
 
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
         print("\n下载完成!")
         return True
 
+    except TransferStalledError as e:
+        # 返回失败，由调用方从部分文件续传
+        print(f"\n{str(e)}，稍后将从部分文件续传")
+        return False
     except requests.exceptions.RequestException as e:
         print(f"\n下载出错: {str(e)}")
         return False
     except Exception as e:
         print(f"\n发生未知错误: {str(e)}")
         return False
+    finally:
+        MEMORY_BUDGET.release(buffers, chunk_size)
+        STALL_WATCHDOG.stop(file_path)
+        if downloaded is not None and os.path.exists(progress_path):
+            # 记录中断时的实际进度
+            write_download_progress(progress_path, downloaded)
+
+
+# FFmpeg 构建的下载地址，有多个地址时先测速，从最快的开始尝试
+FFMPEG_DOWNLOAD_URLS = [
+    "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip",
+]
+# 需要从压缩包中取出的文件
+FFMPEG_MEMBERS = ("ffmpeg.exe", "ffprobe.exe")
+# 每个下载地址的最大尝试次数
+FFMPEG_DOWNLOAD_RETRIES = 3
+# FFmpeg 缓存中记录来源和校验和的文件
+FFMPEG_CACHE_MANIFEST = "manifest.json"
+# 按范围读取压缩包时每次请求的数据量
+ZIP_RANGE_BLOCK = 4 * 1024 * 1024
+# 下载地址测速时读取的数据量和超时（秒）
+MIRROR_PROBE_BYTES = 512 * 1024
+MIRROR_PROBE_TIMEOUT = 15.0
+
+
+class RangeNotSupportedError(Exception):
+    """服务器不支持 HTTP 范围请求"""
+
+
+class HTTPRangeFile:
+    """通过 HTTP 范围请求按需读取的只读文件，供 zipfile 直接读取远程压缩包
+
+    zipfile 先读取末尾的中央目录，再定位到各成员，因此只会下载
+    目录和需要的成员附近的数据。每次请求一个数据块并缓存最近的一块。
+    """
+
+    def __init__(
+        self,
+        session: "requests.Session",
+        url: str,
+        cancel_event: Optional[threading.Event] = None,
+        block_size: int = ZIP_RANGE_BLOCK,
+    ) -> None:
+        self.session = session
+        self.url = url
+        self.cancel_event = cancel_event
+        self.block_size = block_size
+        self.bytes_fetched = 0
+        self._pos = 0
+        self._block_start = 0
+        self._block = b""
+        # 只读取响应头：不支持范围请求的服务器会返回整个文件
+        with session.get(
+            url, headers={"Range": "bytes=0-0"}, stream=True, timeout=(10, 30)
+        ) as response:
+            response.raise_for_status()
+            content_range = response.headers.get("Content-Range", "")
+        if response.status_code != 206 or "/" not in content_range:
+            raise RangeNotSupportedError(f"服务器不支持范围请求: {url}")
+        self.size = int(content_range.rsplit("/", 1)[1])
+
+    def _request(self, start: int, end: int) -> "requests.Response":
+        """请求 [start, end] 字节"""
+        response = self.session.get(
+            self.url, headers={"Range": f"bytes={start}-{end}"}, timeout=(10, 30)
+        )
+        response.raise_for_status()
+        self.bytes_fetched += len(response.content)
+        return response
 
+    def seekable(self) -> bool:
+        return True
 
-async def download_and_install_ffmpeg(proxy: Optional[str] = None) -> bool:
-    """下载并安装 FFmpeg 到当前目录"""
-    if platform.system() != "Windows":
-        print("自动安装只支持 Windows 系统")
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        self._pos = min(max(offset, 0), self.size)
+        return self._pos
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self._pos
+        data = bytearray()
+        while n > 0 and self._pos < self.size:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("下载已取消")
+            offset = self._pos - self._block_start
+            if not 0 <= offset < len(self._block):
+                end = min(self._pos + self.block_size, self.size) - 1
+                response = self._request(self._pos, end)
+                if response.status_code != 206:
+                    raise RangeNotSupportedError(f"服务器不支持范围请求: {self.url}")
+                self._block_start, self._block = self._pos, response.content
+                offset = 0
+            chunk = self._block[offset : offset + n]
+            data += chunk
+            self._pos += len(chunk)
+            n -= len(chunk)
+        return bytes(data)
+
+    def close(self) -> None:
+        self._block = b""
+
+
+def extract_zip_members(
+    archive_file: Any,
+    members: Tuple[str, ...],
+    dest_dir: Union[str, Path],
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, str]:
+    """从压缩包中只解压指定文件名的成员（不论所在目录），返回 文件名 -> SHA-256
+
+    成员读取到末尾时 zipfile 会校验 CRC32，数据损坏时抛出 BadZipFile。
+    """
+    with zipfile.ZipFile(archive_file) as archive:
+        found: Dict[str, zipfile.ZipInfo] = {}
+        for info in archive.infolist():
+            name = info.filename.rsplit("/", 1)[-1]
+            if name in members and name not in found and not info.is_dir():
+                found[name] = info
+        missing = [name for name in members if name not in found]
+        if missing:
+            raise FileNotFoundError(f"压缩包中没有 {', '.join(missing)}")
+
+        digests = {}
+        for name, info in found.items():
+            target = Path(dest_dir) / name
+            part_path = TempFileManager.part_path(target)
+            digest = hashlib.sha256()
+            try:
+                with archive.open(info) as src, open(part_path, "wb") as dst:
+                    while True:
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise yt_dlp.utils.DownloadCancelled("解压已取消")
+                        chunk = src.read(HASH_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        dst.write(chunk)
+                os.replace(part_path, target)
+            except BaseException:
+                TEMP_FILES.discard([part_path])
+                raise
+            digests[name] = digest.hexdigest()
+    return digests
+
+
+def fetch_zip_members(
+    url: str,
+    members: Tuple[str, ...],
+    dest_dir: Union[str, Path],
+    proxy: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, str]:
+    """按范围请求直接从远程压缩包中解压需要的成员，不下载整个压缩包"""
+    with requests.Session() as session:
+        if proxy:
+            session.proxies = {"http": proxy, "https": proxy}
+        remote = HTTPRangeFile(session, url, cancel_event)
+        digests = extract_zip_members(remote, members, dest_dir, cancel_event)
+        print(
+            f"已读取压缩包中的 {remote.bytes_fetched / 1024 / 1024:.1f}MB"
+            f"(共 {remote.size / 1024 / 1024:.1f}MB)"
+        )
+        return digests
+
+
+def probe_mirror(url: str, proxy: Optional[str] = None) -> float:
+    """下载地址测速：读取开头一段数据，返回吞吐量（字节/秒）"""
+    proxies = {"http": proxy, "https": proxy} if proxy else None
+    start = time.monotonic()
+    with requests.get(
+        url,
+        headers={"Range": f"bytes=0-{MIRROR_PROBE_BYTES - 1}"},
+        proxies=proxies,
+        stream=True,
+        timeout=(10, MIRROR_PROBE_TIMEOUT),
+    ) as response:
+        response.raise_for_status()
+        received = 0
+        for chunk in response.iter_content(64 * 1024):
+            received += len(chunk)
+            if received >= MIRROR_PROBE_BYTES:
+                break
+    return received / max(time.monotonic() - start, 1e-6)
+
+
+async def rank_mirrors(urls: List[str], proxy: Optional[str] = None) -> List[str]:
+    """并行测速，按吞吐量从快到慢排列下载地址，测速失败的排在最后"""
+    if len(urls) < 2:
+        return list(urls)
+    print(f"\n正在测试 {len(urls)} 个下载地址的速度...")
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                loop.run_in_executor(None, probe_mirror, url, proxy),
+                MIRROR_PROBE_TIMEOUT,
+            )
+            for url in urls
+        ),
+        return_exceptions=True,
+    )
+    speeds = {
+        url: result if isinstance(result, float) else 0.0
+        for url, result in zip(urls, results)
+    }
+    for url in urls:
+        speed = speeds[url]
+        status = f"{speed / 1024 / 1024:.2f}MB/s" if speed else "不可用"
+        print(f"- {url}: {status}")
+    return sorted(urls, key=lambda url: -speeds[url])
+
+
+def default_ffmpeg_cache_dir() -> Path:
+    """默认的 FFmpeg 缓存目录（按用户）"""
+    return default_cache_root() / "ffmpeg"
+
+
+def install_from_ffmpeg_cache(cache_dir: Path, dest_dir: Path) -> bool:
+    """从缓存复制 FFmpeg，缓存文件和复制结果都与清单中的校验和一致时返回 True"""
+    try:
+        with open(cache_dir / FFMPEG_CACHE_MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return False
+    files = manifest.get("files", {})
+    if any(name not in files for name in FFMPEG_MEMBERS):
         return False
+    for name in FFMPEG_MEMBERS:
+        src = cache_dir / name
+        if not src.exists() or hash_file(src) != files[name]:
+            print(f"缓存中的 {name} 校验失败，重新下载")
+            return False
+    for name in FFMPEG_MEMBERS:
+        dst = dest_dir / name
+        part_path = TempFileManager.part_path(dst)
+        if copy_with_hash(cache_dir / name, part_path) != files[name]:
+            TEMP_FILES.discard([part_path])
+            return False
+        os.replace(part_path, dst)
+    print(f"已从缓存安装 FFmpeg: {cache_dir}")
+    return True
+
 
-    temp_dir = None
+def store_ffmpeg_cache(
+    cache_dir: Path, src_dir: Path, digests: Dict[str, str], source: str
+) -> None:
+    """把解压出的文件放入缓存，清单最后写入，作为缓存完整的标志"""
     try:
-        print("\n正在下载 FFmpeg...")
-        temp_dir = Path.cwd() / "temp_ffmpeg"
-        temp_dir.mkdir(exist_ok=True)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name in FFMPEG_MEMBERS:
+            part_path = TempFileManager.part_path(cache_dir / name)
+            copy_with_hash(src_dir / name, part_path)
+            os.replace(part_path, cache_dir / name)
+        manifest_path = cache_dir / FFMPEG_CACHE_MANIFEST
+        part_path = TempFileManager.part_path(manifest_path)
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "source": source,
+                    "files": digests,
+                    "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(part_path, manifest_path)
+    except OSError as e:
+        print(f"警告：无法写入 FFmpeg 缓存: {str(e)}")
 
-        zip_path = temp_dir / "ffmpeg.zip"
-        extract_path = temp_dir / "ffmpeg"
 
-        # FFmpeg 下载链接
-        download_urls = [
-            "https://github.com/BtbN/FFmpeg-Builds/releases/download/latest/ffmpeg-master-latest-win64-gpl.zip",
-        ]
+async def install_ffmpeg(
+    dest_dir: Path,
+    urls: List[str],
+    cache_dir: Optional[Path] = None,
+    proxy: Optional[str] = None,
+) -> bool:
+    """安装 FFmpeg 到 dest_dir：优先使用缓存，否则从最快的地址只解压需要的文件"""
+    loop = asyncio.get_running_loop()
+    if cache_dir is not None and await loop.run_in_executor(
+        None, install_from_ffmpeg_cache, cache_dir, dest_dir
+    ):
+        return True
 
-        # 尝试所有下载链接
-        download_success = False
-        for url in download_urls:
+    temp_dir = dest_dir / "temp_ffmpeg"
+    temp_dir.mkdir(exist_ok=True)
+    try:
+        for url in await rank_mirrors(urls, proxy):
             print(f"\n尝试从 {url} 下载...")
-            max_retries = 300
-            for retry in range(max_retries):
+            for attempt in range(FFMPEG_DOWNLOAD_RETRIES):
                 try:
-                    if await download_with_resume(url, str(zip_path), proxy):
-                        # 验证下载的文件
-                        if zip_path.exists() and zipfile.is_zipfile(zip_path):
-                            download_success = True
-                            break
-                        else:
-                            print(
-                                f"\n下载的文件无效,正在重试({retry + 1}/{max_retries})..."
+                    try:
+                        digests = await run_cancellable(
+                            lambda cancel_event: fetch_zip_members(
+                                url, FFMPEG_MEMBERS, temp_dir, proxy, cancel_event
                             )
-                            if zip_path.exists():
-                                zip_path.unlink()
-                except Exception as e:
+                        )
+                    except RangeNotSupportedError:
+                        # 只能下载整个压缩包，再从中解压需要的文件
+                        zip_path = temp_dir / "ffmpeg.zip"
+                        if not await download_with_resume(url, str(zip_path), proxy):
+                            raise IOError("下载压缩包失败")
+                        digests = await run_cancellable(
+                            lambda cancel_event: extract_zip_members(
+                                zip_path, FFMPEG_MEMBERS, temp_dir, cancel_event
+                            )
+                        )
+                except (
+                    requests.exceptions.RequestException,
+                    OSError,
+                    zipfile.BadZipFile,
+                ) as e:
                     print(f"\n下载出错: {str(e)}")
-                    if retry < max_retries - 1:
-                        print(f"等待 5 秒后重试({retry + 1}/{max_retries})...")
-                        await asyncio.sleep(5)
+                    if attempt + 1 < FFMPEG_DOWNLOAD_RETRIES:
+                        delay = 2 ** (attempt + 1)
+                        print(
+                            f"等待 {delay} 秒后重试({attempt + 1}/{FFMPEG_DOWNLOAD_RETRIES})..."
+                        )
+                        await asyncio.sleep(delay)
                     continue
 
-            if download_success:
-                break
-
-        if not download_success:
-            print("\n所有下载地址均失败，请稍后重试或手动安装")
-            return False
-
-        # 解压后只复制需要的文件到当前目录
-        print("正在解压并复制必要文件...")
-        loop = asyncio.get_event_loop()
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            await loop.run_in_executor(None, zip_ref.extractall, extract_path)
-
-        ffmpeg_dirs = [d for d in os.listdir(extract_path) if "ffmpeg" in d.lower()]
-        if not ffmpeg_dirs:
-            print("无法找到 FFmpeg 目录")
-            return False
-
-        bin_path = extract_path / ffmpeg_dirs[0] / "bin"
+                for name in FFMPEG_MEMBERS:
+                    await loop.run_in_executor(
+                        None, move_file, temp_dir / name, dest_dir / name
+                    )
+                if cache_dir is not None:
+                    await loop.run_in_executor(
+                        None, store_ffmpeg_cache, cache_dir, dest_dir, digests, url
+                    )
+                return True
+        print("\n所有下载地址均失败，请稍后重试或手动安装")
+        return False
+    finally:
+        await loop.run_in_executor(None, shutil.rmtree, temp_dir, True)
 
-        # 复制必要的可执行文件到当前目录
-        for file in ["ffmpeg.exe", "ffprobe.exe"]:
-            src = bin_path / file
-            dst = Path.cwd() / file
-            if src.exists():
-                await loop.run_in_executor(None, shutil.copy2, src, dst)
 
-        print("FFmpeg 文件已复制到当前目录！")
-        return True
+async def download_and_install_ffmpeg(
+    proxy: Optional[str] = None, cache_dir: Optional[Union[str, Path]] = None
+) -> bool:
+    """下载并安装 FFmpeg 到当前目录"""
+    if platform.system() != "Windows":
+        print("自动安装只支持 Windows 系统")
+        return False
 
+    print("\n正在下载 FFmpeg...")
+    try:
+        if await install_ffmpeg(
+            Path.cwd(),
+            FFMPEG_DOWNLOAD_URLS,
+            Path(cache_dir) if cache_dir else default_ffmpeg_cache_dir(),
+            proxy,
+        ):
+            print("FFmpeg 文件已复制到当前目录！")
+            return True
+        return False
     except Exception as e:
         print(f"安装 FFmpeg 时出错: {str(e)}")
         return False
-    finally:
-        # 清理临时文件
-        if temp_dir and temp_dir.exists():
-            try:
-                await loop.run_in_executor(None, shutil.rmtree, temp_dir)
-            except Exception as e:
-                print(f"清理临时文件时出错: {str(e)}")
-
 
-async def check_ffmpeg(proxy: Optional[str] = None) -> bool:
-    """检查当前目录或系统是否安装了 ffmpeg"""
-    current_dir = Path.cwd()
-    ffmpeg_path = current_dir / "ffmpeg.exe"
-    ffprobe_path = current_dir / "ffprobe.exe"
 
-    if ffmpeg_path.exists() and ffprobe_path.exists():
+async def check_ffmpeg(
+    proxy: Optional[str] = None, cache_dir: Optional[str] = None
+) -> bool:
+    """检查当前目录或系统是否安装了 ffmpeg，找到后读取其能力（有缓存时不运行 ffmpeg）"""
+    loop = asyncio.get_event_loop()
+    if await loop.run_in_executor(None, TOOLCHAIN.resolve):
+        missing = TOOLCHAIN.missing_capabilities()
+        if missing:
+            print(f"\n警告: 当前 FFmpeg 不支持 {'、'.join(missing)}，部分功能可能失败")
+        if "ffprobe" not in TOOLCHAIN.paths:
+            print("\n警告: 未找到 ffprobe，无法校验下载的视频格式")
         return True
 
-    try:
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(
-            None,
-            lambda: subprocess.run(
-                ["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            ),
-        )
-        return True
-    except FileNotFoundError:
-        print("\nFFmpeg 未安装！")
-        if platform.system() == "Windows":
-            print("\n是否要下载 FFmpeg 到当前目录？(y/n): ", end="")
-            if input().strip().lower() == "y":
-                return await download_and_install_ffmpeg(proxy)
-            else:
-                print("\n请手动下载 FFmpeg:")
-                print("1. 访问 https://github.com/BtbN/FFmpeg-Builds/releases")
-                print("2. 下载 ffmpeg-master-latest-win64-gpl.zip")
-                print("3. 解压文件")
-                print("4. 将 ffmpeg.exe 和 ffprobe.exe 复制到当前目录")
+    print("\nFFmpeg 未安装！")
+    if platform.system() == "Windows":
+        print("\n是否要下载 FFmpeg 到当前目录？(y/n): ", end="")
+        if input().strip().lower() == "y":
+            if not await download_and_install_ffmpeg(proxy, cache_dir):
+                return False
+            return await loop.run_in_executor(None, TOOLCHAIN.resolve)
         else:
-            print("请使用包管理器安装 FFmpeg:")
-            print("Ubuntu/Debian: sudo apt-get install ffmpeg")
-            print("macOS: brew install ffmpeg")
-        return False
+            print("\n请手动下载 FFmpeg:")
+            print("1. 访问 https://github.com/BtbN/FFmpeg-Builds/releases")
+            print("2. 下载 ffmpeg-master-latest-win64-gpl.zip")
+            print("3. 解压文件")
+            print("4. 将 ffmpeg.exe 和 ffprobe.exe 复制到当前目录")
+    else:
+        print("请使用包管理器安装 FFmpeg:")
+        print("Ubuntu/Debian: sudo apt-get install ffmpeg")
+        print("macOS: brew install ffmpeg")
+    return False
 
 
 def parse_arguments():
     """解析命令行参数"""
     parser = argparse.ArgumentParser(description="YouTube视频下载器")
+    parser.add_argument(
+        "url", nargs="?", help="YouTube视频、播放列表或频道URL，不提供时交互输入"
+    )
+    parser.add_argument("--proxy", help="代理地址，提供时不再询问代理设置")
+    parser.add_argument(
+        "--proxy-file",
+        help="代理列表文件，每行一个代理(direct 表示直连)，"
+        "按健康检查和吞吐量为每个视频分配代理，出错时自动切换",
+    )
     parser.add_argument("--only-audio", action="store_true", help="只下载音频")
     parser.add_argument(
         "--concurrent", "-c", type=int, default=1, help="并行下载数量(1-10)，默认为1"
@@ -801,37 +4140,418 @@ def parse_arguments():
         default=3,
         help="单个视频的并行片段下载数量(1-10)，默认为3",
     )
+    parser.add_argument(
+        "--memory-budget",
+        type=parse_memory_budget,
+        metavar="SIZE",
+        help="所有下载共享的缓冲区内存上限(如 256M)，每个并行片段占用 1MB，"
+        "超出时减少并行片段数或等待其他传输完成，默认不限",
+    )
+    parser.add_argument(
+        "--processes",
+        "-p",
+        type=int,
+        default=1,
+        help="播放列表下载使用的工作进程数量(不超过并行下载数量和CPU核心数)，默认为1",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="增量同步：只下载播放列表或频道中新增和之前未下载成功的视频，"
+        "不再询问确认，状态保存在输出目录的 .sync 中",
+    )
+    parser.add_argument(
+        "--schedule",
+        choices=list(SCHEDULE_POLICIES),
+        default="playlist",
+        help="播放列表的下载顺序: playlist(播放列表顺序)、shortest(短视频优先)、"
+        "longest(长视频优先，缩短总耗时)，默认为playlist",
+    )
+    parser.add_argument(
+        "--queue",
+        help="协同下载使用的共享队列文件(SQLite)，放在各主机都能访问的共享目录中，"
+        "多台主机指定同一文件和播放列表时分担下载",
+    )
+    parser.add_argument(
+        "--lane",
+        choices=list(LANES),
+        help="任务在共享队列中的优先级通道: interactive、normal、bulk，"
+        "播放列表默认为normal，单个视频默认为interactive；"
+        "同一队列文件中有更高优先级的任务下载时，低优先级的传输暂停",
+    )
+    parser.add_argument(
+        "--lease-time",
+        type=float,
+        default=60.0,
+        help="协同下载时每个条目的租约时长(秒)，工作者失联超过该时间后条目重新分配，默认为60",
+    )
+    parser.add_argument(
+        "--extract-rate",
+        type=float,
+        default=0.5,
+        help="信息提取请求的速率上限(次/秒)，被限流时自动降低后逐步恢复，默认为0.5",
+    )
+    parser.add_argument(
+        "--transfer-rate",
+        type=float,
+        default=2.0,
+        help="媒体传输请求的速率上限(次/秒)，默认为2",
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=30.0,
+        help="传输速度持续低于阈值多少秒后判定为停滞并重启，默认为30",
+    )
+    parser.add_argument(
+        "--stall-speed",
+        type=float,
+        default=10.0,
+        help="停滞判定的速度阈值(KB/s)，默认为10",
+    )
+    parser.add_argument(
+        "--stall-retries",
+        type=int,
+        default=3,
+        help="单个传输停滞后的最大重启次数，默认为3",
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="最终文件的保存目录，默认为当前目录下的 downloads",
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        help="临时流文件和合并过程使用的目录(可使用本地高速磁盘或tmpfs)，默认与输出目录相同",
+    )
+    parser.add_argument(
+        "--window",
+        dest="windows",
+        action="append",
+        type=parse_time_window,
+        metavar="HH:MM-HH:MM,N[,RATE]",
+        help="时间窗口内的并行下载数和总带宽(如 5M、500K，省略为不限速)，可重复指定，"
+        "如 --window 09:00-18:00,2,5M --window 18:00-09:00,10；"
+        "窗口切换时超出并行数的传输暂停，之后从原位置继续",
+    )
+    parser.add_argument(
+        "--section",
+        dest="sections",
+        action="append",
+        type=parse_section,
+        metavar="START-END",
+        help="只下载视频中的一个时间段(如 1:00:00-1:05:30)，可重复指定，"
+        "每个时间段保存为一个文件，按需读取数据并精确裁剪",
+    )
+    parser.add_argument(
+        "--transcode-segments",
+        type=int,
+        default=1,
+        help="仅音频模式下将长音频分段并行转码为MP3的段数，0为按CPU核心数，默认为1(不分段)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="只估算下载所需的空间和时间，以JSON格式输出，不实际下载",
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        help="估算时使用的总带宽(MB/s)，不提供时实测单个传输的速度",
+    )
+    parser.add_argument("--plan-output", help="估算结果的保存文件，默认输出到标准输出")
+    parser.add_argument(
+        "--ffmpeg-cache",
+        help="自动安装 FFmpeg 时使用的缓存目录(可放在多台机器共享的目录中)，"
+        "默认为用户目录下的缓存",
+    )
+    parser.add_argument(
+        "--verify",
+        nargs="?",
+        const="",
+        metavar="DIR",
+        help="按完整性清单校验已下载文件的大小和SHA-256，不下载，默认校验输出目录",
+    )
     return parser.parse_args()
 
 
+class PlaylistEntry(Mapping):
+    """播放列表条目的紧凑表示，只保留下载需要的字段
+
+    yt-dlp 的扁平条目带有缩略图列表等大量字段，大型频道有上万个条目时
+    占用可观的内存。条目可以像只读字典一样使用（entry.get("id")），
+    值为 None 的字段视为不存在。filesize 为元数据中的文件大小（或近似大小），
+    供下载顺序调度使用，多数站点的扁平条目没有该字段。
+    """
+
+    __slots__ = ("id", "url", "title", "playlist_index", "duration", "filesize")
+
+    def __init__(
+        self,
+        id: Optional[str],
+        url: Optional[str] = None,
+        title: Optional[str] = None,
+        playlist_index: Optional[int] = None,
+        duration: Optional[float] = None,
+        filesize: Optional[int] = None,
+    ) -> None:
+        self.id = id
+        self.url = url
+        self.title = title
+        self.playlist_index = playlist_index
+        self.duration = duration
+        self.filesize = filesize
+
+    @classmethod
+    def from_info(
+        cls, info: Mapping, playlist_index: Optional[int] = None
+    ) -> "PlaylistEntry":
+        """从 yt-dlp 的扁平条目或序列化的条目创建，地址为标准观看地址时不保存"""
+        if isinstance(info, cls):
+            return info
+        video_id = info.get("id")
+        url = info.get("url")
+        if url == f"https://www.youtube.com/watch?v={video_id}":
+            url = None
+        return cls(
+            video_id,
+            url,
+            info.get("title"),
+            info.get("playlist_index") or playlist_index,
+            info.get("duration"),
+            info.get("filesize") or info.get("filesize_approx"),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (key for key in self.__slots__ if getattr(self, key) is not None)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"PlaylistEntry({dict(self)!r})"
+
+
+def extract_lazy_playlist(ydl: "yt_dlp.YoutubeDL", url: str) -> Dict[str, Any]:
+    """提取播放列表但不处理结果，entries 为按页请求的生成器"""
+    info_dict = ydl.extract_info(url, download=False, process=False)
+    # 提取器可能先返回指向实际列表的链接（如频道首页）
+    for _ in range(3):
+        if info_dict.get("_type") not in ("url", "url_transparent"):
+            break
+        info_dict = ydl.extract_info(info_dict["url"], download=False, process=False)
+    if isinstance(info_dict.get("entries"), yt_dlp.utils.PagedList):
+        info_dict["entries"] = iter(info_dict["entries"].getslice())
+    return info_dict
+
+
+def list_playlist_entries(
+    url: str,
+    proxy: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Tuple[bool, Optional[str], Optional[List[PlaylistEntry]]]:
+    """逐页列出播放列表，每个条目取到后立即转为紧凑表示"""
+    with YDL_POOL.session(proxy, extract_flat=True) as ydl:
+        info_dict = extract_lazy_playlist(ydl, url)
+        if "entries" not in info_dict:
+            return False, None, None
+        entries = []
+        for position, entry in enumerate(info_dict["entries"] or [], 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("获取播放列表已取消")
+            if entry:
+                entries.append(PlaylistEntry.from_info(entry, position))
+    return True, info_dict.get("title") or "playlist", entries
+
+
 async def get_playlist_info(
     url: str, proxy: Optional[str] = None
-) -> Tuple[bool, Optional[str], Optional[List[Dict[str, Any]]]]:
+) -> Tuple[bool, Optional[str], Optional[List[PlaylistEntry]]]:
     """获取播放列表信息"""
-    ydl_opts = {
-        "extract_flat": True,  # 不下载视频，只获取基本信息
-        "proxy": proxy,
-    }
-
     try:
-        loop = asyncio.get_event_loop()
-        async with asyncio.Lock():
-            info_dict = await loop.run_in_executor(
-                None,
-                lambda: yt_dlp.YoutubeDL(ydl_opts).extract_info(url, download=False),
+        async with RESOURCES.slot("extraction"), REQUEST_PACER.request("extraction"):
+            return await run_cancellable(
+                lambda cancel_event: list_playlist_entries(url, proxy, cancel_event)
+            )
+    except Exception as e:
+        print(f"获取播放列表信息失败: {str(e)}")
+        return False, None, None
+
+
+# 增量同步状态的保存目录（位于输出目录下）
+SYNC_STATE_DIR = ".sync"
+# 最新视频在前的列表中，连续遇到多少个已知条目后停止枚举
+SYNC_KNOWN_STREAK = 5
+
+
+class PlaylistSyncState:
+    """播放列表或频道的增量同步状态：已知条目、最后看到的位置和上传日期"""
+
+    def __init__(self, path: Path, data: Optional[Dict[str, Any]] = None) -> None:
+        self.path = path
+        self.data = data or {}
+        # 视频ID -> 标题、位置、上传日期、是否已下载等
+        self.entries: Dict[str, Dict[str, Any]] = self.data.setdefault("entries", {})
+
+    @classmethod
+    def load(cls, key: str) -> "PlaylistSyncState":
+        """加载同步状态，不存在或损坏时从空状态开始"""
+        name = sanitize_filename(key.replace("/", "_"))
+        path = get_output_dir(SYNC_STATE_DIR) / f"{name}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        except FileNotFoundError:
+            return cls(path)
+        except (OSError, ValueError) as e:
+            print(f"同步状态文件无法读取，将重新枚举: {str(e)}")
+            return cls(path)
+
+    def is_known(self, video_id: str) -> bool:
+        """是否在之前的同步中见过该条目"""
+        return video_id in self.entries
+
+    def record(self, entry: Dict[str, Any], position: int) -> None:
+        """记录枚举到的条目及其当前位置，新条目标记为未下载"""
+        known = self.entries.setdefault(
+            entry["id"],
+            {
+                "title": entry.get("title"),
+                "url": entry.get("url"),
+                "duration": entry.get("duration"),
+                "filesize": entry.get("filesize") or entry.get("filesize_approx"),
+                "first_seen": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "downloaded": False,
+            },
+        )
+        known["position"] = position
+        timestamp = entry.get("timestamp") or entry.get("release_timestamp")
+        upload_date = entry.get("upload_date") or (
+            time.strftime("%Y%m%d", time.gmtime(timestamp)) if timestamp else None
+        )
+        if upload_date:
+            known["upload_date"] = upload_date
+
+    def pending_entries(self, numbered: bool = True) -> List[PlaylistEntry]:
+        """尚未下载成功的条目，按位置排列；numbered 为 False 时文件名不加序号"""
+        pending = sorted(
+            (
+                (video_id, known)
+                for video_id, known in self.entries.items()
+                if not known.get("downloaded")
+            ),
+            key=lambda item: item[1].get("position") or 0,
+        )
+        return [
+            PlaylistEntry(
+                video_id,
+                known.get("url"),
+                known.get("title"),
+                known.get("position") if numbered else None,
+                known.get("duration"),
+                known.get("filesize"),
             )
+            for video_id, known in pending
+        ]
+
+    def mark(self, entry: Dict[str, Any], success: bool) -> None:
+        """记录条目的下载结果，失败的条目在下次同步时重试"""
+        known = self.entries.get(entry.get("id"))
+        if known is not None and success:
+            known["downloaded"] = True
+            known["downloaded_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    def save(self) -> None:
+        """原子化保存同步状态"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = TempFileManager.part_path(self.path)
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(part_path, self.path)
+
+
+def is_newest_first(url: str) -> bool:
+    """列表是否按上传时间从新到旧排列：频道和频道上传列表(UU)是，普通播放列表不一定"""
+    playlist_id = extract_playlist_id(url) or ""
+    return extract_channel_path(url) is not None or playlist_id.startswith("UU")
 
-            # 检查是否是播放列表
-            if "entries" in info_dict:
-                playlist_title = info_dict.get("title", "playlist")
-                entries = info_dict["entries"]
-                return True, playlist_title, entries
+
+def enumerate_new_entries(
+    url: str,
+    state: PlaylistSyncState,
+    proxy: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Tuple[bool, Optional[str], int]:
+    """逐页枚举播放列表并记录到同步状态，返回 (是否为播放列表, 标题, 枚举的条目数)
+
+    最新视频在前的列表遇到连续多个已知条目即停止，不再请求后面的分页；
+    其他播放列表的新条目可能追加在末尾，需要完整枚举。
+    """
+    newest_first = is_newest_first(url)
+    with YDL_POOL.session(
+        proxy,
+        extract_flat=True,
+        # 频道视频列表只提供“3天前”这类时间，按其估算上传日期
+        extractor_args={"youtubetab": {"approximate_date": [""]}},
+    ) as ydl:
+        info_dict = extract_lazy_playlist(ydl, url)
+        if "entries" not in info_dict:
+            return False, None, 0
+
+        known_streak = 0
+        position = 0
+        for position, entry in enumerate(info_dict["entries"] or [], 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("枚举已取消")
+            if not entry or not entry.get("id"):
+                continue
+            if entry.get("live_status") in ("is_live", "is_upcoming"):
+                continue  # 直播尚未结束，下次同步时再处理
+            if state.is_known(entry["id"]):
+                known_streak += 1
             else:
-                return False, None, None
+                known_streak = 0
+            state.record(entry, position)
+            if newest_first and known_streak >= SYNC_KNOWN_STREAK:
+                break
+
+    state.data.update(
+        url=url,
+        title=info_dict.get("title"),
+        newest_first=newest_first,
+        last_position=position,
+        synced_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+    )
+    return True, info_dict.get("title") or "playlist", position
+
+
+async def get_new_playlist_entries(
+    url: str, state: PlaylistSyncState, proxy: Optional[str] = None
+) -> Tuple[bool, Optional[str], Optional[List[PlaylistEntry]]]:
+    """增量获取播放列表中尚未下载的条目"""
+    try:
+        async with RESOURCES.slot("extraction"), REQUEST_PACER.request("extraction"):
+            is_playlist, playlist_title, enumerated = await run_cancellable(
+                lambda cancel_event: enumerate_new_entries(
+                    url, state, proxy, cancel_event
+                )
+            )
     except Exception as e:
         print(f"获取播放列表信息失败: {str(e)}")
         return False, None, None
 
+    if not is_playlist:
+        return False, None, None
+    # 位置随新视频发布而变化的列表，文件名不加序号
+    entries = state.pending_entries(numbered=not is_newest_first(url))
+    print(f"已枚举 {enumerated} 个条目，需要下载 {len(entries)} 个")
+    return True, playlist_title, entries
+
 
 async def download_single_video_async(
     video_info: Dict[str, Any],
@@ -859,43 +4579,96 @@ async def download_single_video_async(
     # 显示正在下载的视频信息
     print(f"\n开始下载: {prefix}{video_title}")
 
-    try:
-        # 获取视频格式
-        available_formats, info_dict = await get_available_formats(video_url, proxy)
+    async def attempt(proxy: Optional[str]) -> bool:
+        nonlocal video_title
+        try:
+            # 获取视频格式
+            available_formats, info_dict = await get_available_formats(video_url, proxy)
+
+            # 获取最佳视频和音频格式，下载期间只保留选中格式的必要字段
+            # （按时间段下载时由 ffmpeg 直接读取媒体地址）
+            keys = FORMAT_KEEP_KEYS + (FORMAT_STREAM_KEYS if SECTIONS else ())
+            best_video, best_audio = (
+                prune_format(fmt, keys)
+                for fmt in select_best_formats(available_formats)
+            )
+            extracted_title = info_dict.get("title")
+            duration = info_dict.get("duration")
+            del available_formats, info_dict
 
-        # 获取最佳视频和音频格式
-        best_video, best_audio = select_best_formats(available_formats)
+            if not best_audio:
+                print(f"无法获取音频格式: {video_title}")
+                return False
 
-        if not best_audio:
-            print(f"无法获取音频格式: {video_title}")
-            return False
+            if not only_audio and not best_video:
+                print(f"无法获取视频格式: {video_title}")
+                return False
 
-        if not only_audio and not best_video:
-            print(f"无法获取视频格式: {video_title}")
-            return False
+            # 扁平条目中没有标题时使用提取到的标题
+            if not video_info.get("title") and extracted_title:
+                video_title = extracted_title
 
-        # 下载视频
-        download_success, output_file = await download_with_progress(
-            video_url,
-            best_video,
-            best_audio,
-            f"{prefix}{video_title}",
-            proxy,
-            only_audio,
-            output_dir,
-            concurrent_fragments,
-        )
+            # 下载视频
+            download_success, output_file = await download_with_progress(
+                video_url,
+                best_video,
+                best_audio,
+                f"{prefix}{video_title}",
+                proxy,
+                only_audio,
+                output_dir,
+                concurrent_fragments,
+                duration,
+            )
 
-        if download_success:
-            print(f"\n视频下载完成: {prefix}{video_title}")
-            return True
-        else:
-            print(f"\n视频下载失败: {prefix}{video_title}")
+            if download_success:
+                print(f"\n视频下载完成: {prefix}{video_title}")
+                return True
+            else:
+                print(f"\n视频下载失败: {prefix}{video_title}")
+                return False
+
+        except Exception as e:
+            print(f"\n下载视频时出错 ({prefix}{video_title}): {str(e)}")
+            PROXY_POOL.report_error(proxy, e)
             return False
 
-    except Exception as e:
-        print(f"\n下载视频时出错 ({prefix}{video_title}): {str(e)}")
-        return False
+    # 使用代理池时信息提取和下载固定使用同一个代理，代理出错时切换
+    return await run_with_proxy(video_info.get("id") or video_url, proxy, attempt)
+
+
+async def resume_orphans(
+    orphans: List[Tuple[Path, str]],
+    scratch_root: Path,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    concurrent_fragments: int = 3,
+) -> None:
+    """续传或删除上次中断遗留的临时流文件"""
+    print(f"\n发现 {len(orphans)} 个未完成的下载:")
+    for directory, video_id in orphans:
+        print(f"- {directory.relative_to(scratch_root) / video_id}")
+
+    while True:
+        choice = input("是否继续这些下载? (y/n): ").strip().lower()
+        if choice == "y":
+            for directory, video_id in orphans:
+                output_dir = str(directory.relative_to(scratch_root))
+                await download_single_video_async(
+                    {"id": video_id},
+                    "" if output_dir == "." else output_dir,
+                    proxy,
+                    only_audio,
+                    concurrent_fragments,
+                )
+            return
+        elif choice == "n":
+            for directory, video_id in orphans:
+                remove_temp_streams(directory, video_id)
+            print("已删除未完成下载的临时文件")
+            return
+        else:
+            print("请输入 y 或 n")
 
 
 async def download_playlist_async(
@@ -904,120 +4677,1412 @@ async def download_playlist_async(
     only_audio: bool = False,
     concurrent_downloads: int = 3,
     concurrent_fragments: int = 3,
+    processes: int = 1,
+    queue_path: Optional[str] = None,
+    lease_time: float = 60.0,
+    schedule: str = "playlist",
+    sync: bool = False,
+    lane: str = "normal",
 ) -> bool:
-    """异步下载播放列表"""
+    """异步下载播放列表，指定队列文件时与其他主机协同下载
+
+    sync 为 True 时只下载之前同步中没有下载成功的条目。条目加入 lane 通道，
+    同一队列文件中有更高优先级通道的任务下载时，本播放列表的传输暂停。
+    """
     # 首先检查播放列表类型，不支持RD类型
     playlist_id = extract_playlist_id(url)
     if playlist_id and playlist_id.startswith("RD"):
         print("\n错误: 不支持下载YouTube混合播放列表(RD类型)")
         print("请使用标准YouTube播放列表(PL类型)或单个视频URL")
         return False
-    
-    # 获取播放列表信息
-    is_playlist, playlist_title, entries = await get_playlist_info(url, proxy)
+
+    # 获取播放列表信息，使用代理池时从池中借用一个代理
+    list_proxy = PROXY_POOL.acquire(url) if PROXY_POOL.enabled else proxy
+    sync_state = None
+    try:
+        if sync:
+            sync_state = PlaylistSyncState.load(
+                playlist_id or extract_channel_path(url)
+            )
+            is_playlist, playlist_title, entries = await get_new_playlist_entries(
+                url, sync_state, list_proxy
+            )
+        else:
+            is_playlist, playlist_title, entries = await get_playlist_info(
+                url, list_proxy
+            )
+    finally:
+        if PROXY_POOL.enabled:
+            PROXY_POOL.release(url)
+
+    if sync_state is not None and is_playlist:
+        sync_state.save()
+        if not entries:
+            print(f"\n{playlist_title}: 没有需要下载的新视频")
+            return True
 
     if not is_playlist or not entries:
         print("无法获取播放列表信息或URL不是播放列表")
         return False
-    
+
     # 创建下载目录
     safe_playlist_title = sanitize_filename(playlist_title)
-    download_dir = Path.cwd() / "downloads" / safe_playlist_title
+    download_dir = get_output_dir(safe_playlist_title)
     download_dir.mkdir(exist_ok=True, parents=True)
 
     print(f"\n开始下载播放列表: {playlist_title}")
     print(f"共 {len(entries)} 个视频，设置并行下载数量: {concurrent_downloads}")
 
+    # 预检磁盘空间，空间不足时只下载能容纳的条目
+    fit_count = DISK_SPACE.fit_entries(
+        entries, safe_playlist_title, only_audio, concurrent_downloads
+    )
+    if queue_path:
+        # 协同下载时由各主机分担，下载前逐个预留空间
+        if fit_count < len(entries):
+            print("本机磁盘空间可能不足以容纳整个播放列表")
+    elif fit_count == 0:
+        print("磁盘空间不足，无法下载该播放列表")
+        return False
+    elif fit_count < len(entries):
+        print(
+            f"磁盘空间预计不足，只下载前 {fit_count} 个视频"
+            f"(跳过 {len(entries) - fit_count} 个)"
+        )
+        entries = entries[:fit_count]
+
     # 限制最大并发数
     effective_concurrent = min(concurrent_downloads, len(entries))
 
-    # 使用线程池执行器运行异步任务
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=effective_concurrent
-    ) as executor:
-        # 使用队列管理下载任务
-        download_queue = asyncio.Queue()
-
-        # 添加所有视频到队列
-        for entry in entries:
-            await download_queue.put(entry)
-
-        # 创建并发任务
-        tasks = []
-        for i in range(effective_concurrent):
-            task = asyncio.create_task(
-                worker(
-                    i,
-                    download_queue,
-                    safe_playlist_title,
-                    proxy,
-                    only_audio,
-                    concurrent_fragments,
-                )
-            )
-            tasks.append(task)
+    # 按调度策略排列下载顺序，文件名中的序号不受影响
+    entries = schedule_entries(entries, schedule)
+    if schedule != "playlist":
+        print(f"下载顺序: {SCHEDULE_POLICIES[schedule]}")
 
-        # 等待所有任务完成
-        results = await asyncio.gather(*tasks)
+    # 各主机枚举的条目合并到同一队列（已存在的条目不重复加入）
+    queue_name = playlist_id or url
+    loop = asyncio.get_running_loop()
+    work_queue = await loop.run_in_executor(
+        None, open_work_queue, queue_path, queue_name, entries, lease_time, lane
+    )
+    if queue_path:
+        print(f"使用共享队列协同下载: {queue_path}（{lane} 通道）")
 
-        # 计算成功下载数量
-        success_count = sum(r for r in results)
+    # 同步模式下记录每个条目的下载结果
+    on_result = sync_state.mark if sync_state is not None else None
+
+    try:
+        # 多进程模式下进程数不超过并行下载数和CPU核心数
+        processes = min(processes, effective_concurrent, os.cpu_count() or 1)
+        if processes > 1:
+            print(f"使用 {processes} 个工作进程并行下载")
+            success_count = await download_playlist_processes(
+                entries,
+                safe_playlist_title,
+                proxy,
+                only_audio,
+                effective_concurrent,
+                concurrent_fragments,
+                processes,
+                (queue_path, queue_name, lease_time) if queue_path else None,
+                on_result,
+                lane,
+            )
+        else:
+            success_count = await run_playlist_workers(
+                work_queue,
+                safe_playlist_title,
+                proxy,
+                only_audio,
+                effective_concurrent,
+                concurrent_fragments,
+                on_result=on_result,
+            )
+        counts = await loop.run_in_executor(None, work_queue.counts)
+    finally:
+        work_queue.close()
+        if sync_state is not None:
+            sync_state.save()
 
     print(f"\n播放列表下载完成: {playlist_title}")
-    print(f"下载[成功/总数]: {success_count}/{len(entries)}")
-    print(f"文件保存在: downloads/{safe_playlist_title}/")
+    if queue_path:
+        print(f"本机下载成功: {success_count}")
+        print(
+            f"队列状态: 完成 {counts['done']}，失败 {counts['failed']}，"
+            f"进行中 {counts['leased']}，待下载 {counts['pending']}"
+        )
+    else:
+        print(f"下载[成功/总数]: {success_count}/{len(entries)}")
+    print(f"文件保存在: {download_dir}")
+    report_pacer_stats()
+    report_window_stats()
+    report_lane_stats()
+    report_memory_stats()
+    if PROXY_POOL.enabled:
+        report_proxy_stats()
+
+    return success_count > 0
 
+
+async def download_video_queued(
+    url: str,
+    queue_path: str,
+    lease_time: float = 60.0,
+    lane: str = "interactive",
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    concurrent_fragments: int = 3,
+) -> bool:
+    """把单个视频加入共享队列的指定通道并立即下载
+
+    租约记录在队列文件中，使用同一队列文件的其他进程和主机据此暂停
+    低优先级通道的传输，直到本视频下载完成。
+    """
+    video_id = extract_video_id(url)
+    loop = asyncio.get_running_loop()
+    work_queue = await loop.run_in_executor(
+        None,
+        open_work_queue,
+        queue_path,
+        f"video-{video_id}",
+        [{"id": video_id, "url": url}],
+        lease_time,
+        lane,
+    )
+    print(f"\n使用共享队列下载: {queue_path}（{lane} 通道）")
+    try:
+        success_count = await run_playlist_workers(
+            work_queue, "", proxy, only_audio, 1, concurrent_fragments
+        )
+    finally:
+        work_queue.close()
+    report_lane_stats()
     return success_count > 0
 
 
+# 下载顺序的调度策略
+SCHEDULE_POLICIES = {
+    "playlist": "播放列表顺序",
+    "shortest": "短视频优先",
+    "longest": "长视频优先",
+}
+
+
+def estimate_entry_size(entry: Dict[str, Any], default_duration: float) -> float:
+    """估算条目的下载量：优先使用元数据中的文件大小，否则按时长估算"""
+    size = entry.get("filesize") or entry.get("filesize_approx")
+    if size:
+        return size
+    return (entry.get("duration") or default_duration) * ASSUMED_BYTES_PER_SECOND
+
+
+def schedule_entries(
+    entries: List[Dict[str, Any]], policy: str = "playlist"
+) -> List[Dict[str, Any]]:
+    """按调度策略排列条目
+
+    playlist 保持原顺序；shortest 先下载小的条目，尽早得到更多完成的文件；
+    longest 先下载大的条目(LPT)，避免大文件最后单独占用一个下载槽，缩短总耗时。
+    """
+    if policy == "playlist":
+        return list(entries)
+    durations = [e.get("duration") for e in entries if e.get("duration")]
+    default_duration = (
+        sum(durations) / len(durations) if durations else ASSUMED_DURATION
+    )
+    return sorted(
+        entries,
+        key=lambda entry: estimate_entry_size(entry, default_duration),
+        reverse=policy == "longest",
+    )
+
+
+# 租约过期后条目可被重新分配的最多次数，超过后记为失败
+LEASE_MAX_ATTEMPTS = 3
+# 队列暂时为空但仍有其他工作者持有租约时，重新查询的间隔（秒）
+LEASE_POLL_INTERVAL = 5.0
+# 优先级通道（从高到低）：交互式单视频、普通、批量
+LANES = ("interactive", "normal", "bulk")
+# 按通道优先级排序的 SQL 表达式
+LANE_ORDER_SQL = (
+    "CASE lane "
+    + " ".join(f"WHEN '{lane}' THEN {rank}" for rank, lane in enumerate(LANES))
+    + f" ELSE {len(LANES)} END"
+)
+
+
+def work_item_key(entry: Dict[str, Any]) -> str:
+    """条目在队列中的键：播放列表序号和视频ID，各主机枚举同一播放列表时一致"""
+    video_id = entry.get("id") or entry.get("url") or ""
+    index = entry.get("playlist_index")
+    return f"{index}-{video_id}" if index else video_id
+
+
+class WorkQueue(abc.ABC):
+    """下载队列后端接口：条目以租约方式分配给工作者，结果集中记录
+
+    工作者在租约期内定期续租；租约过期（工作者退出或失联）的条目会重新分配。
+    后端缺少任何抽象方法时在创建时即报错。
+    """
+
+    lease_time = 60.0  # 租约时长（秒）
+
+    @abc.abstractmethod
+    def add(self, entries: List[Dict[str, Any]], lane: str = "normal") -> int:
+        """把条目加入指定通道（已存在的条目保持不变），返回新加入的数量"""
+
+    @abc.abstractmethod
+    def lease(
+        self, owner: str
+    ) -> Optional[Tuple[str, Dict[str, Any], str, Optional[float]]]:
+        """按通道优先级租用下一个待下载条目，返回 (键, 条目, 通道, 入队时间)，
+        没有可用条目时返回 None"""
+
+    @abc.abstractmethod
+    def renew(self, key: str, owner: str) -> bool:
+        """续租，租约已过期并被他人接管时返回 False"""
+
+    @abc.abstractmethod
+    def release(self, key: str, owner: str) -> None:
+        """放弃租约，条目重新变为待下载"""
+
+    @abc.abstractmethod
+    def complete(
+        self, key: str, owner: str, success: bool, error: Optional[str] = None
+    ) -> bool:
+        """记录下载结果，租约已被他人接管时不记录并返回 False"""
+
+    def outstanding(self) -> bool:
+        """是否还有被他人租用、可能过期后重新分配的条目"""
+        return False
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """各状态(pending/leased/done/failed)的条目数"""
+
+    def active_lanes(self) -> set:
+        """有条目正在下载的通道，共享队列中包括其他进程和主机的条目"""
+        return set()
+
+    def close(self) -> None:
+        """关闭后端连接"""
+
+
+class MemoryWorkQueue(WorkQueue):
+    """进程内队列，单机下载时使用，租约不会过期"""
+
+    def __init__(
+        self, entries: Optional[List[Dict[str, Any]]] = None, lane: str = "normal"
+    ) -> None:
+        self._lock = threading.Lock()
+        # 各通道的待下载条目 (键, 条目, 入队时间)
+        self._pending: Dict[str, deque] = {name: deque() for name in LANES}
+        self._leased: Dict[str, Tuple[Dict[str, Any], str, float]] = {}
+        self._done: Dict[str, bool] = {}
+        self._sequence = 0
+        if entries:
+            self.add(entries, lane)
+
+    def add(self, entries: List[Dict[str, Any]], lane: str = "normal") -> int:
+        now = time.time()
+        with self._lock:
+            for entry in entries:
+                # 进程内允许重复条目，由请求合并共享下载
+                self._sequence += 1
+                self._pending[lane].append(
+                    (f"{self._sequence}:{work_item_key(entry)}", entry, now)
+                )
+            return len(entries)
+
+    def lease(
+        self, owner: str
+    ) -> Optional[Tuple[str, Dict[str, Any], str, Optional[float]]]:
+        with self._lock:
+            for lane in LANES:
+                if self._pending[lane]:
+                    key, entry, queued_at = self._pending[lane].popleft()
+                    self._leased[key] = (entry, lane, queued_at)
+                    return key, entry, lane, queued_at
+            return None
+
+    def renew(self, key: str, owner: str) -> bool:
+        with self._lock:
+            return key in self._leased
+
+    def release(self, key: str, owner: str) -> None:
+        with self._lock:
+            leased = self._leased.pop(key, None)
+            if leased is not None:
+                entry, lane, queued_at = leased
+                self._pending[lane].appendleft((key, entry, queued_at))
+
+    def complete(
+        self, key: str, owner: str, success: bool, error: Optional[str] = None
+    ) -> bool:
+        with self._lock:
+            if self._leased.pop(key, None) is None:
+                return False
+            self._done[key] = success
+            return True
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            succeeded = sum(1 for success in self._done.values() if success)
+            return {
+                "pending": sum(len(pending) for pending in self._pending.values()),
+                "leased": len(self._leased),
+                "done": succeeded,
+                "failed": len(self._done) - succeeded,
+            }
+
+    def active_lanes(self) -> set:
+        with self._lock:
+            return {lane for _, lane, _ in self._leased.values()}
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """基于 SQLite 文件的共享队列，文件放在共享目录中即可供多台主机协同下载
+
+    使用默认的回滚日志模式（WAL 不支持网络文件系统），租约过期时间按各主机的
+    系统时间计算，各主机的时钟需要同步。时钟可以替换，以便用模拟时间测试。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        name: str,
+        lease_time: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = Path(path)
+        self.name = name
+        self.lease_time = lease_time
+        self.clock = clock
+        self._lock = threading.Lock()
+        # 手动管理事务；锁等待时间较长，多台主机同时访问时排队
+        self._connection = sqlite3.connect(
+            str(self.path), timeout=60, isolation_level=None, check_same_thread=False
+        )
+        with self._transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    queue TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    entry TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    owner TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated REAL,
+                    lane TEXT NOT NULL DEFAULT 'normal',
+                    queued_at REAL,
+                    PRIMARY KEY (queue, key)
+                )
+                """)
+            # 旧版本创建的队列文件没有通道列
+            columns = {
+                row[1] for row in cursor.execute("PRAGMA table_info(work_items)")
+            }
+            if "lane" not in columns:
+                cursor.execute(
+                    "ALTER TABLE work_items ADD COLUMN lane TEXT NOT NULL DEFAULT 'normal'"
+                )
+            if "queued_at" not in columns:
+                cursor.execute("ALTER TABLE work_items ADD COLUMN queued_at REAL")
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """在写事务中执行，进入时即获取数据库写锁，避免多个主机租到同一条目"""
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            else:
+                cursor.execute("COMMIT")
+
+    def add(self, entries: List[Dict[str, Any]], lane: str = "normal") -> int:
+        now = self.clock()
+        with self._transaction() as cursor:
+            position = cursor.execute(
+                "SELECT COALESCE(MAX(position), -1) FROM work_items WHERE queue = ?",
+                (self.name,),
+            ).fetchone()[0]
+            added = 0
+            for entry in entries:
+                position += 1
+                cursor.execute(
+                    "INSERT OR IGNORE INTO work_items"
+                    " (queue, key, position, entry, updated, lane, queued_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.name,
+                        work_item_key(entry),
+                        position,
+                        json.dumps(dict(entry), ensure_ascii=False, default=str),
+                        now,
+                        lane,
+                        now,
+                    ),
+                )
+                added += cursor.rowcount
+            return added
+
+    def lease(
+        self, owner: str
+    ) -> Optional[Tuple[str, Dict[str, Any], str, Optional[float]]]:
+        now = self.clock()
+        with self._transaction() as cursor:
+            while True:
+                row = cursor.execute(
+                    "SELECT key, entry, attempts, lane, queued_at FROM work_items"
+                    " WHERE queue = ? AND (status = 'pending'"
+                    " OR (status = 'leased' AND lease_expires < ?))"
+                    f" ORDER BY {LANE_ORDER_SQL}, position LIMIT 1",
+                    (self.name, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                key, entry, attempts, lane, queued_at = row
+                if attempts >= LEASE_MAX_ATTEMPTS:
+                    # 多次租约过期，可能每次都导致工作者崩溃
+                    cursor.execute(
+                        "UPDATE work_items SET status = 'failed', owner = NULL,"
+                        " lease_expires = NULL, error = ?, updated = ?"
+                        " WHERE queue = ? AND key = ?",
+                        ("租约多次过期", now, self.name, key),
+                    )
+                    continue
+                cursor.execute(
+                    "UPDATE work_items SET status = 'leased', owner = ?,"
+                    " lease_expires = ?, attempts = attempts + 1, updated = ?"
+                    " WHERE queue = ? AND key = ?",
+                    (owner, now + self.lease_time, now, self.name, key),
+                )
+                return key, PlaylistEntry.from_info(json.loads(entry)), lane, queued_at
+
+    def renew(self, key: str, owner: str) -> bool:
+        now = self.clock()
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE work_items SET lease_expires = ?, updated = ?"
+                " WHERE queue = ? AND key = ? AND owner = ? AND status = 'leased'",
+                (now + self.lease_time, now, self.name, key, owner),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, key: str, owner: str) -> None:
+        with self._transaction() as cursor:
+            # 主动放弃的租约不计入尝试次数
+            cursor.execute(
+                "UPDATE work_items SET status = 'pending', owner = NULL,"
+                " lease_expires = NULL, attempts = MAX(attempts - 1, 0), updated = ?"
+                " WHERE queue = ? AND key = ? AND owner = ? AND status = 'leased'",
+                (self.clock(), self.name, key, owner),
+            )
+
+    def complete(
+        self, key: str, owner: str, success: bool, error: Optional[str] = None
+    ) -> bool:
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE work_items SET status = ?, lease_expires = NULL, error = ?,"
+                " updated = ? WHERE queue = ? AND key = ? AND owner = ?"
+                " AND status = 'leased'",
+                (
+                    "done" if success else "failed",
+                    error,
+                    self.clock(),
+                    self.name,
+                    key,
+                    owner,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def outstanding(self) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM work_items WHERE queue = ? AND status = 'leased' LIMIT 1",
+                (self.name,),
+            ).fetchone()
+            return row is not None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) FROM work_items WHERE queue = ? GROUP BY status",
+                (self.name,),
+            ).fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def active_lanes(self) -> set:
+        # 不限队列名：同一队列文件中其他播放列表和单视频任务的租约也计入
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT DISTINCT lane FROM work_items"
+                " WHERE status = 'leased' AND lease_expires >= ?",
+                (self.clock(),),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def failures(self) -> List[Tuple[str, Optional[str]]]:
+        """失败条目的 (标题, 错误信息)"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT entry, error FROM work_items WHERE queue = ? AND status = 'failed'"
+                " ORDER BY position",
+                (self.name,),
+            ).fetchall()
+        failures = []
+        for entry, error in rows:
+            entry = json.loads(entry)
+            failures.append((entry.get("title") or entry.get("id"), error))
+        return failures
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+def open_work_queue(
+    queue_path: Optional[str],
+    queue_name: str,
+    entries: List[Dict[str, Any]],
+    lease_time: float = 60.0,
+    lane: str = "normal",
+) -> WorkQueue:
+    """打开共享队列并把条目加入指定通道；未指定队列文件时使用进程内队列"""
+    if not queue_path:
+        return MemoryWorkQueue(entries, lane)
+    work_queue = SQLiteWorkQueue(queue_path, queue_name, lease_time)
+    if entries:
+        work_queue.add(entries, lane)
+    return work_queue
+
+
+# 低优先级传输暂停时重新检查、以及查询共享队列中其他任务通道的间隔（秒）
+LANE_POLL_INTERVAL = 2.0
+# 当前下载任务所在的优先级通道，由工作线程设置，传给执行下载的线程
+CURRENT_LANE: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "CURRENT_LANE", default=None
+)
+
+
+class LaneScheduler:
+    """优先级通道：有更高优先级的任务在下载时，低优先级通道的传输暂停
+
+    暂停发生在进度回调中（分片下载时即片段之间），更高优先级的任务结束后
+    从原位置继续。进程内的任务直接计数，共享队列文件中其他进程和主机的
+    任务由事件循环中的监控任务定期查询；进度回调只读取内存中的状态，
+    不会因为队列文件被锁而阻塞传输线程。各通道的排队时间、下载耗时和
+    传输字节数记入运行指标。
+    """
+
+    def __init__(self, sleep: Callable[[float], None] = time.sleep) -> None:
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = {lane: 0 for lane in LANES}
+        self._remote: set = set()  # 上次查询到的共享队列中的活动通道
+        # 进行中的传输上次报告的已下载字节数
+        self._transfers: Dict[str, Optional[int]] = {}
+
+    async def monitor(
+        self, work_queue: WorkQueue, interval: float = LANE_POLL_INTERVAL
+    ) -> None:
+        """后台定期查询队列中其他进程和主机正在下载的通道，直到任务被取消"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    remote = await loop.run_in_executor(None, work_queue.active_lanes)
+                except Exception:
+                    remote = set()  # 暂时无法访问队列时按没有其他任务处理
+                with self._lock:
+                    self._remote = remote
+                await asyncio.sleep(interval)
+        finally:
+            with self._lock:
+                self._remote = set()
+
+    @contextlib.asynccontextmanager
+    async def job(self, lane: str, queued_at: Optional[float] = None):
+        """工作线程下载一个条目期间进入，记录排队时间和下载耗时"""
+        started = time.time()
+        if queued_at is not None:
+            METRICS.increment(f"lane.{lane}.wait", max(started - queued_at, 0.0))
+        token = CURRENT_LANE.set(lane)
+        with self._lock:
+            self._running[lane] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running[lane] -= 1
+            CURRENT_LANE.reset(token)
+            METRICS.increment(f"lane.{lane}.jobs")
+            METRICS.increment(f"lane.{lane}.seconds", time.time() - started)
+
+    def active_lanes(self) -> set:
+        """有任务正在下载的通道，共享队列中的为监控任务最近一次的查询结果"""
+        with self._lock:
+            active = {lane for lane, count in self._running.items() if count}
+            return active | self._remote
+
+    def preempting(self, lane: str) -> Optional[str]:
+        """正在下载的更高优先级通道，没有时返回 None"""
+        higher = LANES[: LANES.index(lane)]
+        if not higher:
+            return None
+        active = self.active_lanes()
+        for other in higher:
+            if other in active:
+                return other
+        return None
+
+    def start(self, key: str) -> None:
+        """开始跟踪一个传输"""
+        with self._lock:
+            self._transfers[key] = None
+
+    def stop(self, key: str) -> None:
+        """停止跟踪一个传输"""
+        with self._lock:
+            self._transfers.pop(key, None)
+
+    def hook(
+        self,
+        key: str,
+        lane: str,
+        cancel_event: Optional[threading.Event],
+        d: Dict[str, Any],
+    ) -> None:
+        """yt-dlp 进度回调，统计通道的传输字节数，有更高优先级的任务时暂停"""
+        if d["status"] != "downloading":
+            return
+        downloaded = d.get("downloaded_bytes") or 0
+        with self._lock:
+            previous = self._transfers.get(key)
+            self._transfers[key] = downloaded
+        if previous is not None and downloaded > previous:
+            METRICS.increment(f"lane.{lane}.bytes", downloaded - previous)
+
+        paused = False
+        while True:
+            higher = self.preempting(lane)
+            if higher is None:
+                break
+            if not paused:
+                paused = True
+                print(f"\n{higher} 通道有下载任务，暂停 {lane} 通道的传输...")
+            if cancel_event is not None and cancel_event.is_set():
+                raise yt_dlp.utils.DownloadCancelled("下载已取消")
+            self.sleep(LANE_POLL_INTERVAL)
+            METRICS.increment(f"lane.{lane}.paused", LANE_POLL_INTERVAL)
+
+        if paused:
+            print(f"\n更高优先级的任务已结束，继续 {lane} 通道的传输")
+            # 暂停期间没有进度，重新开始停滞监控
+            STALL_WATCHDOG.start(key)
+
+
+# 全局优先级通道调度
+PRIORITY_LANES = LaneScheduler()
+
+
+def report_lane_stats() -> None:
+    """输出各通道的任务数、平均排队时间、平均耗时和吞吐量（含各工作进程）"""
+    counters = METRICS.snapshot()["counters"]
+    for lane in LANES:
+        jobs = counters.get(f"lane.{lane}.jobs", 0)
+        if not jobs:
+            continue
+        seconds = counters.get(f"lane.{lane}.seconds", 0)
+        transferred = counters.get(f"lane.{lane}.bytes", 0)
+        speed = transferred / seconds / 1024 / 1024 if seconds else 0
+        paused = counters.get(f"lane.{lane}.paused", 0)
+        print(
+            f"{lane} 通道: {jobs:.0f} 个任务，"
+            f"平均排队 {counters.get(f'lane.{lane}.wait', 0) / jobs:.1f} 秒，"
+            f"平均耗时 {seconds / jobs:.1f} 秒，传输 {transferred / 1024 / 1024:.1f}MB，"
+            f"平均 {speed:.2f}MB/s"
+            + (f"，被抢占暂停 {paused:.0f} 秒" if paused else "")
+        )
+
+
+async def hold_lease(work_queue: WorkQueue, key: str, owner: str) -> None:
+    """下载期间定期续租，租约丢失时返回"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(work_queue.lease_time / 3)
+        try:
+            renewed = await loop.run_in_executor(None, work_queue.renew, key, owner)
+        except Exception as e:
+            # 暂时无法访问队列时继续下载，租约过期后下次续租会失败
+            print(f"续租失败: {str(e)}")
+            continue
+        if not renewed:
+            return
+
+
 async def worker(
     worker_id: int,
-    queue: asyncio.Queue,
+    work_queue: WorkQueue,
     output_dir: str,
     proxy: Optional[str] = None,
     only_audio: bool = False,
     concurrent_fragments: int = 3,
+    on_result: Optional[Callable[[Dict[str, Any], bool], None]] = None,
 ) -> int:
-    """工作线程，从队列获取视频并下载"""
+    """工作线程，从队列租用视频并下载，下载期间持续续租"""
     success_count = 0
+    owner = f"{socket.gethostname()}-{os.getpid()}-{worker_id+1}"
+    loop = asyncio.get_running_loop()
 
-    while not queue.empty():
+    while True:
         try:
-            # 获取下一个要下载的视频
-            entry = await queue.get()
+            # 等待当前时间窗口有空闲的并行数，租用到条目后才占用
+            await TIME_WINDOWS.wait_for_slot()
+            # 租用下一个要下载的视频
+            leased = await loop.run_in_executor(None, work_queue.lease, owner)
+            if leased is None:
+                # 其他工作者的租约过期后条目会重新分配，等待其完成
+                if not await loop.run_in_executor(None, work_queue.outstanding):
+                    break
+                await asyncio.sleep(LEASE_POLL_INTERVAL)
+                continue
+            key, entry, lane, queued_at = leased
 
-            print(
-                f"工作线程 {worker_id+1}: 开始下载 {entry.get('title', entry.get('id', 'unknown'))}"
-            )
+            # 租用后立即开始续租，等待时间窗口期间租约也不会过期；
+            # 租约丢失时停止下载，由接管的工作者完成
+            heartbeat = asyncio.create_task(hold_lease(work_queue, key, owner))
+            download = None
+            try:
+                async with TIME_WINDOWS.job():
+                    if not heartbeat.done():
+                        print(
+                            f"工作线程 {worker_id+1}: 开始下载 {entry.get('title', entry.get('id', 'unknown'))}"
+                        )
+                        # 下载任务在通道上下文中创建，其传输按通道优先级暂停
+                        async with PRIORITY_LANES.job(lane, queued_at):
+                            download = asyncio.create_task(
+                                download_single_video_async(
+                                    entry,
+                                    output_dir,
+                                    proxy,
+                                    only_audio,
+                                    concurrent_fragments,
+                                )
+                            )
+                            await asyncio.wait(
+                                {download, heartbeat},
+                                return_when=asyncio.FIRST_COMPLETED,
+                            )
+            except asyncio.CancelledError:
+                # 任务被取消：等待下载保存部分文件后交还租约，其他工作者可立即续传
+                if download is not None:
+                    download.cancel()
+                    await asyncio.gather(download, return_exceptions=True)
+                await loop.run_in_executor(None, work_queue.release, key, owner)
+                raise
+            finally:
+                heartbeat.cancel()
+
+            if download is None or not download.done():
+                if download is not None:
+                    download.cancel()
+                    await asyncio.gather(download, return_exceptions=True)
+                print(f"工作线程 {worker_id+1}: 租约已被其他工作者接管，停止下载")
+                continue
 
-            # 下载视频
-            if await download_single_video_async(
-                entry, output_dir, proxy, only_audio, concurrent_fragments
-            ):
+            if download.cancelled():
+                # 下载被取消但工作线程本身未被取消：交还租约，条目重新分配
+                await loop.run_in_executor(None, work_queue.release, key, owner)
+                continue
+
+            success = download.result()
+            await loop.run_in_executor(None, work_queue.complete, key, owner, success)
+            if success:
                 success_count += 1
+            if on_result:
+                on_result(entry, success)
 
         except asyncio.CancelledError:
             # 任务被取消
             break
         except Exception as e:
             print(f"工作线程 {worker_id+1} 出错: {str(e)}")
-        finally:
-            # 标记任务完成
-            queue.task_done()
 
     return success_count
 
 
+async def run_playlist_workers(
+    work_queue: WorkQueue,
+    output_dir: str,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    concurrent_downloads: int = 1,
+    concurrent_fragments: int = 3,
+    worker_offset: int = 0,
+    on_result: Optional[Callable[[Dict[str, Any], bool], None]] = None,
+) -> int:
+    """在当前进程中并行消费队列中的条目，返回成功数量"""
+    # 按队列中其他进程和主机的任务通道暂停低优先级传输
+    lane_monitor = asyncio.create_task(PRIORITY_LANES.monitor(work_queue))
+    # 创建并发任务
+    tasks = []
+    for i in range(concurrent_downloads):
+        task = asyncio.create_task(
+            worker(
+                worker_offset + i,
+                work_queue,
+                output_dir,
+                proxy,
+                only_audio,
+                concurrent_fragments,
+                on_result,
+            )
+        )
+        tasks.append(task)
+
+    # 等待所有任务完成，计算成功下载数量
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        lane_monitor.cancel()
+        await asyncio.gather(lane_monitor, return_exceptions=True)
+    return sum(r for r in results)
+
+
+def concurrency_limits(concurrent_downloads: int) -> Dict[str, int]:
+    """按并行下载数量计算各资源的并发上限"""
+    return {
+        "extraction": concurrent_downloads,
+        "transfer": concurrent_downloads,
+        "ffmpeg": min(concurrent_downloads, os.cpu_count() or 1),
+        # 分段转码的子进程总数不超过核心数
+        "transcode": os.cpu_count() or 1,
+    }
+
+
+def split_limits(limits: Dict[str, int], parts: int) -> List[Dict[str, int]]:
+    """把全局并发上限分给各工作进程，各进程的上限之和等于全局上限"""
+    return [
+        {
+            name: max(limit // parts + (1 if index < limit % parts else 0), 1)
+            for name, limit in limits.items()
+        }
+        for index in range(parts)
+    ]
+
+
+def shard_entries(
+    entries: List[Dict[str, Any]], parts: int
+) -> List[List[Dict[str, Any]]]:
+    """按播放列表顺序轮流把条目分给各进程，重复的视频分到同一进程以便合并下载"""
+    shards: List[List[Dict[str, Any]]] = [[] for _ in range(parts)]
+    assigned: Dict[Any, int] = {}
+    for entry in entries:
+        key = entry.get("id") or entry.get("url")
+        if key not in assigned:
+            assigned[key] = len(assigned) % parts
+        shards[assigned[key]].append(entry)
+    return shards
+
+
+def process_settings() -> Dict[str, Any]:
+    """收集需要传给工作进程的全局设置"""
+    return {
+        "output_root": str(OUTPUT_ROOT) if OUTPUT_ROOT else None,
+        "scratch_root": str(SCRATCH_ROOT) if SCRATCH_ROOT else None,
+        "transcode_segments": TRANSCODE_SEGMENTS,
+        "sections": SECTIONS,
+        "stall_timeout": STALL_WATCHDOG.stall_timeout,
+        "stall_speed": STALL_WATCHDOG.min_speed,
+        "stall_retries": STALL_WATCHDOG.max_restarts,
+        "proxies": PROXY_POOL.proxies,
+        "proxy_latency": PROXY_POOL.latency_snapshot(),
+        "toolchain": TOOLCHAIN.snapshot(),
+    }
+
+
+def apply_process_settings(settings: Dict[str, Any]) -> None:
+    """在工作进程中应用父进程的全局设置"""
+    configure_directories(settings["output_root"], settings["scratch_root"])
+    configure_transcode_segments(settings["transcode_segments"])
+    configure_sections(settings["sections"])
+    STALL_WATCHDOG.configure(
+        stall_timeout=settings["stall_timeout"],
+        min_speed=settings["stall_speed"],
+        max_restarts=settings["stall_retries"],
+    )
+    PROXY_POOL.set_proxies(settings["proxies"], settings["proxy_latency"])
+    TOOLCHAIN.restore(settings["toolchain"])
+
+
+async def run_playlist_shard(job: Dict[str, Any], events: Any) -> None:
+    """工作进程中的下载循环，每个条目的结果通过事件队列报告给父进程"""
+    configure_resource_limits(job["limits"])
+
+    def report(entry: Dict[str, Any], success: bool) -> None:
+        summary = {key: entry.get(key) for key in ("id", "title", "playlist_index")}
+        events.put(("result", job["shard"], summary, success))
+
+    if job["queue"]:
+        work_queue: WorkQueue = SQLiteWorkQueue(*job["queue"])
+    else:
+        work_queue = MemoryWorkQueue(job["entries"], job["lane"])
+
+    # 各工作进程独立探测代理，沿用父进程首次检查的结果
+    proxy_monitor = (
+        asyncio.create_task(PROXY_POOL.monitor()) if PROXY_POOL.enabled else None
+    )
+    try:
+        await run_playlist_workers(
+            work_queue,
+            job["output_dir"],
+            job["proxy"],
+            job["only_audio"],
+            job["limits"]["transfer"],
+            job["concurrent_fragments"],
+            job["worker_offset"],
+            report,
+        )
+    finally:
+        if proxy_monitor is not None:
+            proxy_monitor.cancel()
+        work_queue.close()
+
+
+def playlist_process_main(job: Dict[str, Any], events: Any) -> None:
+    """工作进程入口：应用设置后运行下载循环，结束时报告运行指标"""
+    apply_process_settings(job["settings"])
+    DISK_SPACE.share(job["disk_lock"], job["disk_reserved"])
+    REQUEST_PACER.configure(**job["request_rates"])
+    REQUEST_PACER.share(job["pacer_state"])
+    TIME_WINDOWS.configure(*job["time_windows"])
+    MEMORY_BUDGET.configure(job["memory_budget"])
+    try:
+        asyncio.run(run_playlist_shard(job, events))
+    except KeyboardInterrupt:
+        pass  # 由父进程报告取消
+    finally:
+        events.put(("exit", job["shard"], METRICS.snapshot()))
+
+
+async def download_playlist_processes(
+    entries: List[Dict[str, Any]],
+    output_dir: str,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    concurrent_downloads: int = 2,
+    concurrent_fragments: int = 3,
+    processes: int = 2,
+    shared_queue: Optional[Tuple[str, str, float]] = None,
+    on_result: Optional[Callable[[Dict[str, Any], bool], None]] = None,
+    lane: str = "normal",
+) -> int:
+    """把条目分给多个工作进程下载，汇总进度、结果和运行指标，返回成功数量
+
+    全局并发上限按进程平分，磁盘空间预留在进程间共享。指定共享队列
+    (文件, 队列名, 租约时长) 时各进程直接从队列租用条目，不再预先分配。
+    """
+    # spawn 在各平台行为一致，也不会复制父进程中正在运行的线程
+    context = multiprocessing.get_context("spawn")
+    manager = multiprocessing.managers.SyncManager(ctx=context)
+    # 共享预留记录的管理进程不响应 Ctrl-C，保证工作进程退出时仍能释放预留
+    manager.start(signal.signal, (signal.SIGINT, signal.SIG_IGN))
+    disk_lock = manager.Lock()
+    disk_reserved = manager.dict()
+    DISK_SPACE.share(disk_lock, disk_reserved)
+    # 任一进程被限流时所有进程一起暂停
+    pacer_state = manager.dict()
+    events = context.Queue()
+
+    if shared_queue:
+        shards: List[List[Dict[str, Any]]] = [[] for _ in range(processes)]
+    else:
+        shards = shard_entries(entries, processes)
+    limits = split_limits(concurrency_limits(concurrent_downloads), processes)
+    settings = process_settings()
+    workers: Dict[int, multiprocessing.process.BaseProcess] = {}
+    worker_offset = 0
+    for shard, items in enumerate(shards):
+        job = {
+            "shard": shard,
+            "entries": items,
+            "queue": shared_queue,
+            "lane": lane,
+            "output_dir": output_dir,
+            "proxy": proxy,
+            "only_audio": only_audio,
+            "concurrent_fragments": concurrent_fragments,
+            "limits": limits[shard],
+            "worker_offset": worker_offset,
+            "settings": settings,
+            "disk_lock": disk_lock,
+            "disk_reserved": disk_reserved,
+            "request_rates": {
+                name: rate / processes for name, rate in REQUEST_PACER.rates().items()
+            },
+            "pacer_state": pacer_state,
+            # 各窗口的并行数和带宽按进程平分
+            "time_windows": TIME_WINDOWS.share(processes, shard),
+            # 内存预算按进程平分
+            "memory_budget": (
+                MEMORY_BUDGET.limit // processes if MEMORY_BUDGET.limit else None
+            ),
+        }
+        worker_offset += limits[shard]["transfer"]
+        process = context.Process(
+            target=playlist_process_main, args=(job, events), daemon=True
+        )
+        process.start()
+        workers[shard] = process
+
+    loop = asyncio.get_running_loop()
+    finished = 0
+    success_count = 0
+    failed: List[str] = []
+    try:
+        while workers:
+            try:
+                event = await loop.run_in_executor(None, events.get, True, 0.5)
+            except queue.Empty:
+                # 进程异常退出时不会发送结束事件
+                for shard, process in list(workers.items()):
+                    if process.exitcode is not None:
+                        print(f"\n工作进程 {shard + 1} 异常退出: {process.exitcode}")
+                        del workers[shard]
+                continue
+
+            if event[0] == "result":
+                _, shard, summary, success = event
+                finished += 1
+                if success:
+                    success_count += 1
+                else:
+                    failed.append(summary.get("title") or summary.get("id"))
+                if on_result:
+                    on_result(summary, success)
+                # 协同下载时总数由各主机分担，只显示本机完成的数量
+                total = "" if shared_queue else f"/{len(entries)}"
+                print(
+                    f"\n播放列表进度: {finished}{total}，"
+                    f"成功 {success_count}，失败 {len(failed)}"
+                )
+            elif event[0] == "exit":
+                _, shard, snapshot = event
+                METRICS.merge(snapshot)
+                workers.pop(shard).join()
+    finally:
+        # 取消时等待工作进程保存部分文件后退出，超时则强制结束
+        deadline = time.monotonic() + CANCEL_GRACE_PERIOD
+        for process in workers.values():
+            await loop.run_in_executor(
+                None, process.join, max(deadline - time.monotonic(), 0)
+            )
+            if process.is_alive():
+                process.terminate()
+        manager.shutdown()
+        DISK_SPACE.share(threading.Lock(), {})
+
+    if failed:
+        print("\n下载失败的视频:")
+        for title in failed:
+            print(f"- {title}")
+    return success_count
+
+
+# 无法实测带宽时假定的单个传输速度（字节/秒）
+ASSUMED_TRANSFER_SPEED = 2 * 1024 * 1024
+
+
+async def measure_bandwidth(
+    fmt: Optional[Dict[str, Any]], proxy: Optional[str] = None, seconds: float = 3.0
+) -> Optional[float]:
+    """下载一小段媒体数据，测量单个传输的速度（字节/秒）"""
+    if not fmt or not fmt.get("url") or fmt.get("protocol") not in ("http", "https"):
+        return None
+
+    def probe() -> Optional[float]:
+        proxies = {"http": proxy, "https": proxy} if proxy else None
+        with requests.get(
+            fmt["url"],
+            headers=fmt.get("http_headers") or {},
+            proxies=proxies,
+            stream=True,
+            timeout=(10, 10),
+        ) as response:
+            response.raise_for_status()
+            start = time.monotonic()
+            received = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                received += len(chunk)
+                if time.monotonic() - start >= seconds:
+                    break
+            elapsed = time.monotonic() - start
+            return received / elapsed if elapsed > 0 and received else None
+
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, probe)
+    except Exception:
+        return None
+
+
+def estimate_makespan(sizes: List[int], slots: int, slot_speed: float) -> float:
+    """按队列顺序把任务分配给最先空闲的下载槽，估算全部完成所需的秒数"""
+    finish_times = [0.0] * max(slots, 1)
+    for size in sizes:
+        start = heapq.heappop(finish_times)
+        heapq.heappush(finish_times, start + size / slot_speed)
+    return max(finish_times)
+
+
+def _covered_bytes(
+    output_file: Path,
+    scratch_dir: Path,
+    video_id: str,
+    formats: List[Optional[Dict[str, Any]]],
+    expected_bytes: int,
+) -> int:
+    """已有下载覆盖的字节数：输出文件已存在时为全部，否则统计临时流文件"""
+    if output_file.exists():
+        return expected_bytes
+    covered = 0
+    for fmt in formats:
+        if not fmt:
+            continue
+        stream = scratch_dir / f"{video_id}_{fmt['format_id']}.{fmt.get('ext')}"
+        for candidate in (stream, TempFileManager.part_path(stream)):
+            if candidate.exists():
+                covered += candidate.stat().st_size
+                break
+    return min(covered, expected_bytes)
+
+
+def _describe_format(
+    fmt: Optional[Dict[str, Any]], duration: Optional[float]
+) -> Optional[Dict[str, Any]]:
+    """提取格式的关键信息用于输出"""
+    if not fmt:
+        return None
+    return {
+        "format_id": fmt.get("format_id"),
+        "ext": fmt.get("ext"),
+        "vcodec": fmt.get("vcodec"),
+        "acodec": fmt.get("acodec"),
+        "width": fmt.get("width"),
+        "height": fmt.get("height"),
+        "tbr": fmt.get("tbr"),
+        "bytes": estimate_format_size(fmt, duration),
+    }
+
+
+async def build_download_plan(
+    url: str,
+    is_playlist_url: bool,
+    proxy: Optional[str] = None,
+    only_audio: bool = False,
+    concurrent_downloads: int = 1,
+    bandwidth: Optional[float] = None,
+    schedule: str = "playlist",
+) -> Dict[str, Any]:
+    """估算下载所需的字节数和时间，不实际下载"""
+    playlist_title = None
+    playlist_dir = None
+    if is_playlist_url:
+        is_playlist_info, playlist_title, entries = await get_playlist_info(url, proxy)
+        if not is_playlist_info or not entries:
+            raise ValueError("无法获取播放列表信息或URL不是播放列表")
+        playlist_dir = sanitize_filename(playlist_title)
+    else:
+        entries = [{"id": extract_video_id(url), "url": url}]
+
+    semaphore = asyncio.Semaphore(max(concurrent_downloads, 1))
+    probe_format: List[Optional[Dict[str, Any]]] = []
+
+    async def plan_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+        video_url = (
+            entry.get("url") or f"https://www.youtube.com/watch?v={entry.get('id')}"
+        )
+        # 与 download_single_video_async 的命名保持一致
+        index = entry.get("playlist_index")
+        prefix = f"{index:02d}-" if index else ""
+        record: Dict[str, Any] = {
+            "index": index,
+            "id": entry.get("id"),
+            "title": entry.get("title"),
+            "duration": entry.get("duration"),
+        }
+        try:
+            async with semaphore:
+                formats, info_dict = await get_available_formats(video_url, proxy)
+        except Exception as e:
+            record.update(error=str(e), bytes=0, covered_bytes=0)
+            return record
+
+        best_video, best_audio = select_best_formats(formats)
+        duration = info_dict.get("duration") or entry.get("duration")
+        title = entry.get("title") or info_dict.get("title")
+        if not best_audio or (not only_audio and not best_video):
+            record.update(
+                title=title, error="无法获取所需格式", bytes=0, covered_bytes=0
+            )
+            return record
+
+        chosen = [best_audio] if only_audio else [best_video, best_audio]
+        expected = sum(estimate_format_size(fmt, duration) or 0 for fmt in chosen)
+        output_file = build_output_filename(
+            f"{prefix}{title}", playlist_dir, only_audio
+        )
+        record.update(
+            title=title,
+            duration=duration,
+            video_format=None if only_audio else _describe_format(best_video, duration),
+            audio_format=_describe_format(best_audio, duration),
+            bytes=expected,
+            output_file=str(output_file),
+            covered_bytes=_covered_bytes(
+                output_file,
+                get_scratch_dir(playlist_dir),
+                info_dict.get("id") or entry.get("id"),
+                chosen,
+                expected,
+            ),
+        )
+        if not probe_format:
+            probe_format.append(chosen[0])
+        return record
+
+    records = await asyncio.gather(*(plan_entry(entry) for entry in entries))
+
+    # 总带宽平均分给各下载槽；未提供时实测单个传输的速度
+    slots = max(min(concurrent_downloads, len(records)), 1)
+    if bandwidth:
+        slot_speed = bandwidth / slots
+        bandwidth_source = "assumed"
+    else:
+        measured = await measure_bandwidth(
+            probe_format[0] if probe_format else None, proxy
+        )
+        slot_speed = measured or ASSUMED_TRANSFER_SPEED
+        bandwidth_source = "measured" if measured else "default"
+
+    total_bytes = sum(r["bytes"] for r in records)
+    covered_bytes = sum(r["covered_bytes"] for r in records)
+    # 按调度策略的下载顺序估算总耗时
+    scheduled = records
+    if schedule != "playlist":
+        scheduled = sorted(
+            records, key=lambda r: r["bytes"], reverse=schedule == "longest"
+        )
+    remaining = [r["bytes"] - r["covered_bytes"] for r in scheduled]
+    return {
+        "url": url,
+        "playlist": is_playlist_url,
+        "title": playlist_title,
+        "only_audio": only_audio,
+        "entry_count": len(records),
+        "failed_entries": sum(1 for r in records if r.get("error")),
+        "concurrency": slots,
+        "schedule": schedule,
+        "bandwidth": {
+            "per_transfer_bytes_per_second": slot_speed,
+            "total_bytes_per_second": slot_speed * slots,
+            "source": bandwidth_source,
+        },
+        "total_bytes": total_bytes,
+        "covered_bytes": covered_bytes,
+        "covered_entries": sum(
+            1 for r in records if r["bytes"] and r["covered_bytes"] >= r["bytes"]
+        ),
+        "remaining_bytes": sum(remaining),
+        "estimated_seconds": round(estimate_makespan(remaining, slots, slot_speed), 1),
+        "entries": records,
+    }
+
+
+async def run_plan(args: argparse.Namespace) -> None:
+    """--plan 模式：输出JSON格式的下载估算结果"""
+    plan_output = sys.stdout
+    # 标准输出只保留JSON结果，其余提示信息输出到标准错误
+    with contextlib.redirect_stdout(sys.stderr):
+        normalized = normalize_youtube_url(args.url) if args.url else None
+        if normalized is None:
+            if args.url:
+                print("请输入一个有效的YouTube视频、播放列表或频道URL。")
+            normalized = get_youtube_url()
+        url, is_playlist_url = normalized
+        proxy = (args.proxy or None) if args.proxy is not None else get_proxy_config()
+        configure_concurrency(min(max(args.concurrent, 1), 10))
+        plan = await build_download_plan(
+            url,
+            is_playlist_url,
+            proxy,
+            args.only_audio,
+            min(max(args.concurrent, 1), 10),
+            args.bandwidth * 1024 * 1024 if args.bandwidth else None,
+            args.schedule,
+        )
+
+    if args.plan_output:
+        with open(args.plan_output, "w", encoding="utf-8") as f:
+            json.dump(plan, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(plan, plan_output, ensure_ascii=False, indent=2)
+        plan_output.write("\n")
+
+
+def configure_concurrency(concurrent_downloads: int) -> None:
+    """按并行下载数量设置各资源的并发上限，线程池大小与之匹配"""
+    configure_resource_limits(concurrency_limits(concurrent_downloads))
+
+
+def configure_resource_limits(limits: Dict[str, int]) -> None:
+    """设置各资源的并发上限，并按上限重建默认线程池"""
+    RESOURCES.configure(**limits)
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=RESOURCES.thread_budget())
+    )
+
+
 async def main():
+    proxy_monitor = None
     try:
         # 解析命令行参数
         args = parse_arguments()
 
+        # 估算模式不下载，也不需要 FFmpeg
+        if args.plan:
+            await run_plan(args)
+            return
+
+        # 校验模式只读取本地文件
+        if args.verify is not None:
+            configure_directories(args.output_dir, args.scratch_dir)
+            loop = asyncio.get_running_loop()
+            verified = await loop.run_in_executor(
+                None, run_verify, args.verify or get_output_dir()
+            )
+            if not verified:
+                sys.exit(1)
+            return
+
         print("\nYouTube视频下载器启动...")
         print("=" * 50 + "\n")
         print("支持的下载类型:")
         print("- 单个YouTube视频")
         print("- 标准YouTube播放列表(PL类型)")
+        print("- YouTube频道(视频标签页)")
         print("=" * 50 + "\n")
 
         if args.only_audio:
@@ -1039,16 +6104,85 @@ async def main():
         else:
             print(f"已设置单个视频并行片段下载数量: {concurrent_fragments}")
 
-        # 先获取代理设置
-        proxy = get_proxy_config()
+        # 检查工作进程参数是否有效
+        processes = args.processes
+        if processes < 1:
+            print(f"工作进程数量({processes})无效，已重置为1")
+            processes = 1
+        elif processes > 1:
+            print(f"已设置工作进程数量: {processes}")
+
+        # 配置输出目录和临时目录
+        configure_directories(args.output_dir, args.scratch_dir)
+
+        # 配置分段转码和按时间段下载
+        configure_transcode_segments(args.transcode_segments)
+        configure_sections(args.sections)
+
+        # 配置传输停滞监控
+        STALL_WATCHDOG.configure(
+            stall_timeout=max(args.stall_timeout, 1.0),
+            min_speed=max(args.stall_speed, 0.0) * 1024,
+            max_restarts=max(args.stall_retries, 0),
+        )
+
+        # 配置请求限速
+        REQUEST_PACER.configure(
+            extraction=args.extract_rate, transfer=args.transfer_rate
+        )
+
+        # 配置缓冲区内存预算
+        MEMORY_BUDGET.configure(args.memory_budget)
+        if args.memory_budget:
+            print(f"已设置缓冲区内存预算: {args.memory_budget / 1024 / 1024:.0f}MB")
+
+        # 配置时间窗口
+        TIME_WINDOWS.configure(args.windows or [])
+        for window in TIME_WINDOWS.windows:
+            rate = window["rate"]
+            bandwidth = f"{rate / 1024 / 1024:.2f}MB/s" if rate else "不限速"
+            print(f"时间窗口 {window['label']}: 并行 {window['workers']}，{bandwidth}")
+
+        # 先获取代理设置，使用代理池时由代理池为每个视频分配代理
+        if args.proxy_file:
+            proxy = None
+            if not await load_proxy_pool(args.proxy_file):
+                return
+            proxy_monitor = asyncio.create_task(PROXY_POOL.monitor())
+        elif args.proxy is not None:
+            proxy = args.proxy or None
+        else:
+            proxy = get_proxy_config()
 
         # 检查 ffmpeg 是否安装，传入代理参数
-        if not await check_ffmpeg(proxy):
+        if not await check_ffmpeg(proxy, args.ffmpeg_cache):
             print("\n请安装 FFmpeg 后重试")
             return
 
+        # 恢复上次中断遗留的临时文件；跳过其他实例或主机可能正在写入的文件
+        lease_time = max(args.lease_time, 10.0)
+        min_idle = (
+            max(2 * lease_time, ORPHAN_MIN_IDLE) if args.queue else ORPHAN_MIN_IDLE
+        )
+        scratch_root = get_scratch_dir()
+        TEMP_FILES.claim(get_output_dir())
+        TEMP_FILES.claim(scratch_root)
+        if get_output_dir() != scratch_root:
+            # 输出目录中只可能遗留跨设备移动中断的 .part 文件
+            TEMP_FILES.recover_orphans(get_output_dir(), min_idle=min_idle)
+        orphans = TEMP_FILES.recover_orphans(scratch_root, min_idle=min_idle)
+        # 协同下载时中断的条目在租约过期后由队列重新分配并续传，
+        # 同步时未完成的条目在下次同步时重新下载并续传
+        if orphans and not (args.queue or args.sync):
+            await resume_orphans(
+                orphans, scratch_root, proxy, args.only_audio, concurrent_fragments
+            )
+
         # 获取视频或播放列表URL
-        url, is_playlist_url = get_youtube_url()
+        normalized = normalize_youtube_url(args.url) if args.url else None
+        if args.url and normalized is None:
+            print("请输入一个有效的YouTube视频、播放列表或频道URL。")
+        url, is_playlist_url = normalized or get_youtube_url()
 
         # 处理播放列表
         if is_playlist_url:
@@ -1061,12 +6195,15 @@ async def main():
                 print("请使用标准YouTube播放列表(PL类型)或单个视频URL")
                 return
 
-            # 询问用户是否下载整个播放列表
+            # 询问用户是否下载整个播放列表，同步模式用于定时任务，不询问
             while True:
-                choice = input(f"\n是否下载整个播放列表? (y/n): ").strip().lower()
+                if args.sync:
+                    choice = "y"
+                else:
+                    choice = input(f"\n是否下载整个播放列表? (y/n): ").strip().lower()
                 if choice == "y":
                     # 如果未通过命令行参数设置并行下载，则询问用户
-                    if args.concurrent == 1:
+                    if args.concurrent == 1 and not args.sync:
                         # 询问用户想要使用的并发下载数量
                         while True:
                             try:
@@ -1084,6 +6221,13 @@ async def main():
                             except ValueError:
                                 print("请输入有效的数字")
 
+                    if TIME_WINDOWS.enabled:
+                        # 窗口外使用设置的并行数，按各窗口中最大的并行数创建工作线程
+                        TIME_WINDOWS.configure(default_workers=concurrent_downloads)
+                        concurrent_downloads = TIME_WINDOWS.max_workers()
+
+                    configure_concurrency(concurrent_downloads)
+
                     # 使用新的播放列表下载方法，传入并发下载数量
                     await download_playlist_async(
                         url,
@@ -1091,6 +6235,12 @@ async def main():
                         args.only_audio,
                         concurrent_downloads,
                         concurrent_fragments,
+                        processes,
+                        args.queue,
+                        lease_time,
+                        args.schedule,
+                        args.sync,
+                        args.lane or "normal",
                     )
                     return
                 elif choice == "n":
@@ -1100,6 +6250,30 @@ async def main():
                     print("请输入 y 或 n")
 
         # 处理单个视频
+        configure_concurrency(1)
+        if args.queue:
+            # 加入共享队列的高优先级通道，同一队列中的播放列表传输为其让出带宽
+            await download_video_queued(
+                url,
+                args.queue,
+                lease_time,
+                args.lane or "interactive",
+                proxy,
+                args.only_audio,
+                concurrent_fragments,
+            )
+            return
+        if PROXY_POOL.enabled:
+            # 按播放列表条目的方式下载，代理出错时自动切换
+            await download_single_video_async(
+                {"id": extract_video_id(url), "url": url},
+                "",
+                None,
+                args.only_audio,
+                concurrent_fragments,
+            )
+            return
+
         print("\n获取视频信息中...")
         available_formats, info_dict = await get_available_formats(url, proxy)
 
@@ -1124,11 +6298,13 @@ async def main():
             proxy,
             args.only_audio,
             concurrent_fragments=concurrent_fragments,
+            duration=info_dict.get("duration"),
         )
 
         if download_success:
             print("\n\n下载完成!")
             print(f"文件保存在: {output_file}")
+            report_memory_stats()
 
             if not args.only_audio:
                 video_info, audio_info = await get_video_properties(output_file)
@@ -1145,7 +6321,16 @@ async def main():
         print("\n\n用户取消下载")
     except Exception as e:
         print(f"\n发生错误: {str(e)}")
+    finally:
+        if proxy_monitor is not None:
+            proxy_monitor.cancel()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # 打包后的程序启动工作进程时需要
+    multiprocessing.freeze_support()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        # Ctrl-C 会取消所有任务，正在进行的传输在下一个数据块处停止并保留部分文件
+        print("\n\n用户取消下载")
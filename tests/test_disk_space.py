@@ -0,0 +1,148 @@
+import collections
+import time
+
+import pytest
+
+import downloader
+
+Usage = collections.namedtuple("Usage", "total used free")
+
+VIDEO = {"format_id": "137", "filesize": 600_000}
+AUDIO = {"format_id": "140", "filesize": 400_000}
+
+
+@pytest.fixture
+def disks(tmp_path, monkeypatch):
+    """输出目录和临时目录，可设置是否在同一设备及各自的剩余空间"""
+    output_dir = tmp_path / "out"
+    scratch_dir = tmp_path / "scratch"
+    output_dir.mkdir()
+    scratch_dir.mkdir()
+    state = {"same_device": True, "free": {output_dir: 0, scratch_dir: 0}}
+
+    def device_of(path):
+        path = downloader._existing_parent(path)
+        if state["same_device"] or scratch_dir not in (path, *path.parents):
+            return 1
+        return 2
+
+    def disk_usage(path):
+        path = downloader._existing_parent(path)
+        root = scratch_dir if scratch_dir in (path, *path.parents) else output_dir
+        if state["same_device"]:
+            root = output_dir
+        return Usage(0, 0, state["free"][root])
+
+    monkeypatch.setattr(downloader, "device_of", device_of)
+    monkeypatch.setattr(downloader.shutil, "disk_usage", disk_usage)
+    monkeypatch.setattr(downloader, "OUTPUT_ROOT", output_dir)
+    monkeypatch.setattr(downloader, "SCRATCH_ROOT", scratch_dir)
+    return output_dir, scratch_dir, state
+
+
+def reserve_single(output_dir, scratch_dir):
+    scratch_size, output_size = downloader.estimate_disk_usage(VIDEO, AUDIO)
+    needs = downloader.disk_space_needs(
+        scratch_dir, output_dir, scratch_size, output_size
+    )
+    return downloader.DiskSpaceLedger().reserve(needs)
+
+
+def test_single_video_same_device_counts_output_once(disks):
+    output_dir, scratch_dir, state = disks
+    scratch_size, output_size = downloader.estimate_disk_usage(VIDEO, AUDIO)
+    # 临时流文件 + .part 输出，.part 原地重命名为输出
+    state["free"][output_dir] = scratch_size
+    assert reserve_single(output_dir, scratch_dir) is None
+    state["free"][output_dir] = scratch_size - 1
+    assert reserve_single(output_dir, scratch_dir) is not None
+
+
+def test_single_video_split_devices(disks):
+    output_dir, scratch_dir, state = disks
+    state["same_device"] = False
+    scratch_size, output_size = downloader.estimate_disk_usage(VIDEO, AUDIO)
+    state["free"][scratch_dir] = scratch_size
+    state["free"][output_dir] = output_size
+    assert reserve_single(output_dir, scratch_dir) is None
+    state["free"][output_dir] = output_size - 1
+    assert "磁盘空间不足" in reserve_single(output_dir, scratch_dir)
+
+
+def test_fit_entries_same_device(disks):
+    output_dir, _, state = disks
+    entries = [{"id": f"v{i}", "duration": 600} for i in range(10)]
+    scratch_size, output_size = downloader.estimate_disk_usage(
+        None, downloader.ASSUMED_AUDIO_FORMAT, False, 600
+    )
+    # 三个输出文件，外加最后一个条目下载中的临时流文件
+    state["free"][output_dir] = 3 * output_size + (scratch_size - output_size)
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表") == 3
+
+
+def test_fit_entries_split_devices(disks):
+    output_dir, scratch_dir, state = disks
+    state["same_device"] = False
+    entries = [{"id": f"v{i}", "duration": 600} for i in range(10)]
+    scratch_size, output_size = downloader.estimate_disk_usage(
+        None, downloader.ASSUMED_AUDIO_FORMAT, False, 600
+    )
+    state["free"][output_dir] = 3 * output_size
+    state["free"][scratch_dir] = 2 * scratch_size
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表") == 3
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表", False, 2) == 3
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表", False, 3) == 2
+
+
+def test_section_size_scales_full_file_size_by_clip_length():
+    video = {"format_id": "137", "filesize": 900_000_000, "tbr": 7200}
+    audio = {"format_id": "140", "filesize": 100_000_000, "tbr": 800}
+    _, full_size = downloader.estimate_disk_usage(video, audio, False, 1000)
+    clip_size = downloader.estimate_section_size(video, audio, False, 100, 200, 1000)
+    assert clip_size == pytest.approx(full_size / 10, rel=0.01)
+
+
+def test_section_size_uses_bitrate_when_duration_is_unknown():
+    video = {"format_id": "137", "filesize": 900_000_000, "tbr": 7200}
+    audio = {"format_id": "140", "filesize": 100_000_000, "tbr": 800}
+    clip_size = downloader.estimate_section_size(video, audio, False, 0, 100, None)
+    # 8000kbps 共 100 秒约 100MB，不能按整个文件的大小预留
+    expected = 8000 * 1000 / 8 * 100 * downloader.DISK_SPACE_MARGIN
+    assert clip_size == pytest.approx(expected, rel=0.01)
+
+
+@pytest.mark.parametrize("same_device", [True, False])
+def test_fit_entries_counts_largest_concurrent_downloads(disks, same_device):
+    output_dir, scratch_dir, state = disks
+    state["same_device"] = same_device
+    durations = [300, 1200, 60, 900, 600, 1800, 120, 2400]
+    entries = [{"id": f"v{i}", "duration": d} for i, d in enumerate(durations)]
+    sizes = [
+        downloader.estimate_disk_usage(None, downloader.ASSUMED_AUDIO_FORMAT, False, d)
+        for d in durations
+    ]
+
+    def needed(count):
+        # 直接计算：全部输出，加上最大的 3 个临时文件
+        outputs = sum(o for _, o in sizes[:count])
+        if same_device:
+            streams = sorted(s - o for s, o in sizes[:count])[-3:]
+            return outputs + sum(streams), 0
+        return outputs, sum(sorted(s for s, _ in sizes[:count])[-3:])
+
+    output_need, scratch_need = needed(5)
+    if same_device:
+        state["free"][output_dir] = output_need
+    else:
+        state["free"][output_dir] = output_need
+        state["free"][scratch_dir] = scratch_need
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表", False, 3) == 5
+
+
+def test_fit_entries_scales_to_large_playlists(disks):
+    output_dir, _, state = disks
+    state["free"][output_dir] = 10**18
+    entries = [{"id": f"v{i}", "duration": 60 + i % 600} for i in range(20000)]
+    started = time.monotonic()
+    assert downloader.DISK_SPACE.fit_entries(entries, "列表", False, 8) == 20000
+    assert time.monotonic() - started < 5
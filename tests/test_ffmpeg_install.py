@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import http.server
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+
+import pytest
+
+import downloader
+
+MEMBERS = {
+    "ffmpeg-master/bin/ffmpeg.exe": os.urandom(300 * 1024),
+    "ffmpeg-master/bin/ffprobe.exe": os.urandom(200 * 1024),
+    # 不需要的大成员，按范围读取时不应下载
+    "ffmpeg-master/doc/manual.bin": os.urandom(3 * 1024 * 1024),
+}
+
+
+def build_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, data in MEMBERS.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+ARCHIVE = build_archive()
+
+
+def digest_of(member):
+    return hashlib.sha256(MEMBERS[f"ffmpeg-master/bin/{member}"]).hexdigest()
+
+
+class MirrorHandler(http.server.BaseHTTPRequestHandler):
+    """本地下载地址：/range/ 支持范围请求，/full/ 忽略 Range，/slow/ 先等待，/fail/ 返回 500"""
+
+    requests_seen = []
+
+    def do_GET(self):
+        type(self).requests_seen.append((self.path, self.headers.get("Range")))
+        if self.path.startswith("/fail/"):
+            self.send_error(500)
+            return
+        if self.path.startswith("/slow/"):
+            time.sleep(0.5)
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if match and not self.path.startswith("/full/"):
+            start = int(match.group(1))
+            end = int(match.group(2) or len(ARCHIVE) - 1)
+            body = ARCHIVE[start : end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(ARCHIVE)}")
+        else:
+            body = ARCHIVE
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mirror(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    MirrorHandler.requests_seen = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_range_file_extracts_only_needed_members(mirror, tmp_path):
+    with downloader.requests.Session() as session:
+        remote = downloader.HTTPRangeFile(
+            session, f"{mirror}/range/ffmpeg.zip", block_size=64 * 1024
+        )
+        digests = downloader.extract_zip_members(
+            remote, downloader.FFMPEG_MEMBERS, tmp_path
+        )
+    assert remote.size == len(ARCHIVE)
+    assert digests == {name: digest_of(name) for name in downloader.FFMPEG_MEMBERS}
+    assert (tmp_path / "ffmpeg.exe").read_bytes() == MEMBERS[
+        "ffmpeg-master/bin/ffmpeg.exe"
+    ]
+    # 没有读取不需要的成员
+    assert remote.bytes_fetched < len(ARCHIVE) / 2
+
+
+def test_range_file_rejects_server_ignoring_range(mirror):
+    with downloader.requests.Session() as session:
+        with pytest.raises(downloader.RangeNotSupportedError):
+            downloader.HTTPRangeFile(session, f"{mirror}/full/ffmpeg.zip")
+
+
+@pytest.mark.parametrize("route", ["range", "full"])
+def test_install_ffmpeg_and_reuse_cache(mirror, tmp_path, route):
+    cache_dir = tmp_path / "cache"
+    first = tmp_path / "first"
+    first.mkdir()
+    assert asyncio.run(
+        downloader.install_ffmpeg(first, [f"{mirror}/{route}/ffmpeg.zip"], cache_dir)
+    )
+    for name in downloader.FFMPEG_MEMBERS:
+        assert downloader.hash_file(first / name) == digest_of(name)
+    if route == "full":
+        # 不支持范围请求时下载了整个压缩包
+        assert any(path.startswith("/full/") for path, _ in MirrorHandler.requests_seen)
+
+    # 第二次安装直接使用缓存，不再请求下载地址
+    MirrorHandler.requests_seen = []
+    second = tmp_path / "second"
+    second.mkdir()
+    assert asyncio.run(
+        downloader.install_ffmpeg(second, [f"{mirror}/fail/ffmpeg.zip"], cache_dir)
+    )
+    assert MirrorHandler.requests_seen == []
+    for name in downloader.FFMPEG_MEMBERS:
+        assert downloader.hash_file(second / name) == digest_of(name)
+
+
+def test_corrupted_cache_is_not_used(mirror, tmp_path):
+    cache_dir = tmp_path / "cache"
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    url = f"{mirror}/range/ffmpeg.zip"
+    assert asyncio.run(downloader.install_ffmpeg(dest, [url], cache_dir))
+    (cache_dir / "ffmpeg.exe").write_bytes(b"corrupted")
+    assert not downloader.install_from_ffmpeg_cache(cache_dir, dest)
+
+
+def test_rank_mirrors_orders_by_speed(mirror, monkeypatch):
+    monkeypatch.setattr(downloader, "MIRROR_PROBE_BYTES", 256 * 1024)
+    urls = [
+        f"{mirror}/fail/ffmpeg.zip",
+        f"{mirror}/slow/ffmpeg.zip",
+        f"{mirror}/range/ffmpeg.zip",
+    ]
+    ranked = asyncio.run(downloader.rank_mirrors(urls))
+    assert ranked == [urls[2], urls[1], urls[0]]
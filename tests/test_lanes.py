@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import downloader
+
+
+class StubQueue:
+    """共享队列的替身：返回设定的活动通道，可以模拟队列文件被锁"""
+
+    def __init__(self, lanes=()):
+        self.lanes = set(lanes)
+        self.unlocked = threading.Event()
+        self.unlocked.set()
+        self.queries = 0
+
+    def active_lanes(self):
+        self.queries += 1
+        self.unlocked.wait()
+        return set(self.lanes)
+
+
+def progress(downloaded):
+    return {"status": "downloading", "downloaded_bytes": downloaded}
+
+
+def test_hook_pauses_while_remote_higher_lane_is_active():
+    scheduler = downloader.LaneScheduler(sleep=lambda seconds: time.sleep(0.01))
+    work_queue = StubQueue({"interactive"})
+
+    async def scenario():
+        monitor = asyncio.create_task(scheduler.monitor(work_queue, interval=0.01))
+        while not work_queue.queries:
+            await asyncio.sleep(0.01)
+        loop = asyncio.get_running_loop()
+        hook = loop.run_in_executor(
+            None, scheduler.hook, "t", "bulk", None, progress(100)
+        )
+        await asyncio.sleep(0.1)
+        paused = not hook.done()
+        # 其他主机的 interactive 任务结束后继续传输
+        work_queue.lanes = set()
+        await asyncio.wait_for(hook, 2)
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+        return paused
+
+    try:
+        assert asyncio.run(scenario())
+    finally:
+        downloader.STALL_WATCHDOG.stop("t")
+    # 监控结束后不再保留查询结果
+    assert scheduler.active_lanes() == set()
+
+
+def test_hook_does_not_wait_for_locked_queue():
+    scheduler = downloader.LaneScheduler(sleep=lambda seconds: time.sleep(0.01))
+    work_queue = StubQueue()
+    work_queue.unlocked.clear()
+
+    async def scenario():
+        monitor = asyncio.create_task(scheduler.monitor(work_queue, interval=0.01))
+        while not work_queue.queries:
+            await asyncio.sleep(0.01)
+        # 队列查询被阻塞时，进度回调只读取内存中的状态
+        started = time.monotonic()
+        scheduler.hook("t", "bulk", None, progress(100))
+        elapsed = time.monotonic() - started
+        work_queue.unlocked.set()
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+        return elapsed
+
+    assert asyncio.run(scenario()) < 0.1
+
+
+def test_local_higher_lane_preempts():
+    scheduler = downloader.LaneScheduler()
+
+    async def scenario():
+        async with scheduler.job("interactive"):
+            inside = scheduler.preempting("bulk")
+        return inside, scheduler.preempting("bulk")
+
+    assert asyncio.run(scenario()) == ("interactive", None)
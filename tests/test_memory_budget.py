@@ -0,0 +1,58 @@
+import contextlib
+
+import pytest
+
+import downloader
+
+
+@pytest.fixture
+def captured(monkeypatch):
+    """替换 yt-dlp 会话，记录下载时的选项和内存预算用量"""
+    budget = downloader.MemoryBudget()
+    monkeypatch.setattr(downloader, "MEMORY_BUDGET", budget)
+    calls = []
+
+    class FakeYDL:
+        def __init__(self, opts):
+            self.opts = opts
+
+        def download(self, urls):
+            calls.append((dict(self.opts), budget.in_use))
+
+    @contextlib.contextmanager
+    def session(proxy, cancel_event, **opts):
+        yield FakeYDL(opts)
+
+    monkeypatch.setattr(downloader.YDL_POOL, "session", session)
+    return budget, calls
+
+
+def test_without_budget_keeps_resizable_buffer(captured, tmp_path):
+    budget, calls = captured
+    downloader.run_ytdl_download(
+        "https://example.com/v",
+        {"concurrent_fragment_downloads": 3},
+        tmp_path / "v.mp4",
+    )
+    ((opts, in_use),) = calls
+    assert "buffersize" not in opts and "noresizebuffer" not in opts
+    assert opts["concurrent_fragment_downloads"] == 3
+    # 按 yt-dlp 缓冲区的上限统计
+    assert in_use == 3 * downloader.YTDL_MAX_BUFFER_SIZE
+    assert budget.in_use == 0
+
+
+def test_with_budget_pins_buffer_and_reduces_fragments(captured, tmp_path):
+    budget, calls = captured
+    budget.configure(2 * downloader.MEMORY_BUFFER_SIZE)
+    downloader.run_ytdl_download(
+        "https://example.com/v",
+        {"concurrent_fragment_downloads": 4},
+        tmp_path / "v.mp4",
+    )
+    ((opts, in_use),) = calls
+    assert opts["buffersize"] == downloader.MEMORY_BUFFER_SIZE
+    assert opts["noresizebuffer"] is True
+    assert opts["concurrent_fragment_downloads"] == 2
+    assert in_use == 2 * downloader.MEMORY_BUFFER_SIZE
+    assert budget.in_use == 0
@@ -0,0 +1,110 @@
+import contextlib
+import tracemalloc
+
+import pytest
+
+import downloader
+
+# 每个条目（含列表中的引用）允许的字节数，字段值本身由扁平条目共享
+BYTES_PER_ENTRY = 160
+# 逐页列出时字段值也由条目持有
+STREAMED_BYTES_PER_ENTRY = 400
+SIZES = [1000, 20000]
+
+
+def flat_entry(index):
+    video_id = f"{index:011d}"
+    return {
+        "id": video_id,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "title": f"视频 {index}",
+        "duration": 212,
+        "channel": "频道",
+        "thumbnails": [
+            {"url": f"https://i.ytimg.com/vi/{video_id}/{n}.jpg", "height": n}
+            for n in range(4)
+        ],
+    }
+
+
+def traced_peak(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def per_entry_peaks(measure):
+    return {size: measure(size) / size for size in SIZES}
+
+
+def assert_flat(peaks, bound):
+    small, large = (peaks[size] for size in SIZES)
+    assert large < bound
+    # 播放列表变大时每个条目的占用不增加
+    assert large <= small * 1.2
+
+
+def test_playlist_entries_stay_compact():
+    def measure(size):
+        infos = [flat_entry(i) for i in range(size)]
+        entries, peak = traced_peak(
+            lambda: [
+                downloader.PlaylistEntry.from_info(info, i + 1)
+                for i, info in enumerate(infos)
+            ]
+        )
+        assert len(entries) == size
+        return peak
+
+    assert_flat(per_entry_peaks(measure), BYTES_PER_ENTRY)
+
+
+def test_list_playlist_entries_streams_flat_entries(monkeypatch):
+    @contextlib.contextmanager
+    def session(proxy, **opts):
+        yield None
+
+    monkeypatch.setattr(downloader.YDL_POOL, "session", session)
+
+    def measure(size):
+        # 与 yt-dlp 逐页提取一样，完整的扁平条目逐个生成
+        monkeypatch.setattr(
+            downloader,
+            "extract_lazy_playlist",
+            lambda ydl, url: {
+                "title": "列表",
+                "entries": (flat_entry(i) for i in range(size)),
+            },
+        )
+        (ok, title, entries), peak = traced_peak(
+            lambda: downloader.list_playlist_entries("https://example.com/list")
+        )
+        assert ok and title == "列表" and len(entries) == size
+        assert entries[-1]["playlist_index"] == size
+        return peak
+
+    assert_flat(per_entry_peaks(measure), STREAMED_BYTES_PER_ENTRY)
+
+
+def test_playlist_entry_behaves_like_a_mapping():
+    entry = downloader.PlaylistEntry.from_info(flat_entry(7), 8)
+    # 标准观看地址不保存，缺失的字段视为不存在
+    assert entry.get("url") is None
+    assert dict(entry) == {
+        "id": "00000000007",
+        "title": "视频 7",
+        "playlist_index": 8,
+        "duration": 212,
+    }
+    assert "thumbnails" not in entry
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_full_flat_entries_would_exceed_bound(size):
+    # 对照：直接保留扁平条目时每条远超上限，上面的测试确实在衡量紧凑表示
+    infos, peak = traced_peak(lambda: [flat_entry(i) for i in range(size)])
+    assert peak / size > STREAMED_BYTES_PER_ENTRY
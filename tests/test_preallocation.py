@@ -0,0 +1,79 @@
+import http.server
+import os
+import platform
+import threading
+import time
+
+import pytest
+
+import downloader
+
+pytestmark = pytest.mark.skipif(
+    platform.system() != "Linux", reason="只在 Linux 上检查 fallocate 的效果"
+)
+
+SIZE = 4 * 1024 * 1024
+
+
+def allocated(path):
+    return os.stat(path).st_blocks * 512
+
+
+def test_reserve_keeps_file_length(tmp_path):
+    path = tmp_path / "v.part"
+    path.write_bytes(b"x" * 1000)
+    assert downloader.reserve_file_space(path, SIZE)
+    # 长度不变，yt-dlp 仍按长度续传
+    assert path.stat().st_size == 1000
+    assert allocated(path) >= SIZE
+    downloader.release_file_space(path)
+    assert path.stat().st_size == 1000
+    assert allocated(path) < SIZE
+
+
+class SlowFile(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(SIZE))
+        self.send_header("Content-Type", "application/octet-stream")
+        self.end_headers()
+        try:
+            for _ in range(SIZE // 65536):
+                self.wfile.write(b"x" * 65536)
+                time.sleep(0.002)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowFile)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v.bin"
+    server.shutdown()
+    server.server_close()
+
+
+def test_ytdl_transfer_preallocates_part_file(server, tmp_path):
+    target = tmp_path / "v.bin"
+    seen = []
+
+    def check(d):
+        if d["status"] == "downloading" and d.get("tmpfilename"):
+            path = d["tmpfilename"]
+            seen.append((os.path.getsize(path), allocated(path)))
+
+    downloader.run_ytdl_download(
+        server,
+        {"outtmpl": str(target), "quiet": True, "progress_hooks": [check]},
+        target,
+    )
+    assert target.stat().st_size == SIZE
+    # 传输中途 .part 文件长度小于总大小，但空间已全部预留
+    size, reserved = next((s, a) for s, a in seen if s < SIZE // 2)
+    assert reserved >= SIZE > size
+    assert allocated(target) < SIZE + 1024 * 1024
@@ -0,0 +1,131 @@
+import asyncio
+import http.server
+import socket
+import threading
+import time
+
+import pytest
+
+import downloader
+
+
+class StandInProxy(http.server.BaseHTTPRequestHandler):
+    """代替代理的本地服务器：对任何请求返回 204"""
+
+    def do_GET(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def live_proxy():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInProxy)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def dead_proxy():
+    # 绑定后立即关闭的端口，连接会被拒绝
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = downloader.ProxyPool(probe_url="http://probe.invalid/generate_204")
+    monkeypatch.setattr(downloader, "PROXY_POOL", pool)
+    return pool
+
+
+def proxy_error(proxy):
+    return Exception(f"Unable to connect to proxy {proxy}")
+
+
+def test_health_check_skips_dead_proxy(pool, live_proxy, dead_proxy):
+    pool.set_proxies([dead_proxy, live_proxy])
+    pool.check_all()
+    latency = pool.latency_snapshot()
+    assert latency[dead_proxy] is None
+    assert latency[live_proxy] is not None
+    assert pool.acquire("a") == live_proxy
+    # 同一视频在释放前固定使用同一个代理
+    assert pool.acquire("a") == live_proxy
+
+
+def test_cooldown_evicts_failed_proxy_until_it_expires(pool, monkeypatch):
+    monkeypatch.setattr(downloader, "PROXY_FAILURE_COOLDOWN", 0.2)
+    pool.set_proxies(["http://p1", "http://p2"])
+    first = pool.acquire("a")
+    pool.release("a")
+    assert pool.report_error(first, proxy_error(first))
+    assert not pool.report_error(first, Exception("Video unavailable"))
+    assert pool.acquire("b") != first
+    pool.release("b")
+    time.sleep(0.25)
+    assert pool.acquire("c") == first
+
+
+def test_all_proxies_down_falls_back_to_earliest_cooldown(pool, dead_proxy):
+    pool.set_proxies([dead_proxy, "http://127.0.0.1:9"])
+    pool.check_all()
+    pool.report_error(dead_proxy, proxy_error(dead_proxy))
+    time.sleep(0.01)
+    pool.report_error("http://127.0.0.1:9", proxy_error("p"))
+    assert pool.acquire("a") == dead_proxy
+
+
+def test_run_with_proxy_rotates_after_proxy_error(pool):
+    pool.set_proxies(["http://p1", "http://p2", "http://p3"])
+    used = []
+
+    async def attempt(proxy):
+        used.append(proxy)
+        if len(used) == 1:
+            # 与下载函数一样在内部捕获错误后返回失败
+            downloader.PROXY_POOL.report_error(proxy, proxy_error(proxy))
+            return False
+        return True
+
+    assert asyncio.run(downloader.run_with_proxy("v", None, attempt))
+    assert len(used) == 2 and used[0] != used[1]
+
+
+def test_run_with_proxy_ignores_errors_reported_by_other_tasks(pool):
+    pool.set_proxies(["http://p1", "http://p2"])
+    used = []
+
+    async def scenario():
+        started = asyncio.Event()
+        reported = asyncio.Event()
+
+        async def other_video():
+            # 其他视频在本次尝试期间报告同一代理出错
+            await started.wait()
+            proxy = used[0]
+            downloader.PROXY_POOL.report_error(proxy, proxy_error(proxy))
+            reported.set()
+
+        async def attempt(proxy):
+            used.append(proxy)
+            started.set()
+            await reported.wait()
+            return False  # 与代理无关的失败
+
+        other = asyncio.create_task(other_video())
+        result = await downloader.run_with_proxy("v", None, attempt)
+        await other
+        return result
+
+    assert not asyncio.run(scenario())
+    # 不会因为其他视频的错误而换代理重试
+    assert len(used) == 1
+    assert pool.failure_count(used[0]) == 1
@@ -0,0 +1,173 @@
+import asyncio
+import email.utils
+
+import pytest
+
+import downloader
+
+NOW = 1_700_000_000.0
+
+
+class Clocks:
+    """模拟的单调时钟和墙上时钟，一起推进"""
+
+    def __init__(self):
+        self.monotonic = 100.0
+        self.wall = NOW
+
+    def advance(self, seconds):
+        self.monotonic += seconds
+        self.wall += seconds
+
+
+@pytest.fixture
+def clocks():
+    return Clocks()
+
+
+@pytest.fixture
+def pacer(clocks):
+    return downloader.RequestPacer(
+        clock=lambda: clocks.monotonic,
+        wall_clock=lambda: clocks.wall,
+        extraction=1.0,
+        transfer=2.0,
+    )
+
+
+class Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class HTTPError(Exception):
+    status = 429
+
+    def __init__(self, headers):
+        super().__init__("HTTP Error 429: Too Many Requests")
+        self.response = Response(headers)
+
+
+def wrapped(error):
+    """yt-dlp 把原始 HTTP 错误包在外层异常的 cause 中"""
+    try:
+        raise error
+    except HTTPError as e:
+        outer = Exception("ERROR: unable to download")
+        outer.__cause__ = e
+        return outer
+
+
+def rate(pacer, kind):
+    return pacer._buckets[kind].rate
+
+
+def test_retry_after_seconds():
+    error = wrapped(HTTPError({"Retry-After": "120"}))
+    assert downloader.is_throttle_error(error)
+    assert downloader.retry_after_seconds(error, NOW) == 120
+
+
+def test_retry_after_http_date():
+    date = email.utils.formatdate(NOW + 300, usegmt=True)
+    error = HTTPError({"Retry-After": date})
+    assert downloader.retry_after_seconds(error, NOW) == pytest.approx(300)
+    # 已经过去的日期不再等待
+    assert downloader.retry_after_seconds(error, NOW + 600) == 0
+
+
+def test_retry_after_is_capped_and_optional():
+    capped = HTTPError({"Retry-After": "99999"})
+    assert downloader.retry_after_seconds(capped, NOW) == downloader.PACER_MAX_PAUSE
+    assert downloader.retry_after_seconds(HTTPError({}), NOW) is None
+    assert downloader.retry_after_seconds(Exception("其他错误"), NOW) is None
+
+
+def test_pause_doubles_and_is_capped(pacer, clocks):
+    pauses = []
+    for _ in range(7):
+        started = clocks.monotonic
+        clocks.advance(1)
+        pacer.throttled("extraction", None, started)
+        pauses.append(pacer.pause_remaining())
+    assert pauses == [30, 60, 120, 240, 480, 900, 900]
+
+
+def test_retry_after_overrides_default_pause(pacer, clocks):
+    started = clocks.monotonic
+    clocks.advance(1)
+    pacer.throttled("extraction", 7.0, started)
+    assert pacer.pause_remaining() == 7.0
+
+
+def test_throttle_halves_all_rates_down_to_minimum(pacer, clocks):
+    for expected in (0.5, 0.25, 0.125, 0.0625, 0.05, 0.05):
+        started = clocks.monotonic
+        clocks.advance(1)
+        pacer.throttled("extraction", 1.0, started)
+        assert rate(pacer, "extraction") == pytest.approx(expected)
+    # 所有类型的请求一起降速
+    assert rate(pacer, "transfer") == pytest.approx(0.1)
+
+
+def test_success_recovers_rate_in_small_steps(pacer, clocks):
+    started = clocks.monotonic
+    clocks.advance(1)
+    pacer.throttled("transfer", 1.0, started)
+    assert rate(pacer, "transfer") == pytest.approx(1.0)
+    # 限流之前发出的请求成功不代表限流已经解除
+    pacer.succeeded("transfer", started)
+    assert rate(pacer, "transfer") == pytest.approx(1.0)
+    for step in range(1, 12):
+        clocks.advance(1)
+        pacer.succeeded("transfer", clocks.monotonic)
+        expected = min(1.0 + step * 2.0 * downloader.PACER_RECOVERY_STEP, 2.0)
+        assert rate(pacer, "transfer") == pytest.approx(expected)
+
+
+def test_concurrent_429s_count_once(pacer, clocks):
+    # 三个请求同时发出，都因同一次限流失败
+    started = clocks.monotonic
+    clocks.advance(1)
+    for _ in range(3):
+        pacer.throttled("extraction", None, started)
+    assert rate(pacer, "extraction") == pytest.approx(0.5)
+    assert pacer.pause_remaining() == downloader.PACER_DEFAULT_PAUSE
+    # 限流之后发出的请求再次失败才算连续限流
+    started = clocks.monotonic
+    clocks.advance(1)
+    pacer.throttled("extraction", None, started)
+    assert rate(pacer, "extraction") == pytest.approx(0.25)
+    assert pacer.pause_remaining() == 2 * downloader.PACER_DEFAULT_PAUSE
+
+
+def test_paused_requests_wait_for_pause(pacer, clocks):
+    started = clocks.monotonic
+    pacer.throttled("transfer", 10.0, started)
+    # 暂停期间新请求排到暂停结束之后
+    assert pacer._reserve("transfer") >= 10.0
+    clocks.advance(20)
+    assert pacer.pause_remaining() == 0
+
+
+def test_request_context_records_throttle(pacer, clocks):
+    async def scenario():
+        with pytest.raises(HTTPError):
+            async with pacer.request("extraction"):
+                clocks.advance(1)
+                raise HTTPError({"Retry-After": "45"})
+
+    asyncio.run(scenario())
+    assert pacer.pause_remaining() == 45
+    assert rate(pacer, "extraction") == pytest.approx(0.5)
+
+
+def test_token_bucket_allows_burst_then_spaces_requests():
+    bucket = downloader.TokenBucket(2.0, burst_seconds=1.0, now=0.0)
+    assert [bucket.reserve(0.0) for _ in range(2)] == [0.0, 0.0]
+    # 令牌用完后按速率排队
+    assert bucket.reserve(0.0) == pytest.approx(0.5)
+    assert bucket.reserve(0.0) == pytest.approx(1.0)
+    # 暂停期间不补充令牌，已预支的令牌仍然计入
+    bucket.drain(5.0)
+    assert bucket.reserve(5.0) == pytest.approx(6.5)
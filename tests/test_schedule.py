@@ -0,0 +1,28 @@
+import json
+
+import downloader
+
+
+def test_playlist_entry_keeps_metadata_filesize():
+    entry = downloader.PlaylistEntry.from_info(
+        {"id": "a", "duration": 60, "filesize_approx": 5_000_000}
+    )
+    assert entry["filesize"] == 5_000_000
+    # 经过共享队列的序列化后仍然保留
+    restored = downloader.PlaylistEntry.from_info(json.loads(json.dumps(dict(entry))))
+    assert restored.get("filesize") == 5_000_000
+
+
+def test_schedule_prefers_filesize_over_duration():
+    entries = [
+        downloader.PlaylistEntry.from_info(info)
+        for info in (
+            {"id": "long-small", "duration": 3600, "filesize": 1_000_000},
+            {"id": "short-large", "duration": 60, "filesize": 900_000_000},
+            {"id": "unknown", "duration": 600},
+        )
+    ]
+    shortest = downloader.schedule_entries(entries, "shortest")
+    assert [e["id"] for e in shortest] == ["long-small", "unknown", "short-large"]
+    longest = downloader.schedule_entries(entries, "longest")
+    assert [e["id"] for e in longest] == ["short-large", "unknown", "long-small"]
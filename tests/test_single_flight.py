@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import downloader
+
+
+def test_concurrent_calls_share_one_result():
+    async def scenario():
+        flight = downloader.SingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "结果"
+
+        results = await asyncio.gather(*(flight.run("k", func) for _ in range(3)))
+        return calls, results
+
+    calls, results = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == ["结果"] * 3
+
+
+def test_waiter_retries_when_leader_is_cancelled():
+    async def scenario():
+        flight = downloader.SingleFlight()
+        calls = []
+
+        async def func():
+            calls.append(1)
+            await asyncio.sleep(0.05 if len(calls) == 1 else 0)
+            return len(calls)
+
+        leader = asyncio.create_task(flight.run("k", func))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run("k", func))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.gather(leader, return_exceptions=True)
+        return leader, await waiter, calls
+
+    leader, result, calls = asyncio.run(scenario())
+    assert leader.cancelled()
+    # 等待方自己重新执行了调用
+    assert result == 2
+    assert len(calls) == 2
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    async def scenario():
+        flight = downloader.SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.05)
+            return "结果"
+
+        leader = asyncio.create_task(flight.run("k", func))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run("k", func))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await leader
+
+    assert asyncio.run(scenario()) == "结果"
+
+
+def test_leader_exception_is_shared():
+    async def scenario():
+        flight = downloader.SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            raise ValueError("失败")
+
+        return await asyncio.gather(
+            flight.run("k", func), flight.run("k", func), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
@@ -0,0 +1,119 @@
+import contextlib
+
+import pytest
+
+import downloader
+
+KB = 1024
+
+
+def feed(watchdog, key, start, end, speed, downloaded=0):
+    """每秒报告一次进度，返回最后的已下载字节数"""
+    for now in range(start, end + 1):
+        watchdog.record(key, downloaded, now=float(now))
+        downloaded += speed
+    return downloaded
+
+
+@pytest.fixture
+def watchdog():
+    return downloader.StallWatchdog(stall_timeout=30, min_speed=10 * KB, window=10)
+
+
+def test_slow_transfer_stalls_after_timeout(watchdog):
+    watchdog.start("v")
+    feed(watchdog, "v", 0, 29, 1 * KB)
+    assert not watchdog.is_stalled("v")
+    with pytest.raises(downloader.TransferStalledError):
+        watchdog.record("v", 30 * KB, now=30.0)
+    assert watchdog.is_stalled("v")
+
+
+def test_fast_transfer_never_stalls(watchdog):
+    watchdog.start("v")
+    feed(watchdog, "v", 0, 120, 50 * KB)
+    assert not watchdog.is_stalled("v")
+
+
+def test_speed_recovery_resets_slow_period(watchdog):
+    watchdog.start("v")
+    downloaded = feed(watchdog, "v", 0, 25, 1 * KB)
+    downloaded = feed(watchdog, "v", 26, 40, 100 * KB, downloaded)
+    # 恢复速度后重新计算低速持续时间
+    feed(watchdog, "v", 41, 65, 1 * KB, downloaded)
+    assert not watchdog.is_stalled("v")
+
+
+def test_restart_after_pause_does_not_stall(watchdog):
+    watchdog.start("v")
+    downloaded = feed(watchdog, "v", 0, 25, 1 * KB)
+    # 时间窗口或优先级通道暂停期间没有进度，恢复时重新开始监控
+    watchdog.start("v")
+    feed(watchdog, "v", 100, 125, 1 * KB, downloaded)
+    assert not watchdog.is_stalled("v")
+
+
+def test_configure_shrinks_window_to_timeout():
+    watchdog = downloader.StallWatchdog(window=10)
+    watchdog.configure(stall_timeout=5, min_speed=2 * KB, max_restarts=1)
+    assert (watchdog.window, watchdog.min_speed, watchdog.max_restarts) == (
+        5,
+        2 * KB,
+        1,
+    )
+
+
+@pytest.fixture
+def fake_ytdl(monkeypatch):
+    """替换 yt-dlp 会话，每次下载都按设定的方式失败"""
+    watchdog = downloader.StallWatchdog(stall_timeout=1, window=1, max_restarts=2)
+    monkeypatch.setattr(downloader, "STALL_WATCHDOG", watchdog)
+    attempts = []
+
+    class FakeYDL:
+        def download(self, urls):
+            attempts.append(urls)
+            raise_error()
+
+    raise_error = None
+
+    @contextlib.contextmanager
+    def session(proxy, cancel_event, **opts):
+        yield FakeYDL()
+
+    monkeypatch.setattr(downloader.YDL_POOL, "session", session)
+
+    def run(error, tmp_path):
+        nonlocal raise_error
+        raise_error = error
+        key = str(tmp_path / "v.mp4")
+        with pytest.raises(Exception) as info:
+            downloader.run_ytdl_download("https://example.com/v", {}, key)
+        return info.value, len(attempts)
+
+    return watchdog, run
+
+
+def test_restart_budget_is_enforced(fake_ytdl, tmp_path):
+    watchdog, run = fake_ytdl
+    key = str(tmp_path / "v.mp4")
+
+    def stall():
+        watchdog.record(key, 0, now=0.0)
+        watchdog.record(key, 0, now=2.0)
+
+    error, attempts = run(stall, tmp_path)
+    assert isinstance(error, downloader.TransferStalledError)
+    # 首次下载加上最多 max_restarts 次重启
+    assert attempts == 1 + watchdog.max_restarts
+
+
+def test_other_errors_are_not_retried(fake_ytdl, tmp_path):
+    _, run = fake_ytdl
+
+    def fail():
+        raise ValueError("格式不可用")
+
+    error, attempts = run(fail, tmp_path)
+    assert isinstance(error, ValueError)
+    assert attempts == 1
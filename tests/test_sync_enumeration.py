@@ -0,0 +1,145 @@
+import contextlib
+import threading
+
+import pytest
+import yt_dlp
+
+import downloader
+
+CHANNEL_URL = "https://www.youtube.com/@channel/videos"
+UPLOADS_URL = "https://www.youtube.com/playlist?list=UUabcdefghijklmnopqrstuv"
+PLAYLIST_URL = "https://www.youtube.com/playlist?list=PLabcdefghijklmnopqrstuv"
+
+
+def video(index, **fields):
+    return {"id": f"video{index:06d}", "title": f"视频 {index}", **fields}
+
+
+@pytest.fixture
+def listing(monkeypatch):
+    """替换 yt-dlp 会话和逐页提取，记录实际取出的条目数"""
+    pulled = []
+
+    @contextlib.contextmanager
+    def session(proxy, **opts):
+        yield None
+
+    def serve(entries):
+        def generate():
+            for entry in entries:
+                pulled.append(entry)
+                yield entry
+
+        monkeypatch.setattr(
+            downloader,
+            "extract_lazy_playlist",
+            lambda ydl, url: {"title": "列表", "entries": generate()},
+        )
+        return pulled
+
+    monkeypatch.setattr(downloader.YDL_POOL, "session", session)
+    return serve
+
+
+@pytest.fixture
+def state(tmp_path):
+    return downloader.PlaylistSyncState(tmp_path / "state.json")
+
+
+def remember(state, indexes):
+    for index in indexes:
+        state.record(video(index), index)
+
+
+@pytest.mark.parametrize("url", [CHANNEL_URL, UPLOADS_URL])
+def test_newest_first_stops_after_known_streak(listing, state, url):
+    remember(state, range(100, 200))
+    # 3 个新视频在前，之后全是上次同步见过的条目
+    pulled = listing([video(i) for i in range(3)] + [video(i) for i in range(100, 200)])
+
+    is_playlist, title, enumerated = downloader.enumerate_new_entries(url, state)
+
+    assert (is_playlist, title) == (True, "列表")
+    assert enumerated == len(pulled) == 3 + downloader.SYNC_KNOWN_STREAK
+    assert [entry["id"] for entry in state.pending_entries()][:3] == [
+        video(i)["id"] for i in range(3)
+    ]
+    assert state.data["newest_first"] is True
+
+
+def test_known_streak_resets_on_new_entry(listing, state):
+    streak = downloader.SYNC_KNOWN_STREAK
+    remember(state, range(100, 200))
+    # 已知条目之间夹着一个新条目（如重新公开的视频），连续计数重新开始
+    entries = [video(i) for i in range(100, 100 + streak - 1)]
+    entries += [video(0)] + [video(i) for i in range(150, 200)]
+    pulled = listing(entries)
+
+    downloader.enumerate_new_entries(CHANNEL_URL, state)
+
+    assert len(pulled) == streak - 1 + 1 + streak
+    assert state.is_known(video(0)["id"])
+
+
+def test_regular_playlist_is_listed_completely(listing, state):
+    remember(state, range(100))
+    # 普通播放列表的新条目可能追加在末尾
+    pulled = listing([video(i) for i in range(102)])
+
+    _, _, enumerated = downloader.enumerate_new_entries(PLAYLIST_URL, state)
+
+    assert enumerated == len(pulled) == 102
+    assert [entry["id"] for entry in state.pending_entries()] == [
+        video(i)["id"] for i in range(102)
+    ]
+    assert state.data["newest_first"] is False
+    assert state.data["last_position"] == 102
+
+
+def test_live_and_upcoming_entries_are_skipped(listing, state):
+    listing(
+        [
+            video(0, live_status="is_upcoming"),
+            video(1, live_status="is_live"),
+            video(2, live_status="was_live"),
+            video(3),
+            None,
+            {"title": "没有ID的条目"},
+        ]
+    )
+
+    _, _, enumerated = downloader.enumerate_new_entries(PLAYLIST_URL, state)
+
+    assert enumerated == 6
+    assert sorted(state.entries) == [video(2)["id"], video(3)["id"]]
+    # 跳过的条目不占用位置，下次同步时按实际位置记录
+    assert state.entries[video(3)["id"]]["position"] == 4
+
+
+def test_skipped_live_entries_do_not_break_streak(listing, state):
+    remember(state, range(100, 200))
+    entries = [video(i) for i in range(100, 103)]
+    entries += [video(0, live_status="is_upcoming")]
+    entries += [video(i) for i in range(103, 200)]
+    pulled = listing(entries)
+
+    downloader.enumerate_new_entries(CHANNEL_URL, state)
+
+    assert len(pulled) == downloader.SYNC_KNOWN_STREAK + 1
+    assert not state.is_known(video(0)["id"])
+
+
+def test_not_a_playlist(monkeypatch, listing, state):
+    listing([])
+    monkeypatch.setattr(downloader, "extract_lazy_playlist", lambda ydl, url: {})
+    assert downloader.enumerate_new_entries(PLAYLIST_URL, state) == (False, None, 0)
+
+
+def test_cancel_stops_enumeration(listing, state):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    pulled = listing([video(i) for i in range(10)])
+
+    with pytest.raises(yt_dlp.utils.DownloadCancelled):
+        downloader.enumerate_new_entries(PLAYLIST_URL, state, None, cancel_event)
+    assert len(pulled) == 1
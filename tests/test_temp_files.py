@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+import time
+
+import downloader
+
+# 在另一个进程中锁定目录，直到标准输入关闭
+HOLDER = """
+import sys
+sys.path.insert(0, sys.argv[1])
+import downloader
+downloader.TEMP_FILES.claim(sys.argv[2])
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def make_idle(path, seconds=3600):
+    """把文件的修改时间调到 seconds 秒之前"""
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_recover_orphans_skips_recently_modified_part(tmp_path):
+    part = tmp_path / "视频.mp4.part"
+    part.write_bytes(b"x")
+    assert downloader.TempFileManager().recover_orphans(tmp_path) == []
+    assert part.exists()
+
+    make_idle(part)
+    downloader.TempFileManager().recover_orphans(tmp_path)
+    assert not part.exists()
+
+
+def test_recover_orphans_skips_directory_used_by_running_instance(tmp_path):
+    part = tmp_path / "视频.mp4.part"
+    part.write_bytes(b"x")
+    make_idle(part)
+    stream = tmp_path / "dQw4w9WgXcQ_251.webm.part"
+    stream.write_bytes(b"x")
+    make_idle(stream)
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLDER, root, str(tmp_path)],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "ready"
+        manager = downloader.TempFileManager()
+        manager.claim(tmp_path)
+        assert manager.recover_orphans(tmp_path, min_idle=0) == []
+        assert part.exists() and stream.exists()
+    finally:
+        holder.stdin.close()
+        holder.wait(timeout=30)
+
+    # 实例退出后锁文件失效，遗留文件正常处理
+    assert manager.recover_orphans(tmp_path, min_idle=0) == [(tmp_path, "dQw4w9WgXcQ")]
+    assert not part.exists()
+    assert list(tmp_path.glob(downloader.INSTANCE_LOCK_PATTERN)) == [
+        tmp_path / f".instance-{downloader.socket.gethostname()}-{os.getpid()}.lock"
+    ]
+    manager.cleanup_at_exit()
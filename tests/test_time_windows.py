@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import datetime
+
+import pytest
+
+import downloader
+
+
+class FakeClock:
+    """模拟时间：sleep 直接推进时钟"""
+
+    def __init__(self, hour, minute, second=0):
+        self.now = datetime.datetime(2024, 1, 1, hour, minute, second)
+        self.slept = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept += seconds
+        self.now += datetime.timedelta(seconds=seconds)
+
+
+def scheduler_at(clock, *windows, default_workers=None):
+    scheduler = downloader.TimeWindowScheduler(clock=clock, sleep=clock.sleep)
+    scheduler.configure(
+        [downloader.parse_time_window(w) for w in windows], default_workers
+    )
+    return scheduler
+
+
+def test_parse_overnight_window():
+    window = downloader.parse_time_window("22:00-06:00,10")
+    assert window["start"] == 1320
+    assert window["end"] == 360
+    assert window["workers"] == 10
+    assert window["rate"] is None
+    assert downloader.parse_time_window("09:00-18:00,2,5M")["rate"] == 5 * 1024**2
+
+
+@pytest.mark.parametrize("value", ["22:00-22:00,1", "09:00-18:00,11", "9-18,1"])
+def test_parse_rejects_invalid_window(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        downloader.parse_time_window(value)
+
+
+@pytest.mark.parametrize(
+    "hour, minute, expected",
+    [(21, 59, (3, None)), (22, 0, (8, None)), (5, 59, (8, None)), (6, 0, (3, None))],
+)
+def test_overnight_window_limits(hour, minute, expected):
+    clock = FakeClock(hour, minute)
+    scheduler = scheduler_at(clock, "22:00-06:00,8", default_workers=3)
+    assert scheduler.limits() == expected
+
+
+def test_first_matching_window_wins():
+    clock = FakeClock(10, 30)
+    scheduler = scheduler_at(clock, "10:00-11:00,1,500K", "09:00-18:00,2")
+    assert scheduler.limits() == (1, 500 * 1024)
+    clock.now = clock.now.replace(hour=12)
+    assert scheduler.limits() == (2, None)
+
+
+def test_transfer_pauses_until_window_ends():
+    clock = FakeClock(5, 59, 50)
+    scheduler = scheduler_at(clock, "22:00-06:00,1")
+    scheduler.start("a")
+    scheduler.start("b")
+    try:
+        # 第一个传输在窗口并行数内，直接继续
+        scheduler.throttle("a", 100)
+        assert clock.slept == 0
+        # 第二个传输暂停到 06:00 窗口结束
+        scheduler.throttle("b", 100)
+        assert clock.now >= datetime.datetime(2024, 1, 1, 6, 0)
+        assert 10 <= clock.slept <= 10 + downloader.WINDOW_POLL_INTERVAL
+    finally:
+        scheduler.stop("a")
+        scheduler.stop("b")
+        downloader.STALL_WATCHDOG.stop("b")
+
+
+def test_transfer_pauses_when_window_starts():
+    clock = FakeClock(21, 59, 59)
+    scheduler = scheduler_at(clock, "22:00-23:00,0")
+    scheduler.start("a")
+    try:
+        scheduler.throttle("a", 100)
+        assert clock.slept == 0
+        clock.now = clock.now.replace(hour=22, minute=59, second=58)
+        # 窗口内不允许传输，窗口结束后继续
+        scheduler.throttle("a", 200)
+        assert clock.now.hour == 23
+    finally:
+        scheduler.stop("a")
+        downloader.STALL_WATCHDOG.stop("a")
+
+
+def test_window_rate_limit_delays_transfer():
+    clock = FakeClock(10, 0)
+    scheduler = scheduler_at(clock, "09:00-18:00,2,1000")
+    scheduler.start("a")
+    try:
+        scheduler.throttle("a", 0)
+        # 突发量为 1 秒，其余 4000 字节按 1000 字节/秒等待
+        scheduler.throttle("a", 5000)
+        assert clock.slept == pytest.approx(4.0)
+    finally:
+        scheduler.stop("a")
+
+
+def test_job_waits_for_window_workers(monkeypatch):
+    monkeypatch.setattr(downloader, "WINDOW_POLL_INTERVAL", 0.01)
+    clock = FakeClock(5, 59)
+    scheduler = scheduler_at(clock, "22:00-06:00,1", default_workers=2)
+
+    async def scenario():
+        async with scheduler.job():
+            second = asyncio.create_task(scheduler.job().__aenter__())
+            await asyncio.sleep(0.05)
+            blocked = not second.done()
+            # 窗口结束后窗口外的并行数允许第二个任务
+            clock.now = clock.now.replace(hour=6)
+            await asyncio.wait_for(second, 1)
+            return blocked
+
+    assert asyncio.run(scenario())
+
+
+def test_worker_takes_window_slot_only_after_lease(monkeypatch):
+    clock = FakeClock(10, 0)
+    scheduler = scheduler_at(clock, "09:00-18:00,1")
+    monkeypatch.setattr(downloader, "TIME_WINDOWS", scheduler)
+    running_during_lease = []
+
+    class EmptyQueue:
+        lease_time = 60.0
+
+        def lease(self, owner):
+            running_during_lease.append(scheduler._running)
+            return None
+
+        def outstanding(self):
+            return False
+
+    assert asyncio.run(downloader.worker(0, EmptyQueue(), "out")) == 0
+    # 没有租到条目时不占用时间窗口的并行数
+    assert running_during_lease == [0]
+
+
+def test_worker_downloads_leased_entries_within_window(monkeypatch):
+    clock = FakeClock(10, 0)
+    scheduler = scheduler_at(clock, "09:00-18:00,1")
+    monkeypatch.setattr(downloader, "TIME_WINDOWS", scheduler)
+    running_during_download = []
+
+    async def fake_download(entry, *args):
+        running_during_download.append(scheduler._running)
+        return True
+
+    monkeypatch.setattr(downloader, "download_single_video_async", fake_download)
+    work_queue = downloader.MemoryWorkQueue([{"id": "a"}, {"id": "b"}])
+    assert asyncio.run(downloader.worker(0, work_queue, "out")) == 2
+    assert running_during_download == [1, 1]
+    assert scheduler._running == 0
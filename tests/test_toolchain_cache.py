@@ -0,0 +1,109 @@
+import os
+import platform
+
+import pytest
+
+import downloader
+
+pytestmark = pytest.mark.skipif(
+    platform.system() == "Windows", reason="用 shell 脚本模拟 ffmpeg"
+)
+
+FAKE_FFMPEG = """#!/bin/sh
+echo "$2" >> "{log}"
+case "$2" in
+  -version) echo "ffmpeg version {version} Copyright (c) the FFmpeg developers" ;;
+  -encoders) printf 'Encoders:\\n ------\\n A..... libmp3lame  MP3\\n A..... aac  AAC\\n' ;;
+  -muxers) printf 'File formats:\\n --\\n  E mp4  MP4\\n  E mp3  MP3\\n' ;;
+esac
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """当前目录中的假 ffmpeg，每次运行都记录到日志"""
+    log = tmp_path / "probes.log"
+    path = tmp_path / "ffmpeg"
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(downloader.shutil, "which", lambda name: None)
+
+    def install(version="6.1"):
+        path.write_text(FAKE_FFMPEG.format(log=log, version=version))
+        path.chmod(0o755)
+        return path
+
+    def probes():
+        return log.read_text().split() if log.exists() else []
+
+    install()
+    return install, probes
+
+
+def resolve(tmp_path):
+    toolchain = downloader.Toolchain(tmp_path / "cache" / "toolchain.json")
+    assert toolchain.resolve()
+    return toolchain
+
+
+def test_probe_result_is_cached(tmp_path, fake_ffmpeg):
+    _, probes = fake_ffmpeg
+
+    toolchain = resolve(tmp_path)
+    assert toolchain.version == "6.1"
+    assert toolchain.select_encoder(downloader.MP3_ENCODERS) == "libmp3lame"
+    assert toolchain.muxers == {"mp4", "mp3"}
+    assert probes() == ["-version", "-encoders", "-muxers"]
+
+    # 可执行文件没有变化时不再运行 ffmpeg
+    cached = resolve(tmp_path)
+    assert len(probes()) == 3
+    assert cached.snapshot() == toolchain.snapshot()
+
+
+def test_touching_binary_triggers_new_probe(tmp_path, fake_ffmpeg):
+    _, probes = fake_ffmpeg
+    path = tmp_path / "ffmpeg"
+    resolve(tmp_path)
+
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    resolve(tmp_path)
+    assert len(probes()) == 6
+
+
+def test_replaced_binary_with_same_mtime_triggers_new_probe(tmp_path, fake_ffmpeg):
+    install, probes = fake_ffmpeg
+    resolve(tmp_path)
+    stat = (tmp_path / "ffmpeg").stat()
+
+    # 升级后的文件大小不同，即使修改时间相同也重新探测
+    path = install(version="7.0.1")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert path.stat().st_size != stat.st_size
+
+    toolchain = resolve(tmp_path)
+    assert toolchain.version == "7.0.1"
+    assert len(probes()) == 6
+
+
+def test_cache_from_other_version_is_ignored(tmp_path, fake_ffmpeg, monkeypatch):
+    _, probes = fake_ffmpeg
+    resolve(tmp_path)
+
+    monkeypatch.setattr(
+        downloader, "TOOLCHAIN_CACHE_VERSION", downloader.TOOLCHAIN_CACHE_VERSION + 1
+    )
+    resolve(tmp_path)
+    assert len(probes()) == 6
+
+
+def test_corrupt_cache_is_reprobed(tmp_path, fake_ffmpeg):
+    _, probes = fake_ffmpeg
+    toolchain = resolve(tmp_path)
+    toolchain.cache_path.write_text("{")
+
+    assert resolve(tmp_path).version == "6.1"
+    assert len(probes()) == 6
+    # 重新探测后写入有效的缓存
+    resolve(tmp_path)
+    assert len(probes()) == 6
@@ -0,0 +1,120 @@
+import pytest
+
+import downloader
+
+FRAME = downloader.MP3_FRAME_SAMPLES
+DELAY = downloader.MP3_ENCODER_DELAY
+PREROLL = downloader.MP3_SEGMENT_PREROLL
+
+
+def mp3_frame(bitrate_index=9, rate_index=0, padding=0, fill=0):
+    """构造一个 MPEG-1 Layer III 帧，帧体用 fill 填充"""
+    header = 0xFFFB0000 | bitrate_index << 12 | rate_index << 10 | padding << 9
+    bitrate = downloader.MP3_BITRATES[bitrate_index]
+    sample_rate = downloader.MP3_SAMPLE_RATES[rate_index]
+    length = 144000 * bitrate // sample_rate + padding
+    return header.to_bytes(4, "big") + bytes([fill]) * (length - 4)
+
+
+def first_output_sample(start, frame):
+    """分段内第 frame 个编码帧对应的源采样位置"""
+    return start + frame * FRAME - DELAY
+
+
+@pytest.mark.parametrize(
+    "duration,sample_rate,segments",
+    [(600, 44100, 4), (3600.5, 48000, 8), (185.3, 32000, 3), (120, 44100, 2)],
+)
+def test_segments_are_frame_aligned_and_contiguous(duration, sample_rate, segments):
+    plan = downloader.plan_transcode_segments(duration, sample_rate, segments)
+    assert len(plan) == segments
+    assert (plan[0][0], plan[0][2]) == (0, 0)
+
+    # 各段保留的第一帧都从分段边界开始，边界加上编码延迟是帧长的整数倍
+    boundaries = [-DELAY]
+    for start, _, first_frame, _ in plan[1:]:
+        assert first_frame == PREROLL
+        assert start >= 0
+        boundary = first_output_sample(start, first_frame)
+        assert (boundary + DELAY) % FRAME == 0
+        boundaries.append(boundary)
+    assert boundaries == sorted(boundaries)
+
+    # 每段保留的帧恰好结束在下一段的边界，拼接后既不重叠也不缺失
+    for (start, _, first_frame, frame_count), next_boundary in zip(
+        plan, boundaries[1:]
+    ):
+        assert first_output_sample(start, first_frame + frame_count) == next_boundary
+
+
+@pytest.mark.parametrize("segments", [2, 5])
+def test_segments_encode_preroll_and_tail(segments):
+    sample_rate = 44100
+    plan = downloader.plan_transcode_segments(900, sample_rate, segments)
+    for index, (start, encode_samples, first_frame, frame_count) in enumerate(
+        plan[:-1]
+    ):
+        next_start, _, next_first, _ = plan[index + 1]
+        next_boundary = first_output_sample(next_start, next_first)
+        # 多编码两帧，末尾保留的帧能看到真实的后续采样
+        assert start + encode_samples == next_boundary + 2 * FRAME
+        # 后续分段从边界前 PREROLL 帧开始编码，这些帧会被丢弃
+        boundary = first_output_sample(start, first_frame)
+        assert boundary - start == first_frame * FRAME - DELAY
+    start, encode_samples, first_frame, frame_count = plan[-1]
+    assert (encode_samples, first_frame, frame_count) == (0, PREROLL, None)
+
+
+def test_single_segment_encodes_everything():
+    assert downloader.plan_transcode_segments(300, 44100, 1) == [(0, 0, 0, None)]
+
+
+def test_frame_offsets_follow_bitrate_and_padding():
+    frames = [
+        mp3_frame(),
+        mp3_frame(padding=1),
+        mp3_frame(bitrate_index=14, rate_index=1),
+        mp3_frame(bitrate_index=1, rate_index=2),
+    ]
+    data = b"".join(frames)
+    # 128kbps/44.1kHz 为 417 字节，填充位多一个字节；320kbps/48kHz 为 960 字节
+    assert [len(frame) for frame in frames] == [417, 418, 960, 144]
+    assert downloader.mp3_frame_offsets(data) == [
+        (0, 417),
+        (417, 418),
+        (835, 960),
+        (1795, 144),
+    ]
+
+
+def test_frame_offsets_reject_non_mp3_data():
+    data = mp3_frame() + b"ID3" + bytes(20)
+    with pytest.raises(ValueError, match="417"):
+        downloader.mp3_frame_offsets(data)
+
+
+def test_concat_keeps_planned_frames(tmp_path):
+    plan = [(0, 0, 0, 3), (0, 0, PREROLL, 2), (0, 0, PREROLL, None)]
+    segment_files = []
+    for index, count in enumerate([5, 6, 4]):
+        segment_file = tmp_path / f"{index}.seg"
+        segment_file.write_bytes(
+            b"".join(mp3_frame(fill=index * 16 + frame) for frame in range(count))
+        )
+        segment_files.append(segment_file)
+    output = tmp_path / "out.mp3"
+
+    downloader.concat_mp3_segments(segment_files, plan, output)
+
+    data = output.read_bytes()
+    kept = [data[offset + 4] for offset, _ in downloader.mp3_frame_offsets(data)]
+    assert kept == [0, 1, 2, 16 + PREROLL, 17 + PREROLL, 32 + PREROLL, 33 + PREROLL]
+
+
+def test_concat_rejects_short_segment(tmp_path):
+    segment_file = tmp_path / "0.seg"
+    segment_file.write_bytes(mp3_frame() * 2)
+    with pytest.raises(ValueError, match="分段帧数不足"):
+        downloader.concat_mp3_segments(
+            [segment_file], [(0, 0, 0, 3)], tmp_path / "out.mp3"
+        )
@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+
+import downloader
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def open_queue(tmp_path, clock):
+    """打开同一队列文件的多个连接，相当于多台主机"""
+    queues = []
+
+    def open_queue(name="列表"):
+        work_queue = downloader.SQLiteWorkQueue(
+            tmp_path / "queue.db", name, lease_time=60.0, clock=clock
+        )
+        queues.append(work_queue)
+        return work_queue
+
+    yield open_queue
+    for work_queue in queues:
+        work_queue.close()
+
+
+def entries(*ids):
+    return [{"id": video_id, "title": f"视频 {video_id}"} for video_id in ids]
+
+
+def test_duplicate_entries_are_merged(open_queue):
+    host_a, host_b = open_queue(), open_queue()
+    assert host_a.add(entries("a", "b")) == 2
+    # 另一台主机枚举到同一播放列表时只加入新条目
+    assert host_b.add(entries("a", "b", "c")) == 1
+    assert host_a.counts() == {"pending": 3, "leased": 0, "done": 0, "failed": 0}
+    # 不同队列名互不影响
+    assert open_queue("其他").add(entries("a")) == 1
+
+
+def test_lease_follows_lane_priority_and_position(open_queue):
+    work_queue = open_queue()
+    work_queue.add(entries("b1", "b2"), "bulk")
+    work_queue.add(entries("n1"))
+    work_queue.add(entries("i1"), "interactive")
+    leased = [work_queue.lease("w")[:3] for _ in range(4)]
+    assert [(key, lane) for key, _, lane in leased] == [
+        ("i1", "interactive"),
+        ("n1", "normal"),
+        ("b1", "bulk"),
+        ("b2", "bulk"),
+    ]
+    assert isinstance(leased[0][1], downloader.PlaylistEntry)
+    assert work_queue.lease("w") is None
+
+
+def test_renewal_keeps_lease_until_it_expires(open_queue, clock):
+    host_a, host_b = open_queue(), open_queue()
+    host_a.add(entries("a"))
+    key = host_a.lease("A")[0]
+    clock.advance(50)
+    assert host_a.renew(key, "A")
+    clock.advance(50)
+    # 续租后尚未过期，其他主机租不到
+    assert host_b.lease("B") is None
+    assert host_b.outstanding()
+    assert host_a.active_lanes() == {"normal"}
+
+
+def test_expired_lease_is_taken_over(open_queue, clock):
+    host_a, host_b = open_queue(), open_queue()
+    host_a.add(entries("a"))
+    key = host_a.lease("A")[0]
+    clock.advance(61)
+    assert host_a.active_lanes() == set()
+    assert host_b.lease("B")[0] == key
+    # 原工作者续租和提交结果都失败
+    assert not host_a.renew(key, "A")
+    assert not host_a.complete(key, "A", True)
+    assert host_b.complete(key, "B", True)
+    assert host_a.counts()["done"] == 1
+    assert not host_a.outstanding()
+
+
+def test_entry_fails_after_max_lease_attempts(open_queue, clock):
+    work_queue = open_queue()
+    work_queue.add(entries("a", "b"))
+    for attempt in range(downloader.LEASE_MAX_ATTEMPTS):
+        assert work_queue.lease(f"w{attempt}")[0] == "a"
+        clock.advance(61)
+    # 多次租约过期的条目记为失败，继续分配下一个条目
+    assert work_queue.lease("w")[0] == "b"
+    assert work_queue.failures() == [("视频 a", "租约多次过期")]
+    assert work_queue.counts()["failed"] == 1
+
+
+def test_released_lease_does_not_count_as_attempt(open_queue):
+    work_queue = open_queue()
+    work_queue.add(entries("a"))
+    for _ in range(downloader.LEASE_MAX_ATTEMPTS + 1):
+        key = work_queue.lease("w")[0]
+        work_queue.release(key, "w")
+    assert work_queue.lease("w")[0] == "a"
+
+
+def test_failed_result_is_recorded(open_queue):
+    work_queue = open_queue()
+    work_queue.add(entries("a"))
+    key = work_queue.lease("w")[0]
+    assert work_queue.complete(key, "w", False, "下载失败")
+    assert work_queue.failures() == [("视频 a", "下载失败")]
+
+
+def test_concurrent_hosts_never_lease_the_same_entry(open_queue):
+    ids = [f"v{i}" for i in range(20)]
+    open_queue().add(entries(*ids))
+    hosts = [open_queue() for _ in range(4)]
+    leased = []
+    lock = threading.Lock()
+
+    def consume(index, work_queue):
+        while True:
+            item = work_queue.lease(f"host{index}")
+            if item is None:
+                return
+            with lock:
+                leased.append(item[0])
+            work_queue.complete(item[0], f"host{index}", True)
+
+    threads = [
+        threading.Thread(target=consume, args=(i, q)) for i, q in enumerate(hosts)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == sorted(ids)
+    assert hosts[0].counts()["done"] == len(ids)